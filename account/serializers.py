@@ -82,6 +82,7 @@ class UsernamePasswordTokenObtainPairSerializer(serializers.Serializer):
         if not user.is_active:
             raise serializers.ValidationError("User is inactive")
 
+        self.user = user
         refresh = RefreshToken.for_user(user)
 
         return {"refresh": str(refresh), "access": str(refresh.access_token)}
@@ -3,6 +3,7 @@ import random
 from datetime import timedelta
 
 from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
 from django.shortcuts import render
 from django.utils import timezone
 from django.views import View
@@ -298,6 +299,8 @@ class UsernamePasswordLoginView(APIView):
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
+        user = serializer.user
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
         return Response(
             {"message": "Successfully logged in", "data": serializer.validated_data},
             status=status.HTTP_200_OK,
@@ -418,6 +421,7 @@ class VerifyOTP(APIView):
             )
 
         refresh = RefreshToken.for_user(user)
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
         return Response(
             {
                 "refresh": str(refresh),
@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.tasks import backfill_daily_metrics
+
+
+class Command(BaseCommand):
+    help = "Backfill the product daily metrics of a range of days"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start", required=True, help="First day to roll up (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--end", required=True, help="Last day to roll up (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=7,
+            help="Number of days rolled up by each worker task",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"])
+            end = date.fromisoformat(options["end"])
+        except ValueError:
+            raise CommandError("--start and --end must be dates in YYYY-MM-DD format.")
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+
+        chunks = backfill_daily_metrics(
+            start.isoformat(), end.isoformat(), options["chunk_days"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Queued {chunks} rollups of the product daily metrics "
+                f"from {start} to {end}."
+            )
+        )
@@ -0,0 +1,102 @@
+"""
+Daily product metrics rollup.
+
+The metrics of a range of days are computed with a single GROUP BY over the
+order items of the range and written with one bulk upsert, so the cost of a
+rollup depends on the number of products sold, not on the size of the
+catalog. Re-running a range recomputes it from scratch: rows are overwritten
+and the rows of products that no longer have sales in it are removed, so
+rollups and backfills can safely be repeated.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import OrderItem
+
+from .models import ProductDailyMetrics
+
+METRICS_BATCH_SIZE = 1000
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_chunks(start, end, days):
+    """
+    Splits the days from ``start`` to ``end`` (inclusive) into consecutive
+    ``(first, last)`` ranges of at most ``days`` days.
+    """
+    while start <= end:
+        last = min(start + timedelta(days=days - 1), end)
+        yield start, last
+        start = last + timedelta(days=1)
+
+
+def rollup_daily_metrics(start, end=None):
+    """
+    Computes and stores the metrics of every product sold from ``start`` to
+    ``end`` (inclusive, defaults to ``start``). Returns the number of rows
+    written.
+    """
+    end = end or start
+    amount = DecimalField(max_digits=14, decimal_places=2)
+    rows = (
+        OrderItem.objects.filter(
+            order__order_date__gte=_start_of(start),
+            order__order_date__lt=_start_of(end + timedelta(days=1)),
+        )
+        .annotate(day=TruncDate("order__order_date"))
+        .values("variant__product_id", "day")
+        .annotate(
+            units_sold=Sum("quantity"),
+            revenue=Sum(F("quantity") * F("price"), output_field=amount),
+            # Profit only covers the items of variants with a known cost, so
+            # their revenue is summed separately.
+            costed_revenue=Sum(
+                F("quantity") * F("price"),
+                filter=Q(variant__cost__isnull=False),
+                output_field=amount,
+            ),
+            cost=Sum(F("quantity") * F("variant__cost"), output_field=amount),
+        )
+        .order_by()
+    )
+    metrics = [
+        ProductDailyMetrics(
+            product_id=row["variant__product_id"],
+            date=row["day"],
+            units_sold=row["units_sold"],
+            revenue=row["revenue"],
+            # This is a simplified profit calculation. A more accurate one
+            # would require the cost of the product at the time of sale.
+            profit=(
+                row["costed_revenue"] - row["cost"] if row["cost"] is not None else 0
+            ),
+        )
+        for row in rows
+    ]
+
+    sold = {}
+    for metric in metrics:
+        sold.setdefault(metric.date, []).append(metric.product_id)
+
+    with transaction.atomic():
+        ProductDailyMetrics.objects.bulk_create(
+            metrics,
+            batch_size=METRICS_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["product", "date"],
+            update_fields=["units_sold", "revenue", "profit"],
+        )
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(days=offset)
+            ProductDailyMetrics.objects.filter(date=day).exclude(
+                product_id__in=sold.get(day, [])
+            ).delete()
+    return len(metrics)
@@ -1,47 +1,43 @@
-from celery import shared_task
+from datetime import date
+
+from celery import group, shared_task
+from celery.utils.log import get_task_logger
 from django.utils import timezone
-from shop.models import Product
-from orders.models import OrderItem
-from .models import ProductDailyMetrics
-from django.db.models import Sum, F
+
+from .services import date_chunks, rollup_daily_metrics
+
+logger = get_task_logger(__name__)
+
+
+@shared_task
+def populate_daily_metrics(start=None, end=None):
+    """
+    Rolls up the product metrics of the days from ``start`` to ``end``
+    (ISO dates, inclusive), by default of yesterday.
+    """
+    if start is None:
+        start = timezone.localdate() - timezone.timedelta(days=1)
+    else:
+        start = date.fromisoformat(start)
+    end = date.fromisoformat(end) if end else start
+
+    written = rollup_daily_metrics(start, end)
+    logger.info(f"Rolled up {written} product daily metrics for {start} to {end}.")
+    return written
 
 
 @shared_task
-def populate_daily_metrics():
-    today = timezone.now().date()
-    yesterday = today - timezone.timedelta(days=1)
-
-    order_items = OrderItem.objects.filter(order__order_date__date=yesterday)
-
-    for product in Product.objects.all():
-        product_order_items = order_items.filter(variant__product=product)
-        units_sold = (
-            product_order_items.aggregate(total_units=Sum("quantity"))["total_units"]
-            or 0
-        )
-        revenue = (
-            product_order_items.aggregate(
-                total_revenue=Sum(F("quantity") * F("price"))
-            )["total_revenue"]
-            or 0
-        )
-
-        # This is a simplified profit calculation. A more accurate calculation
-        # would require the cost of the product at the time of sale.
-        cost = (
-            product_order_items.aggregate(
-                total_cost=Sum(F("quantity") * F("variant__cost"))
-            )["total_cost"]
-            or 0
-        )
-        profit = revenue - cost if revenue and cost else 0
-
-        ProductDailyMetrics.objects.update_or_create(
-            product=product,
-            date=yesterday,
-            defaults={
-                "units_sold": units_sold,
-                "revenue": revenue,
-                "profit": profit,
-            },
-        )
+def backfill_daily_metrics(start, end, chunk_days=7):
+    """
+    Rolls up the metrics of the days from ``start`` to ``end`` (ISO dates,
+    inclusive) in chunks of ``chunk_days`` days, processed in parallel by the
+    workers. Returns the number of chunks queued.
+    """
+    chunks = list(
+        date_chunks(date.fromisoformat(start), date.fromisoformat(end), chunk_days)
+    )
+    group(
+        populate_daily_metrics.si(first.isoformat(), last.isoformat())
+        for first, last in chunks
+    ).apply_async()
+    return len(chunks)
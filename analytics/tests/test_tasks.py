@@ -1,9 +1,11 @@
+from decimal import Decimal
+
 from django.test import TestCase
 from django.utils import timezone
 from shop.models import Product, ProductVariant, Category
 from orders.models import Order, OrderItem
 from analytics.models import ProductDailyMetrics
-from analytics.tasks import populate_daily_metrics
+from analytics.tasks import backfill_daily_metrics, populate_daily_metrics
 from account.models import UserAccount as User
 
 
@@ -34,3 +36,106 @@ class PopulateDailyMetricsTest(TestCase):
         self.assertEqual(metrics.units_sold, 2)
         self.assertEqual(metrics.revenue, 200)
         self.assertEqual(metrics.profit, 100)
+
+
+class RollupDailyMetricsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone_number="123456780", password="password"
+        )
+        self.category = Category.objects.create(name="Rollup Category")
+        self.today = timezone.localdate()
+
+    def _sell(self, price=10, cost=None, quantity=1, days_ago=1, variant=None):
+        if variant is None:
+            product = Product.objects.create(
+                name=f"Product {Product.objects.count()}",
+                category=self.category,
+                user=self.user,
+            )
+            variant = ProductVariant.objects.create(
+                product=product, price=price, cost=cost, stock=10
+            )
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(
+            order=order, variant=variant, price=price, quantity=quantity
+        )
+        Order.objects.filter(pk=order.pk).update(
+            order_date=timezone.now() - timezone.timedelta(days=days_ago)
+        )
+        return variant
+
+    def test_backfill_rolls_up_every_day_of_the_range(self):
+        variant = self._sell(price=10, cost=4, quantity=2, days_ago=1)
+        self._sell(price=10, quantity=3, days_ago=3, variant=variant)
+        self._sell(price=5, quantity=1, days_ago=3)
+        self._sell(price=5, quantity=1, days_ago=30)  # outside the range
+
+        chunks = backfill_daily_metrics(
+            (self.today - timezone.timedelta(days=10)).isoformat(),
+            self.today.isoformat(),
+            chunk_days=4,
+        )
+
+        self.assertEqual(chunks, 3)
+        rows = set(
+            ProductDailyMetrics.objects.values_list(
+                "product_id", "date", "units_sold", "revenue", "profit"
+            )
+        )
+        self.assertEqual(len(rows), 3)
+        self.assertIn(
+            (
+                variant.product_id,
+                self.today - timezone.timedelta(days=1),
+                2,
+                Decimal("20"),
+                Decimal("12"),
+            ),
+            rows,
+        )
+        self.assertIn(
+            (
+                variant.product_id,
+                self.today - timezone.timedelta(days=3),
+                3,
+                Decimal("30"),
+                Decimal("18"),
+            ),
+            rows,
+        )
+
+    def test_profit_leaves_out_items_without_cost(self):
+        variant = self._sell(price=10, cost=4, quantity=2)
+        uncosted = ProductVariant.objects.create(
+            product=variant.product, price=30, stock=10
+        )
+        self._sell(price=30, quantity=1, variant=uncosted)
+
+        populate_daily_metrics()
+
+        metrics = ProductDailyMetrics.objects.get(product=variant.product)
+        self.assertEqual(metrics.revenue, Decimal("50"))
+        self.assertEqual(metrics.profit, Decimal("12"))
+
+    def test_rollup_is_idempotent(self):
+        self._sell(price=10, quantity=2)
+        yesterday = self.today - timezone.timedelta(days=1)
+        populate_daily_metrics()
+        populate_daily_metrics()
+        metrics = ProductDailyMetrics.objects.get(date=yesterday)
+        self.assertEqual(metrics.units_sold, 2)
+
+        # Sales removed since the last run are removed from the metrics.
+        OrderItem.objects.all().delete()
+        populate_daily_metrics(yesterday.isoformat())
+        self.assertFalse(ProductDailyMetrics.objects.exists())
+
+    def test_rollup_queries_do_not_grow_with_products(self):
+        for _ in range(10):
+            self._sell()
+        Product.objects.create(name="Unsold", category=self.category, user=self.user)
+        # The GROUP BY, the upsert, and the cleanup of stale rows, plus the
+        # savepoint around the writes.
+        with self.assertNumQueries(5):
+            self.assertEqual(populate_daily_metrics(), 10)
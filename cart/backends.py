@@ -0,0 +1,425 @@
+"""
+Cart storage backends.
+
+Authenticated users keep their cart in the database (``DatabaseCartBackend``).
+Anonymous visitors use the backend named by ``CART_ANONYMOUS_BACKEND``; by
+default their carts live in a Redis hash per session (``RedisCartBackend``)
+that expires after ``CART_SESSION_TTL`` seconds without changes, and are only
+written to the database when they are merged into a user's cart at login.
+
+Either way, nothing is stored for a visitor until they add something to their
+cart, so browsing and bot traffic leave no cart rows or keys behind.
+"""
+
+import sys
+import uuid
+from abc import ABC, abstractmethod
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from shop.models import ProductVariant
+
+from .models import Cart as CartModel, CartItem
+
+if "test" in sys.argv or getattr(settings, "TESTING", False):
+    from fakeredis import FakeRedis
+
+    r = FakeRedis()
+else:
+    r = redis.from_url(settings.REDIS_URL)
+
+CART_REDIS_KEY = "cart:session:{}"
+
+
+class CartBackend(ABC):
+    """
+    Stores the variants of one cart and their quantities.
+    """
+
+    @property
+    @abstractmethod
+    def key(self):
+        """
+        A stable identifier of the stored cart, or None while it is empty and
+        has never been stored.
+        """
+
+    @abstractmethod
+    def get_items(self):
+        """
+        Returns ``(variant, quantity)`` pairs, with each variant's product
+        loaded, in a single query.
+        """
+
+    @abstractmethod
+    def get_quantity(self, variant):
+        pass
+
+    @abstractmethod
+    def get_quantities(self):
+        """
+        Returns the stored quantities keyed by variant id (as a string).
+        """
+
+    @abstractmethod
+    def set_quantity(self, variant, quantity):
+        """
+        Stores ``quantity`` of ``variant``; a quantity of zero or less removes it.
+        """
+
+    @abstractmethod
+    def set_quantities(self, quantities):
+        """
+        Stores a ``{variant: quantity}`` mapping in one write, with the same
+        semantics as ``set_quantity``.
+        """
+
+    @abstractmethod
+    def remove(self, variant):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class DatabaseCartBackend(CartBackend):
+    """
+    Stores the cart as ``Cart``/``CartItem`` rows, owned by a user or by a
+    session identifier. The row is looked up on first use and created on
+    the first write.
+    """
+
+    def __init__(self, user=None, session_key=None):
+        self.user = user
+        self.session_key = session_key
+        self._cart = None
+        self._loaded = False
+
+    def _owner(self):
+        if self.user is not None:
+            return {"user": self.user}
+        return {"session_key": self.session_key}
+
+    @property
+    def cart(self):
+        if not self._loaded:
+            if self.user is not None or self.session_key:
+                self._cart = (
+                    CartModel.objects.filter(**self._owner()).order_by("pk").first()
+                )
+            self._loaded = True
+        return self._cart
+
+    def _get_or_create_cart(self):
+        if self.cart is None:
+            self._cart = CartModel.objects.create(**self._owner())
+        return self._cart
+
+    @property
+    def key(self):
+        return f"db:{self.cart.pk}" if self.cart else None
+
+    def get_items(self):
+        if self.cart is None:
+            return []
+        return [
+            (item.variant, item.quantity)
+            for item in self.cart.items.select_related("variant__product").order_by(
+                "id"
+            )
+        ]
+
+    def get_quantity(self, variant):
+        if self.cart is None:
+            return 0
+        item = CartItem.objects.filter(cart=self.cart, variant=variant).first()
+        return item.quantity if item else 0
+
+    def get_quantities(self):
+        if self.cart is None:
+            return {}
+        return {
+            str(variant_id): quantity
+            for variant_id, quantity in self.cart.items.values_list(
+                "variant_id", "quantity"
+            )
+        }
+
+    def set_quantities(self, quantities):
+        with transaction.atomic():
+            cart = self._get_or_create_cart()
+            removed = [
+                variant for variant, quantity in quantities.items() if quantity <= 0
+            ]
+            if removed:
+                CartItem.objects.filter(cart=cart, variant__in=removed).delete()
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(cart=cart, variant=variant, quantity=quantity)
+                    for variant, quantity in quantities.items()
+                    if quantity > 0
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "variant"],
+                update_fields=["quantity"],
+            )
+            CartModel.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+    def set_quantity(self, variant, quantity):
+        cart = self._get_or_create_cart()
+        if quantity <= 0:
+            CartItem.objects.filter(cart=cart, variant=variant).delete()
+        else:
+            CartItem.objects.update_or_create(
+                cart=cart, variant=variant, defaults={"quantity": quantity}
+            )
+        # Item changes do not touch the cart row; keep it from looking
+        # abandoned to purge_abandoned_carts.
+        CartModel.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+    def remove(self, variant):
+        if self.cart is not None:
+            CartItem.objects.filter(cart=self.cart, variant=variant).delete()
+
+    def clear(self):
+        if self.cart is not None:
+            self.cart.delete()
+        self._cart = None
+
+    def merge(self, items):
+        """
+        Adds the quantities of ``(variant, quantity)`` pairs to the cart with a
+        single bulk upsert on the unique (cart, variant) constraint.
+        """
+        if not items:
+            return
+        with transaction.atomic():
+            cart = self._get_or_create_cart()
+            # Serialize concurrent merges into the same cart, so the
+            # quantities read below are not stale when they are written.
+            CartModel.objects.select_for_update().filter(pk=cart.pk).update(
+                updated_at=timezone.now()
+            )
+            existing = dict(
+                cart.items.filter(
+                    variant__in=[variant for variant, _quantity in items]
+                ).values_list("variant_id", "quantity")
+            )
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(
+                        cart=cart,
+                        variant=variant,
+                        quantity=existing.get(variant.pk, 0) + quantity,
+                    )
+                    for variant, quantity in items
+                ],
+                update_conflicts=True,
+                unique_fields=["cart", "variant"],
+                update_fields=["quantity"],
+            )
+
+
+class SessionCartBackend(CartBackend):
+    """
+    Base class of the backends storing anonymous carts. The cart identifier
+    is kept in the session under ``CART_SESSION_ID`` and only assigned when
+    the first item is added.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    @property
+    def session_key(self):
+        return self.session.get(settings.CART_SESSION_ID)
+
+    def _ensure_session_key(self):
+        if not self.session_key:
+            self.session[settings.CART_SESSION_ID] = uuid.uuid4().hex
+            self.session.modified = True
+        return self.session_key
+
+    def _forget_session_key(self):
+        if settings.CART_SESSION_ID in self.session:
+            del self.session[settings.CART_SESSION_ID]
+            self.session.modified = True
+
+    @abstractmethod
+    def pop_items(self):
+        """
+        Atomically removes the stored cart and returns its ``(variant,
+        quantity)`` pairs. Only one of several concurrent callers gets them.
+        """
+
+
+class SessionDatabaseCartBackend(SessionCartBackend):
+    """
+    Stores anonymous carts as database rows keyed by the session's cart
+    identifier.
+    """
+
+    def __init__(self, session):
+        super().__init__(session)
+        self._db = DatabaseCartBackend(session_key=self.session_key)
+
+    @property
+    def cart(self):
+        return self._db.cart
+
+    @property
+    def key(self):
+        return self._db.key
+
+    def get_items(self):
+        return self._db.get_items()
+
+    def get_quantity(self, variant):
+        return self._db.get_quantity(variant)
+
+    def get_quantities(self):
+        return self._db.get_quantities()
+
+    def set_quantity(self, variant, quantity):
+        self._db.session_key = self._ensure_session_key()
+        self._db.set_quantity(variant, quantity)
+
+    def set_quantities(self, quantities):
+        self._db.session_key = self._ensure_session_key()
+        self._db.set_quantities(quantities)
+
+    def remove(self, variant):
+        self._db.remove(variant)
+
+    def clear(self):
+        self._db.clear()
+        self._forget_session_key()
+
+    def pop_items(self):
+        items = []
+        if self.session_key:
+            with transaction.atomic():
+                cart = (
+                    CartModel.objects.select_for_update()
+                    .filter(session_key=self.session_key)
+                    .first()
+                )
+                if cart is not None:
+                    items = [
+                        (item.variant, item.quantity)
+                        for item in cart.items.select_related("variant__product")
+                    ]
+                    cart.delete()
+        self._forget_session_key()
+        return items
+
+
+class RedisCartBackend(SessionCartBackend):
+    """
+    Stores anonymous carts as Redis hashes mapping variant ids to quantities.
+    Every write pushes the expiry of the hash back to ``CART_SESSION_TTL``.
+    """
+
+    cart = None
+
+    def _redis_key(self):
+        return CART_REDIS_KEY.format(self.session_key)
+
+    @property
+    def key(self):
+        return f"session:{self.session_key}" if self.session_key else None
+
+    def get_quantities(self):
+        if not self.session_key:
+            return {}
+        return {
+            field.decode(): int(value)
+            for field, value in r.hgetall(self._redis_key()).items()
+        }
+
+    def get_items(self):
+        return self._load_items(self.get_quantities())
+
+    def _load_items(self, quantities):
+        if not quantities:
+            return []
+        variants = ProductVariant.objects.select_related("product").filter(
+            variant_id__in=quantities
+        )
+        # Variants deleted since they were added are dropped silently.
+        return [
+            (variant, quantities[str(variant.variant_id)])
+            for variant in variants.order_by("variant_id")
+        ]
+
+    def get_quantity(self, variant):
+        if not self.session_key:
+            return 0
+        value = r.hget(self._redis_key(), str(variant.variant_id))
+        return int(value) if value is not None else 0
+
+    def set_quantity(self, variant, quantity):
+        self._ensure_session_key()
+        key = self._redis_key()
+        pipe = r.pipeline()
+        if quantity <= 0:
+            pipe.hdel(key, str(variant.variant_id))
+        else:
+            pipe.hset(key, str(variant.variant_id), quantity)
+        pipe.expire(key, settings.CART_SESSION_TTL)
+        pipe.execute()
+
+    def set_quantities(self, quantities):
+        self._ensure_session_key()
+        key = self._redis_key()
+        stored = {
+            str(variant.variant_id): quantity
+            for variant, quantity in quantities.items()
+            if quantity > 0
+        }
+        removed = [
+            str(variant.variant_id)
+            for variant, quantity in quantities.items()
+            if quantity <= 0
+        ]
+        pipe = r.pipeline()
+        if removed:
+            pipe.hdel(key, *removed)
+        if stored:
+            pipe.hset(key, mapping=stored)
+        pipe.expire(key, settings.CART_SESSION_TTL)
+        pipe.execute()
+
+    def remove(self, variant):
+        if self.session_key:
+            r.hdel(self._redis_key(), str(variant.variant_id))
+
+    def clear(self):
+        if self.session_key:
+            r.delete(self._redis_key())
+        self._forget_session_key()
+
+    def pop_items(self):
+        quantities = {}
+        if self.session_key:
+            # HGETALL and DEL run in one MULTI/EXEC transaction.
+            pipe = r.pipeline()
+            pipe.hgetall(self._redis_key())
+            pipe.delete(self._redis_key())
+            stored, _deleted = pipe.execute()
+            quantities = {field.decode(): int(value) for field, value in stored.items()}
+        self._forget_session_key()
+        return self._load_items(quantities)
+
+
+def get_anonymous_backend(session):
+    """
+    Returns the configured backend for the cart of an anonymous session.
+    """
+    backend_class = import_string(settings.CART_ANONYMOUS_BACKEND)
+    return backend_class(session)
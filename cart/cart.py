@@ -1,59 +1,63 @@
 from decimal import Decimal
 
-from django.conf import settings
+from django.core.cache import cache
 from rest_framework.exceptions import ValidationError
 
-from .models import Cart as CartModel, CartItem
+from discounts.index import DISCOUNT_INDEX_VERSION_KEY
+from shop.caching import PRODUCT_GENERATION_KEY, bump_generations, get_generations
+
+from .backends import DatabaseCartBackend, get_anonymous_backend
+
+# Cached cart summaries (item count and totals). A summary's key embeds the
+# cart's version, bumped by every add/remove/clear, and the discount index
+# version, bumped by every discount or rule change, so stale summaries are
+# orphaned instead of deleted. The entry also records the generations of the
+# products in the cart (see PRODUCT_GENERATION_KEY) and is recomputed once
+# one of them was repriced; changes to other products leave it cached.
+# Discounts reaching their end date or usage limit are picked up when the
+# entry expires.
+CART_VERSION_KEY = "cart:{}:version"
+CART_SUMMARY_KEY = "cart:{}:summary:{}.{}"
+CART_SUMMARY_CACHE_TIMEOUT = 60 * 5
 
 
 class Cart:
     """
-    A unified, database-backed cart class that handles both anonymous
-    and authenticated users.
+    A unified cart class that handles both anonymous and authenticated
+    users. Storage is delegated to a backend (see ``cart.backends``).
     """
 
+    # Modes of the operations accepted by apply()
+    ADD = "add"
+    SET = "set"
+    REMOVE = "remove"
+
     def __init__(self, request):
         """
         Initializes the cart.
-        - The cart is always stored in the database.
-        - For anonymous users, the cart is associated with their session key.
-        - For authenticated users, the cart is associated with their user account.
-        - It handles the merging of a session-based cart into a user's cart upon login.
+        - For authenticated users, the cart is stored in the database and
+          associated with their user account.
+        - For anonymous users, the cart is stored by the configured anonymous
+          backend and associated with their session.
+        - The session cart is merged into the user's cart once, at login
+          (see ``merge_session_cart``).
         """
         self.session = request.session
         self.user = request.user
-        self.cart = None
+        self._items = None
 
         if self.user.is_authenticated:
-            self.cart, created = CartModel.objects.get_or_create(user=self.user)
-            session_key = self.session.get(settings.CART_SESSION_ID)
-            if session_key:
-                try:
-                    session_cart = CartModel.objects.get(session_key=session_key)
-                    for item in session_cart.items.all():
-                        cart_item, item_created = CartItem.objects.get_or_create(
-                            cart=self.cart,
-                            variant=item.variant,
-                            defaults={"quantity": item.quantity},
-                        )
-                        if not item_created:
-                            cart_item.quantity += item.quantity
-                            cart_item.save()
-                    session_cart.delete()
-                    del self.session[settings.CART_SESSION_ID]
-                    self.session.modified = True
-                except CartModel.DoesNotExist:
-                    pass
+            self.backend = DatabaseCartBackend(user=self.user)
         else:
-            session_key = self.session.get(settings.CART_SESSION_ID)
-            if not session_key:
-                self.session.cycle_key()
-                session_key = self.session.session_key
-                self.session[settings.CART_SESSION_ID] = session_key
-                self.session.modified = True
-            self.cart, created = CartModel.objects.get_or_create(
-                session_key=session_key
-            )
+            self.backend = get_anonymous_backend(self.session)
+
+    @property
+    def cart(self):
+        """
+        The ``Cart`` model instance backing this cart, if it is stored in
+        the database and exists.
+        """
+        return getattr(self.backend, "cart", None)
 
     def add(
         self,
@@ -69,74 +73,160 @@ class Cart:
         if variant.stock == 0:
             raise ValidationError("This product is out of stock.")
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=self.cart, variant=variant, defaults={"quantity": 0}
-        )
+        current_quantity = self.backend.get_quantity(variant)
 
         if override_quantity:
             total_quantity = quantity
         else:
-            total_quantity = cart_item.quantity + quantity
+            total_quantity = current_quantity + quantity
 
         if total_quantity > variant.stock and not allow_insufficient_stock:
-            available_stock = variant.stock - cart_item.quantity
+            available_stock = variant.stock - current_quantity
             raise ValidationError(
                 f"Cannot add {quantity} items. "
                 f"Only {available_stock} more items can be added."
             )
 
-        cart_item.quantity = total_quantity
-        if cart_item.quantity <= 0:
-            cart_item.delete()
-        else:
-            cart_item.save()
+        self.backend.set_quantity(variant, total_quantity)
+        self._changed()
+
+    def apply(self, operations):
+        """
+        Applies a batch of ``(variant, quantity, mode)`` operations, where
+        ``mode`` is ADD (add ``quantity``), SET (replace the quantity) or
+        REMOVE. Operations on the same variant are applied in order.
+
+        Resulting quantities are validated against stock all at once and
+        written in a single backend write; if any variant lacks stock a
+        ValidationError keyed by variant id is raised and nothing changes.
+        """
+        current = self.backend.get_quantities()
+        variants = {}
+        quantities = {}
+        for variant, quantity, mode in operations:
+            key = str(variant.variant_id)
+            variants[key] = variant
+            if mode == self.ADD:
+                quantities[key] = quantities.get(key, current.get(key, 0)) + quantity
+            elif mode == self.SET:
+                quantities[key] = quantity
+            else:
+                quantities[key] = 0
+
+        errors = {}
+        for key, quantity in quantities.items():
+            variant = variants[key]
+            if quantity > 0 and variant.stock == 0:
+                errors[key] = "This product is out of stock."
+            elif quantity > variant.stock:
+                errors[key] = f"Only {variant.stock} items are available."
+        if errors:
+            raise ValidationError(errors)
+
+        self.backend.set_quantities(
+            {variants[key]: quantity for key, quantity in quantities.items()}
+        )
+        self._changed()
 
     def remove(self, variant):
         """
         Removes a product variant from the cart.
         """
-        CartItem.objects.filter(cart=self.cart, variant=variant).delete()
+        self.backend.remove(variant)
+        self._changed()
+
+    def _changed(self):
+        """
+        Drops the loaded items and invalidates the cached summary.
+        """
+        self._items = None
+        if self.backend.key:
+            bump_generations([CART_VERSION_KEY.format(self.backend.key)])
+
+    def _get_items(self):
+        """
+        Loads the cart items with their variants and products in a single
+        query. The rows are kept for the lifetime of this object, so
+        iterating, counting and totalling the cart do not query again.
+        """
+        if self._items is None:
+            self._items = [
+                {
+                    "variant": variant,
+                    "quantity": quantity,
+                    "price": variant.price,
+                    "total_price": variant.price * quantity,
+                }
+                for variant, quantity in self.backend.get_items()
+            ]
+        return self._items
 
     def __iter__(self):
         """
         Iterates over the items in the cart, yielding variant details.
         """
-        if not self.cart or not self.cart.pk:
-            return
-        for item in self.cart.items.prefetch_related("variant__product"):
-            yield {
-                "variant": item.variant,
-                "quantity": item.quantity,
-                "price": item.variant.price,
-                "total_price": item.variant.price * item.quantity,
-            }
+        return iter(self._get_items())
 
     def __len__(self):
         """
         Returns the total number of items in the cart.
         """
-        if not self.cart or not self.cart.pk:
-            return 0
-        return sum(item.quantity for item in self.cart.items.all())
+        return sum(item["quantity"] for item in self._get_items())
 
     def get_total_price(self):
         """
         Calculates the total price of all items in the cart.
         """
-        if not self.cart or not self.cart.pk:
-            return Decimal("0")
-        return sum(item.variant.price * item.quantity for item in self.cart.items.all())
+        return sum((item["total_price"] for item in self._get_items()), Decimal("0"))
+
+    def get_summary(self):
+        """
+        Returns the item count, subtotal, best automatic discount and total
+        of the cart. Summaries are cached per cart version, so a cached one
+        costs three cache round trips and no queries.
+        """
+        if not self.backend.key:
+            return self._compute_summary()
+
+        version, discounts_version = get_generations(
+            [CART_VERSION_KEY.format(self.backend.key), DISCOUNT_INDEX_VERSION_KEY]
+        )
+        key = CART_SUMMARY_KEY.format(self.backend.key, version, discounts_version)
+        cached = cache.get(key)
+        if cached is not None:
+            product_keys, generations, summary = cached
+            if get_generations(product_keys) == generations:
+                return summary
+
+        # Read the generations right after loading the items' prices, so a
+        # reprice racing with the computation invalidates the entry.
+        product_keys = sorted(
+            {
+                PRODUCT_GENERATION_KEY.format(item["variant"].product_id)
+                for item in self._get_items()
+            }
+        )
+        generations = get_generations(product_keys)
+        summary = self._compute_summary()
+        cache.set(key, (product_keys, generations, summary), CART_SUMMARY_CACHE_TIMEOUT)
+        return summary
+
+    def _compute_summary(self):
+        subtotal = self.get_total_price()
+        discount = self.get_discount() if subtotal else Decimal("0")
+        return {
+            "count": len(self),
+            "subtotal": subtotal,
+            "discount": discount,
+            "total": subtotal - discount,
+        }
 
     def clear(self):
         """
         Removes all items from the cart.
         """
-        if self.cart and self.cart.pk:
-            self.cart.delete()
-        self.cart = None
-        if settings.CART_SESSION_ID in self.session:
-            del self.session[settings.CART_SESSION_ID]
-            self.session.modified = True
+        self._changed()
+        self.backend.clear()
 
     def get_discount(self):
         """
@@ -155,6 +245,19 @@ class Cart:
         """
         return self.get_total_price() - self.get_discount()
 
+    @classmethod
+    def merge_session_cart(cls, session, user):
+        """
+        Moves the anonymous cart of ``session`` into the database cart of
+        ``user``, adding up the quantities of variants found in both.
+        """
+        items = get_anonymous_backend(session).pop_items()
+        if not items:
+            return
+        backend = DatabaseCartBackend(user=user)
+        backend.merge(items)
+        bump_generations([CART_VERSION_KEY.format(backend.key)])
+
     def save(self):
         """
         This method is kept for compatibility but is no longer needed
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cart",
+            name="session_key",
+            field=models.CharField(blank=True, db_index=True, max_length=40, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="cart",
+            index=models.Index(
+                fields=["updated_at"], name="cart_cart_updated_c46eb6_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 07:39
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """
+    Folds duplicate (cart, variant) rows into the oldest one, adding up
+    their quantities, so the unique constraint can be created.
+    """
+    CartItem = apps.get_model("cart", "CartItem")
+    duplicates = (
+        CartItem.objects.values("cart_id", "variant_id")
+        .annotate(rows=Count("id"), keep_id=Min("id"), total=Sum("quantity"))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        items = CartItem.objects.filter(
+            cart_id=duplicate["cart_id"], variant_id=duplicate["variant_id"]
+        )
+        items.exclude(id=duplicate["keep_id"]).delete()
+        items.update(quantity=duplicate["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cart", "0003_cart_session_key_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "variant"), name="unique_cart_item_variant"
+            ),
+        ),
+    ]
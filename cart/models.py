@@ -18,11 +18,14 @@ class Cart(models.Model):
         null=True,
         blank=True,
     )
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     coupon = models.ForeignKey(Coupon, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["updated_at"])]
+
     def __str__(self):
         if self.user:
             return f"Cart for {self.user.username}"
@@ -40,5 +43,12 @@ class CartItem(models.Model):
     )
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "variant"], name="unique_cart_item_variant"
+            )
+        ]
+
     def __str__(self):
         return f"{self.quantity} of {self.variant.product.name}"
@@ -6,6 +6,15 @@ from rest_framework import serializers
 
 from shop.serializers import ProductVariantSerializer
 
+from .cart import Cart
+
+
+class CartSummarySerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total = serializers.DecimalField(max_digits=10, decimal_places=2)
+
 
 class CartSerializer(serializers.Serializer):
     class CartItemSerializer(serializers.Serializer):
@@ -16,6 +25,7 @@ class CartSerializer(serializers.Serializer):
         total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
 
     items = CartItemSerializer(many=True)
+    summary = CartSummarySerializer()
     coupon = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
 
@@ -68,3 +78,19 @@ class AddToCartSerializer(serializers.Serializer):
         validators=[MaxValueValidator(50, message="Cannot add more than 50 items.")],
     )
     override = serializers.BooleanField(default=False)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    MODE_CHOICES = [Cart.ADD, Cart.SET, Cart.REMOVE]
+
+    variant_id = serializers.UUIDField()
+    quantity = serializers.IntegerField(
+        min_value=0,
+        default=1,
+        validators=[MaxValueValidator(50, message="Cannot add more than 50 items.")],
+    )
+    mode = serializers.ChoiceField(choices=MODE_CHOICES, default=Cart.ADD)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
@@ -1,3 +1,5 @@
+from django.db.models import prefetch_related_objects
+from rest_framework.exceptions import ValidationError
 
 from shop.models import ProductVariant
 
@@ -6,6 +8,13 @@ from .cart import Cart
 
 def get_cart_data(request):
     cart = Cart(request)
+    items = list(cart)
+    # The variant serializer renders each variant's options.
+    prefetch_related_objects(
+        [item["variant"] for item in items],
+        "variant_options__option_value__option_type",
+    )
+    summary = cart.get_summary()
     return {
         "items": [
             {
@@ -13,12 +22,45 @@ def get_cart_data(request):
                 "quantity": item["quantity"],
                 "total_price": item["total_price"],
             }
-            for item in cart
+            for item in items
         ],
-        "total_price": cart.get_total_price(),
+        "total_price": summary["subtotal"],
+        "summary": summary,
     }
 
 
+def get_cart_summary(request):
+    return Cart(request).get_summary()
+
+
+def apply_cart_operations(request, operations):
+    """
+    Applies a batch of ``{"variant_id", "quantity", "mode"}`` operations to
+    the cart and returns its new summary. The variants are loaded in one
+    query; unknown ids fail the whole batch.
+    """
+    cart = Cart(request)
+    variant_ids = {operation["variant_id"] for operation in operations}
+    variants = ProductVariant.objects.in_bulk(variant_ids, field_name="variant_id")
+    missing = variant_ids - set(variants)
+    if missing:
+        raise ValidationError(
+            {str(variant_id): "Product not found." for variant_id in missing}
+        )
+
+    cart.apply(
+        [
+            (
+                variants[operation["variant_id"]],
+                operation["quantity"],
+                operation["mode"],
+            )
+            for operation in operations
+        ]
+    )
+    return cart.get_summary()
+
+
 def add_to_cart(
     request,
     variant_id,
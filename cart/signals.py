@@ -0,0 +1,14 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .cart import Cart
+
+
+@receiver(user_logged_in)
+def merge_session_cart_on_login(sender, request, user, **kwargs):
+    """
+    Moves the cart a visitor filled before logging in into their user cart.
+    """
+    session = getattr(request, "session", None)
+    if session is not None:
+        Cart.merge_session_cart(session, user)
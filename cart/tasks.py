@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cart
+
+logger = get_task_logger(__name__)
+
+
+@shared_task
+def purge_abandoned_carts(days=None, batch_size=1000):
+    """
+    Deletes database carts untouched for ``days`` (CART_ABANDONED_DAYS by
+    default): carts of anonymous sessions, and empty carts of users. Carts
+    are deleted in batches of ``batch_size`` to keep each transaction short.
+    """
+    days = settings.CART_ABANDONED_DAYS if days is None else days
+    threshold = timezone.now() - timedelta(days=days)
+    abandoned = Cart.objects.filter(updated_at__lt=threshold).filter(
+        Q(user__isnull=True) | Q(items__isnull=True)
+    )
+
+    deleted = 0
+    while True:
+        batch = list(abandoned.values_list("pk", flat=True).distinct()[:batch_size])
+        if not batch:
+            break
+        Cart.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+
+    logger.info(f"Purged {deleted} abandoned carts")
+    return deleted
@@ -1,10 +1,13 @@
 import pytest
+from django.conf import settings
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.test import RequestFactory
 from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.signals import user_logged_in
+from cart.backends import CART_REDIS_KEY, r
 from cart.cart import Cart
 from cart.models import Cart as CartModel, CartItem
-from .factories import UserFactory, ProductVariantFactory
+from .factories import UserFactory, ProductVariantFactory, User
 
 pytestmark = pytest.mark.django_db
 
@@ -101,31 +104,49 @@ class TestCartService:
     def test_add_item_guest_user(self):
         request = self._get_request_with_session(user=AnonymousUser())
         cart = Cart(request)
-        assert cart.cart.user is None
-        assert cart.cart.session_key is not None
+        assert cart.backend.key is None
 
         cart.add(variant=self.variant1, quantity=1)
 
         assert len(cart) == 1
-        session_key = request.session.session_key
-        cart_db = CartModel.objects.get(session_key=session_key)
-        assert cart_db.items.count() == 1
-        assert cart_db.items.first().quantity == 1
+        # Anonymous carts are kept in Redis, not in the database
+        assert not CartModel.objects.exists()
+        redis_key = CART_REDIS_KEY.format(request.session[settings.CART_SESSION_ID])
+        assert r.hgetall(redis_key) == {str(self.variant1.variant_id).encode(): b"1"}
+        assert r.ttl(redis_key) == settings.CART_SESSION_TTL
+
+    def test_guest_user_without_items_stores_nothing(self):
+        request = self._get_request_with_session(user=AnonymousUser())
+        cart = Cart(request)
+
+        assert len(cart) == 0
+        assert settings.CART_SESSION_ID not in request.session
+        assert not CartModel.objects.exists()
 
     def test_cart_persists_for_guest_user_across_requests(self):
         request1 = self._get_request_with_session(user=AnonymousUser())
         cart1 = Cart(request1)
         cart1.add(self.variant1)
 
-        session_key = request1.session.session_key
-
         request2 = self.request_factory.get("/")
         request2.session = request1.session  # Simulate same browser session
         request2.user = AnonymousUser()
 
         cart2 = Cart(request2)
         assert len(cart2) == 1
-        assert cart2.cart.session_key == session_key
+        assert cart2.backend.key == cart1.backend.key
+
+    def test_clear_guest_cart(self):
+        request = self._get_request_with_session(user=AnonymousUser())
+        cart = Cart(request)
+        cart.add(self.variant1, quantity=2)
+        redis_key = CART_REDIS_KEY.format(request.session[settings.CART_SESSION_ID])
+
+        cart.clear()
+
+        assert len(Cart(request)) == 0
+        assert not r.exists(redis_key)
+        assert settings.CART_SESSION_ID not in request.session
 
     # --- Cart Merging Scenario ---
 
@@ -135,9 +156,11 @@ class TestCartService:
         guest_cart = Cart(guest_request)
         guest_cart.add(self.variant1, quantity=2)
         guest_cart.add(self.variant2, quantity=1)
-        guest_session_key = guest_request.session.session_key
+        redis_key = CART_REDIS_KEY.format(
+            guest_request.session[settings.CART_SESSION_ID]
+        )
 
-        assert CartModel.objects.filter(session_key=guest_session_key).exists()
+        assert r.exists(redis_key)
 
         # 2. Authenticate the user and simulate a new request (login)
         # The new request will have the same session as the guest
@@ -145,13 +168,13 @@ class TestCartService:
         login_request.session = guest_request.session
         login_request.user = self.user
 
-        # 3. Initialize the cart for the logged-in user
-        # This should trigger the merge logic in Cart.__init__
+        # 3. Logging in merges the guest cart into the user's cart
+        user_logged_in.send(sender=User, request=login_request, user=self.user)
         user_cart = Cart(login_request)
 
         # 4. Assertions
         # - The guest cart should be deleted
-        assert not CartModel.objects.filter(session_key=guest_session_key).exists()
+        assert not r.exists(redis_key)
 
         # - The user's cart should now contain the items from the guest cart
         user_cart_db = CartModel.objects.get(user=self.user)
@@ -184,6 +207,7 @@ class TestCartService:
         login_request.session = guest_request.session
         login_request.user = self.user
 
+        user_logged_in.send(sender=User, request=login_request, user=self.user)
         final_cart = Cart(login_request)
 
         # 4. Assertions: Quantities should be combined
@@ -197,6 +221,55 @@ class TestCartService:
         item2 = user_cart_db.items.get(variant=self.variant2)
         assert item2.quantity == 3  # 0 (user) + 3 (guest)
 
+    def test_merge_runs_only_once(self):
+        guest_request = self._get_request_with_session(user=AnonymousUser())
+        Cart(guest_request).add(self.variant1, quantity=2)
+
+        login_request = self.request_factory.get("/")
+        login_request.session = guest_request.session
+        login_request.user = self.user
+
+        user_logged_in.send(sender=User, request=login_request, user=self.user)
+        user_logged_in.send(sender=User, request=login_request, user=self.user)
+
+        cart_db = CartModel.objects.get(user=self.user)
+        assert cart_db.items.get(variant=self.variant1).quantity == 2
+
+    def test_merge_is_a_single_upsert(self, django_assert_num_queries):
+        user_request = self._get_request_with_session()
+        Cart(user_request).add(self.variant1, quantity=1)
+
+        guest_request = self._get_request_with_session(user=AnonymousUser())
+        guest_cart = Cart(guest_request)
+        for variant in [self.variant1, self.variant2] + [
+            ProductVariantFactory(stock=5) for _ in range(10)
+        ]:
+            guest_cart.add(variant, quantity=1)
+
+        login_request = self.request_factory.get("/")
+        login_request.session = guest_request.session
+        login_request.user = self.user
+
+        # guest variants, user cart, lock, existing quantities, upsert
+        # (plus the savepoint around the merge)
+        with django_assert_num_queries(7):
+            Cart.merge_session_cart(login_request.session, self.user)
+
+        cart_db = CartModel.objects.get(user=self.user)
+        assert cart_db.items.count() == 12
+        assert cart_db.items.get(variant=self.variant1).quantity == 2
+
+    def test_authenticated_cart_does_not_merge_per_request(self):
+        guest_request = self._get_request_with_session(user=AnonymousUser())
+        Cart(guest_request).add(self.variant1, quantity=2)
+
+        request = self.request_factory.get("/")
+        request.session = guest_request.session
+        request.user = self.user
+
+        assert len(Cart(request)) == 0
+        assert not CartModel.objects.filter(user=self.user).exists()
+
     # --- Validation from services.py ---
     # Although validation is in services, we test the interaction via Cart class
     # for a more integrated test of the business logic.
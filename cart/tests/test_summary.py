@@ -0,0 +1,150 @@
+from decimal import Decimal
+
+import pytest
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from cart.cart import Cart
+from cart.models import Cart as CartModel, CartItem
+from discounts.models import Discount
+from .factories import UserFactory, ProductVariantFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestCartSummary:
+    def setup_method(self):
+        self.user = UserFactory()
+        self.variant1 = ProductVariantFactory(stock=10, price=Decimal("10.00"))
+        self.variant2 = ProductVariantFactory(stock=10, price=Decimal("25.00"))
+
+    def _get_cart(self):
+        request = RequestFactory().get("/")
+        SessionMiddleware(lambda req: None).process_request(request)
+        request.session.save()
+        request.user = self.user
+        return Cart(request)
+
+    def test_summary_totals(self):
+        cart = self._get_cart()
+        cart.add(variant=self.variant1, quantity=2)
+        cart.add(variant=self.variant2, quantity=1)
+
+        assert cart.get_summary() == {
+            "count": 3,
+            "subtotal": Decimal("45.00"),
+            "discount": Decimal("0.00"),
+            "total": Decimal("45.00"),
+        }
+
+    def test_summary_includes_automatic_discount(self):
+        Discount.objects.create(
+            name="Ten percent",
+            type=Discount.DISCOUNT_TYPE_PERCENTAGE,
+            amount=Decimal("10"),
+            valid_from="2000-01-01T00:00:00Z",
+            valid_to="2999-01-01T00:00:00Z",
+        )
+        cart = self._get_cart()
+        cart.add(variant=self.variant2, quantity=2)
+
+        summary = cart.get_summary()
+        assert summary["discount"] == Decimal("5.00")
+        assert summary["total"] == Decimal("45.00")
+
+    def test_cached_summary_costs_no_queries(self, django_assert_num_queries):
+        cart = self._get_cart()
+        cart.add(variant=self.variant1, quantity=2)
+        cart.get_summary()
+
+        cart = self._get_cart()
+        cart.cart  # the user's cart row is looked up on first use
+        with django_assert_num_queries(0):
+            assert cart.get_summary()["count"] == 2
+
+    def test_add_remove_and_clear_invalidate_summary(self):
+        cart = self._get_cart()
+        cart.add(variant=self.variant1, quantity=1)
+        assert cart.get_summary()["count"] == 1
+
+        cart.add(variant=self.variant2, quantity=2)
+        assert self._get_cart().get_summary()["count"] == 3
+
+        cart.remove(self.variant2)
+        assert self._get_cart().get_summary()["count"] == 1
+
+        cart.clear()
+        assert self._get_cart().get_summary()["count"] == 0
+
+    def test_price_change_invalidates_summary(self):
+        cart = self._get_cart()
+        cart.add(variant=self.variant1, quantity=2)
+        assert cart.get_summary()["subtotal"] == Decimal("20.00")
+
+        self.variant1.price = Decimal("12.00")
+        self.variant1.save()
+
+        assert self._get_cart().get_summary()["subtotal"] == Decimal("24.00")
+
+    def test_unrelated_product_and_stock_changes_keep_summary(
+        self, django_assert_num_queries
+    ):
+        cart = self._get_cart()
+        cart.add(variant=self.variant1, quantity=2)
+        cart.get_summary()
+
+        self.variant1.stock = 5
+        self.variant1.save()
+        self.variant2.price = Decimal("30.00")
+        self.variant2.save()
+        ProductVariantFactory()
+
+        cart = self._get_cart()
+        cart.cart
+        with django_assert_num_queries(0):
+            assert cart.get_summary()["subtotal"] == Decimal("20.00")
+
+    @pytest.mark.parametrize("rows", [1, 10, 50])
+    def test_totals_load_items_in_one_query(self, rows, django_assert_num_queries):
+        cart_model = CartModel.objects.create(user=self.user)
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart_model, variant=ProductVariantFactory(), quantity=1)
+                for _ in range(rows)
+            ]
+        )
+        cart = self._get_cart()
+        cart.cart
+
+        with django_assert_num_queries(1):
+            assert len(cart) == rows
+            cart.get_total_price()
+            for item in cart:
+                item["variant"].product.name
+
+
+class TestCartSummaryAPI:
+    def test_get_summary(self):
+        user = UserFactory()
+        variant = ProductVariantFactory(stock=10, price=Decimal("10.00"))
+        cart = CartModel.objects.create(user=user)
+        CartItem.objects.create(cart=cart, variant=variant, quantity=3)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.get(reverse("api-v1:cart-summary"))
+
+        assert response.status_code == 200
+        assert response.data["count"] == 3
+        assert Decimal(response.data["subtotal"]) == Decimal("30.00")
+        assert Decimal(response.data["total"]) == Decimal("30.00")
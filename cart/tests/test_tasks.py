@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from cart.models import Cart
+from cart.tasks import purge_abandoned_carts
+from .factories import CartFactory, CartItemFactory, UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _age(cart, days):
+    Cart.objects.filter(pk=cart.pk).update(
+        updated_at=timezone.now() - timedelta(days=days)
+    )
+
+
+def test_purge_abandoned_carts():
+    old_session_cart = Cart.objects.create(session_key="old")
+    CartItemFactory(cart=old_session_cart)
+    _age(old_session_cart, 40)
+
+    recent_session_cart = Cart.objects.create(session_key="recent")
+    _age(recent_session_cart, 5)
+
+    old_empty_user_cart = CartFactory()
+    _age(old_empty_user_cart, 40)
+
+    old_user_cart = CartFactory(user=UserFactory())
+    CartItemFactory(cart=old_user_cart)
+    _age(old_user_cart, 40)
+
+    deleted = purge_abandoned_carts(days=30, batch_size=1)
+
+    assert deleted == 2
+    assert set(Cart.objects.values_list("pk", flat=True)) == {
+        recent_session_cart.pk,
+        old_user_cart.pk,
+    }
@@ -123,9 +123,9 @@ class TestCartAPI:
         response = self.client.post(url, {"quantity": 2})
 
         assert response.status_code == 200
-        session_key = self.client.session.session_key
-        cart = Cart.objects.get(session_key=session_key)
-        assert cart.items.get(variant=self.variant1).quantity == 2
+        cart_response = self.client.get(reverse("api-v1:cart-list"))
+        assert cart_response.data["items"][0]["quantity"] == 2
+        assert not Cart.objects.exists()
 
     def test_api_cart_merges_on_login(self):
         # 1. Guest adds an item
@@ -133,19 +133,127 @@ class TestCartAPI:
             "api-v1:cart-add", kwargs={"variant_id": self.variant1.variant_id}
         )
         self.client.post(add_url, {"quantity": 1})
-        guest_session_key = self.client.session.session_key
 
-        # 2. User logs in (the client now carries the session)
+        # 2. User logs in with the same session
+        login_response = self.client.post(
+            reverse("api-v1:auth:username-password-login"),
+            {"username": self.user.username, "password": "testpassword"},
+        )
+        assert login_response.status_code == 200
         self.client.force_authenticate(user=self.user)
 
-        # 3. Get the cart. The Cart.__init__ logic should be triggered by the request
+        # 3. Get the cart. The guest cart was merged at login
         get_url = reverse("api-v1:cart-list")
         response = self.client.get(get_url)
 
         assert response.status_code == 200
         # Guest cart is deleted
-        assert not Cart.objects.filter(session_key=guest_session_key).exists()
+        assert "cart" not in self.client.session
         # Item is now in the user's cart
         user_cart = Cart.objects.get(user=self.user)
         assert user_cart.items.get(variant=self.variant1).quantity == 1
         assert len(response.data["items"]) == 1
+
+
+class TestCartBatchAPI:
+    def setup_method(self):
+        self.client = APIClient()
+        self.user = UserFactory()
+        self.variant1 = ProductVariantFactory(stock=10, price=10)
+        self.variant2 = ProductVariantFactory(stock=5, price=20)
+        self.url = reverse("api-v1:cart-batch")
+
+    def _post(self, operations):
+        return self.client.post(self.url, {"operations": operations}, format="json")
+
+    def test_batch_applies_operations_and_returns_summary(self):
+        self.client.force_authenticate(user=self.user)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, variant=self.variant1, quantity=2)
+
+        response = self._post(
+            [
+                {"variant_id": str(self.variant1.variant_id), "quantity": 3},
+                {"variant_id": str(self.variant2.variant_id), "quantity": 4},
+                {
+                    "variant_id": str(self.variant2.variant_id),
+                    "quantity": 2,
+                    "mode": "set",
+                },
+            ]
+        )
+
+        assert response.status_code == 200
+        assert response.data["count"] == 7
+        assert float(response.data["subtotal"]) == 90.0
+        items = dict(cart.items.values_list("variant_id", "quantity"))
+        assert items == {self.variant1.variant_id: 5, self.variant2.variant_id: 2}
+
+    def test_batch_remove(self):
+        self.client.force_authenticate(user=self.user)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, variant=self.variant1, quantity=2)
+
+        response = self._post(
+            [{"variant_id": str(self.variant1.variant_id), "mode": "remove"}]
+        )
+
+        assert response.status_code == 200
+        assert response.data["count"] == 0
+        assert not cart.items.exists()
+
+    def test_batch_is_all_or_nothing(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self._post(
+            [
+                {"variant_id": str(self.variant1.variant_id), "quantity": 1},
+                {"variant_id": str(self.variant2.variant_id), "quantity": 6},
+            ]
+        )
+
+        assert response.status_code == 400
+        assert str(self.variant2.variant_id) in response.data["errors"]
+        assert not CartItem.objects.exists()
+
+    def test_batch_unknown_variant(self):
+        self.client.force_authenticate(user=self.user)
+        unknown = "00000000-0000-0000-0000-000000000000"
+
+        response = self._post([{"variant_id": unknown, "quantity": 1}])
+
+        assert response.status_code == 400
+        assert unknown in response.data["errors"]
+
+    def test_batch_guest_user(self):
+        response = self._post(
+            [
+                {"variant_id": str(self.variant1.variant_id), "quantity": 2},
+                {"variant_id": str(self.variant2.variant_id), "quantity": 1},
+            ]
+        )
+
+        assert response.status_code == 200
+        assert response.data["count"] == 3
+        cart_response = self.client.get(reverse("api-v1:cart-list"))
+        assert len(cart_response.data["items"]) == 2
+
+    @pytest.mark.parametrize("rows", [1, 10, 40])
+    def test_batch_query_count(self, rows, django_assert_num_queries):
+        self.client.force_authenticate(user=self.user)
+        Cart.objects.create(user=self.user)
+        variants = [ProductVariantFactory(stock=10) for _ in range(rows)]
+        operations = [
+            {"variant_id": str(variant.variant_id), "quantity": 1}
+            for variant in variants
+        ]
+
+        # Session middleware: 4 to create the session and 3 to save it.
+        # Batch: variants, user cart, current quantities, then the upsert and
+        # cart touch in a savepoint (4). Summary: cart items, discount usages
+        # and automatic discounts.
+        with django_assert_num_queries(17):
+            response = self._post(operations)
+
+        assert response.status_code == 200
+        assert response.data["count"] == rows
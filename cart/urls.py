@@ -3,6 +3,16 @@ from .views import CartViewSet
 
 urlpatterns = [
     path("cart/", CartViewSet.as_view({"get": "list"}), name="cart-list"),
+    path(
+        "cart/summary/",
+        CartViewSet.as_view({"get": "summary"}),
+        name="cart-summary",
+    ),
+    path(
+        "cart/batch/",
+        CartViewSet.as_view({"post": "batch"}),
+        name="cart-batch",
+    ),
     path(
         "cart/add/<uuid:variant_id>/",
         CartViewSet.as_view({"post": "add_to_cart"}),
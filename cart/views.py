@@ -12,7 +12,12 @@ from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 
 from ecommerce_api.core.api_standard_response import ApiResponse
-from .serializers import CartSerializer, AddToCartSerializer
+from .serializers import (
+    AddToCartSerializer,
+    CartBatchSerializer,
+    CartSerializer,
+    CartSummarySerializer,
+)
 from . import services
 from shop.models import ProductVariant
 
@@ -92,6 +97,65 @@ class CartViewSet(viewsets.ViewSet):
         serializer = CartSerializer(cart_data, context={"request": request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @extend_schema(
+        operation_id="cart_get_summary",
+        description="Get the item count and totals of the cart, e.g. for a cart badge.",
+        tags=["Cart"],
+        responses={
+            200: OpenApiResponse(
+                response=CartSummarySerializer,
+                description="Cart summary retrieved successfully.",
+            ),
+        },
+    )
+    @action(detail=False, methods=["get"], url_path="summary")
+    def summary(self, request):
+        """
+        Retrieve the item count, subtotal, automatic discount and total of the cart.
+        """
+        summary = services.get_cart_summary(request)
+        return Response(CartSummarySerializer(summary).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        operation_id="cart_batch_update",
+        description=(
+            "Apply several cart changes at once. Each operation adds to (add), "
+            "replaces (set) or removes (remove) the quantity of a variant. "
+            "Either all operations are applied or none are."
+        ),
+        tags=["Cart"],
+        request=CartBatchSerializer,
+        responses={
+            200: OpenApiResponse(
+                response=CartSummarySerializer,
+                description="Cart updated; the new cart summary is returned.",
+            ),
+            400: OpenApiResponse(
+                description="Invalid operations, unknown variants or insufficient stock."
+            ),
+        },
+    )
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request):
+        """
+        Apply a batch of add/set/remove operations to the cart.
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            summary = services.apply_cart_operations(
+                request, serializer.validated_data["operations"]
+            )
+        except ValidationError as e:
+            logger.warning(f"Cart batch validation error: {e.detail}")
+            return ApiResponse.error(
+                message="The cart could not be updated.",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                errors=e.detail,
+            )
+        return Response(CartSummarySerializer(summary).data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["post"], url_path="add")
     def add_to_cart(self, request, variant_id=None):
         serializer = AddToCartSerializer(data=request.data)
@@ -180,7 +244,5 @@ class CartViewSet(viewsets.ViewSet):
         Returns:
             Response: An empty response with a 204 status code.
         """
-        cart = services.get_cart_data(request)
-        if cart:
-            services.clear_cart(request)
+        services.clear_cart(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
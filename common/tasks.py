@@ -0,0 +1,23 @@
+import logging
+
+from celery import shared_task
+
+from common.utils.cache import get_cache_loader, release_lock, store
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_cache_entry(key, loader_name, args, soft_timeout, hard_timeout):
+    """
+    Rebuilds a stale cache entry in the background using a registered loader.
+    The rebuild lock taken by the request that scheduled the refresh is
+    released once the new value is stored.
+    """
+    try:
+        value = get_cache_loader(loader_name)(*args)
+        store(key, value, soft_timeout, hard_timeout)
+    except Exception as e:
+        logger.error(f"Error refreshing cache entry {key}: {e}")
+    finally:
+        release_lock(key)
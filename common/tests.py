@@ -1,2 +1,258 @@
+from unittest.mock import patch
 
-# Create your tests here.
+import pytest
+import redis
+import requests
+from django.core.cache import cache
+from prometheus_client import REGISTRY
+
+from common.utils.cache import acquire_lock, get_or_compute, store
+from common.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpenError
+from common.utils.http import (
+    BulkheadFullError,
+    HttpClient,
+    get_client,
+    get_client_config,
+)
+from payment.gateways import ZibalGateway
+from shipping.providers import PostexShippingProvider, ShippingProviderError
+from sms.providers import SmsIrProvider
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"value-{self.calls}"
+
+
+def make_stale(key, value="old"):
+    store(key, value, soft_timeout=60, hard_timeout=600)
+    cache.delete(f"{key}:fresh")
+
+
+def test_miss_computes_and_caches():
+    compute = Counter()
+    assert get_or_compute("key", compute, 60) == "value-1"
+    assert get_or_compute("key", compute, 60) == "value-1"
+    assert compute.calls == 1
+    assert cache.get("key") == "value-1"
+
+
+def test_stale_value_is_rebuilt_once():
+    compute = Counter()
+    make_stale("key")
+
+    assert get_or_compute("key", compute, 60, 600) == "value-1"
+    assert get_or_compute("key", compute, 60, 600) == "value-1"
+    assert compute.calls == 1
+
+
+def test_stale_value_is_served_while_another_worker_refreshes():
+    compute = Counter()
+    make_stale("key")
+    assert acquire_lock("key")
+
+    assert get_or_compute("key", compute, 60, 600) == "old"
+    assert compute.calls == 0
+
+
+def test_miss_waits_for_lock_holder_then_computes():
+    compute = Counter()
+    assert acquire_lock("key")
+
+    assert get_or_compute("key", compute, 60, wait_timeout=0.1) == "value-1"
+
+
+def test_lock_is_released_when_compute_fails():
+    def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        get_or_compute("key", failing, 60)
+    assert acquire_lock("key")
+
+
+def test_stale_value_refreshed_in_background(settings):
+    settings.CACHE_BACKGROUND_REFRESH = True
+    compute = Counter()
+    make_stale("key")
+
+    with patch("common.tasks.refresh_cache_entry.delay") as delay:
+        value = get_or_compute("key", compute, 60, 600, refresh=("loader", ("arg",)))
+
+    assert value == "old"
+    assert compute.calls == 0
+    delay.assert_called_once_with("key", "loader", ["arg"], 60, 600)
+
+
+def _http_config(**overrides):
+    config = get_client_config("test")
+    config.update(
+        {
+            "pool_size": 2,
+            "timeout": 5,
+            "retries": 2,
+            "backoff_factor": 0,
+            "status_forcelist": [503],
+            "retry_methods": ["GET"],
+        }
+    )
+    config.update(overrides)
+    return config
+
+
+def test_providers_share_a_keep_alive_connection(provider_stub_server, settings):
+    settings.SMS_IR_API_KEY = "key"
+    settings.SMS_IR_LINE_NUMBER = "3000"
+
+    SmsIrProvider().send_text("09123456789", "one")
+    SmsIrProvider().send_text("09123456789", "two")
+
+    assert SmsIrProvider().session is get_client("sms_ir")
+    assert len(provider_stub_server.requests) == 2
+    assert len(provider_stub_server.connections) == 1
+
+
+def test_zibal_gateway_against_stub_server(provider_stub_server):
+    response = ZibalGateway().create_payment_request(
+        amount=1000, order_id="order", callback_url="http://testserver/verify/"
+    )
+
+    assert response["trackId"] == 1000
+
+
+def test_requests_are_measured_per_provider(provider_stub_server):
+    labels = {"provider": "zibal", "method": "POST", "status": "200"}
+    before = (
+        REGISTRY.get_sample_value(
+            "outbound_http_request_duration_seconds_count", labels
+        )
+        or 0
+    )
+
+    get_client("zibal").post(f"{provider_stub_server.url}/zibal/v1/verify", json={})
+
+    assert (
+        REGISTRY.get_sample_value(
+            "outbound_http_request_duration_seconds_count", labels
+        )
+        == before + 1
+    )
+
+
+def test_connection_errors_are_counted():
+    client = HttpClient("unreachable", _http_config(retries=0))
+    labels = {"provider": "unreachable", "method": "GET", "error": "ConnectionError"}
+    before = (
+        REGISTRY.get_sample_value("outbound_http_request_errors_total", labels) or 0
+    )
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get("http://127.0.0.1:1/")
+
+    assert (
+        REGISTRY.get_sample_value("outbound_http_request_errors_total", labels)
+        == before + 1
+    )
+
+
+def test_only_retry_methods_are_retried_on_status(provider_stub_server):
+    provider_stub_server.respond("GET", "/flaky", 503)
+    provider_stub_server.respond("POST", "/flaky", 503)
+    client = HttpClient("flaky", _http_config())
+
+    assert client.get(f"{provider_stub_server.url}/flaky").status_code == 503
+    assert client.post(f"{provider_stub_server.url}/flaky").status_code == 503
+
+    methods = [method for method, _path, _port in provider_stub_server.requests]
+    assert methods.count("GET") == 3
+    assert methods.count("POST") == 1
+
+
+def _tripped_client(server, **overrides):
+    server.respond("POST", "/down", 503)
+    client = HttpClient("down", _http_config(failure_threshold=2, **overrides))
+    for _ in range(2):
+        assert client.post(f"{server.url}/down").status_code == 503
+    return client
+
+
+def test_circuit_opens_after_repeated_failures(provider_stub_server):
+    client = _tripped_client(provider_stub_server)
+
+    with pytest.raises(CircuitOpenError, match="circuit open"):
+        client.post(f"{provider_stub_server.url}/down")
+
+    assert client.breaker.state == OPEN
+    assert len(provider_stub_server.requests) == 2
+    # The state is shared: a client in another process sees it too.
+    assert HttpClient("down", _http_config()).breaker.state == OPEN
+
+
+def test_half_open_circuit_lets_one_probe_through(provider_stub_server):
+    client = _tripped_client(provider_stub_server, reset_timeout=30)
+    provider_stub_server.respond("POST", "/down", 200)
+    later = client.breaker._load()["opened_until"]
+
+    with patch("common.utils.circuit_breaker.time.time", return_value=float(later)):
+        assert client.breaker.state == HALF_OPEN
+        probe = client.breaker.before_request()
+        with pytest.raises(CircuitOpenError):
+            client.post(f"{provider_stub_server.url}/down")
+        client.breaker.record_success(probe)
+
+    assert client.breaker.state == CLOSED
+    assert client.post(f"{provider_stub_server.url}/down").status_code == 200
+
+
+def test_failed_probe_opens_circuit_again(provider_stub_server):
+    client = _tripped_client(provider_stub_server)
+    later = float(client.breaker._load()["opened_until"]) + 1
+
+    with patch("common.utils.circuit_breaker.time.time", return_value=later):
+        assert client.post(f"{provider_stub_server.url}/down").status_code == 503
+        assert client.breaker.state == OPEN
+
+
+def test_open_circuit_fails_provider_calls_fast(provider_stub_server, settings):
+    settings.POSTEX_API_KEY = "key"
+    provider = PostexShippingProvider()
+    provider.session.breaker._open()
+
+    with pytest.raises(ShippingProviderError, match="circuit open"):
+        provider.get_cities()
+
+    assert provider_stub_server.requests == []
+
+
+def test_bulkhead_limits_concurrent_requests(provider_stub_server):
+    client = HttpClient("busy", _http_config(max_concurrency=1))
+    client._bulkhead.acquire()
+
+    with pytest.raises(BulkheadFullError):
+        client.get(f"{provider_stub_server.url}/zibal/v1/request")
+
+    client._bulkhead.release()
+    assert client.post(f"{provider_stub_server.url}/zibal/v1/request").ok
+
+
+def test_circuit_lets_requests_through_without_redis(provider_stub_server):
+    client = HttpClient("zibal", _http_config())
+
+    with patch(
+        "common.utils.circuit_breaker.r.hgetall",
+        side_effect=redis.ConnectionError("down"),
+    ):
+        response = client.post(f"{provider_stub_server.url}/zibal/v1/request")
+
+    assert response.ok
@@ -0,0 +1,148 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold the rebuild lock for a key before it is
+# considered dead and another worker is allowed to take over.
+DEFAULT_LOCK_TIMEOUT = 10
+# How long a request that finds no value at all waits for the worker holding
+# the lock before giving up and computing the value itself.
+DEFAULT_WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+
+_loaders = {}
+
+
+def register_cache_loader(name):
+    """
+    Registers a function that can rebuild a cached value from JSON-serializable
+    arguments, so that stale entries can be refreshed by a Celery worker.
+    """
+
+    def decorator(func):
+        _loaders[name] = func
+        return func
+
+    return decorator
+
+
+def get_cache_loader(name):
+    return _loaders[name]
+
+
+def _fresh_key(key):
+    return f"{key}:fresh"
+
+
+def _lock_key(key):
+    return f"{key}:lock"
+
+
+def acquire_lock(key, timeout=DEFAULT_LOCK_TIMEOUT, token=1):
+    """
+    Tries to become the single worker rebuilding ``key``. A unique ``token``
+    lets the holder release only its own lock, see ``release_lock``.
+    """
+    return cache.add(_lock_key(key), token, timeout)
+
+
+def release_lock(key, token=None):
+    """
+    Releases the lock of ``key``. With a ``token``, the lock is left alone
+    unless it still holds that token, i.e. it was not taken over by another
+    worker after it expired.
+    """
+    if token is not None and cache.get(_lock_key(key)) != token:
+        return
+    cache.delete(_lock_key(key))
+
+
+def store(key, value, soft_timeout, hard_timeout=None):
+    """
+    Stores ``value`` under ``key`` for ``hard_timeout`` seconds and marks it
+    fresh for ``soft_timeout`` seconds. The value itself is stored as-is, so
+    plain ``cache.get(key)`` callers keep working.
+    """
+    hard_timeout = hard_timeout or soft_timeout
+    cache.set(key, value, hard_timeout)
+    cache.set(_fresh_key(key), 1, min(soft_timeout, hard_timeout))
+
+
+def _compute_and_store(key, compute, soft_timeout, hard_timeout):
+    try:
+        value = compute()
+        store(key, value, soft_timeout, hard_timeout)
+        return value
+    finally:
+        release_lock(key)
+
+
+def _schedule_refresh(key, refresh, soft_timeout, hard_timeout):
+    from common.tasks import refresh_cache_entry
+
+    loader_name, args = refresh
+    try:
+        refresh_cache_entry.delay(
+            key, loader_name, list(args), soft_timeout, hard_timeout
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Could not schedule background refresh of {key}: {e}")
+        return False
+
+
+def get_or_compute(
+    key,
+    compute,
+    soft_timeout,
+    hard_timeout=None,
+    refresh=None,
+    lock_timeout=DEFAULT_LOCK_TIMEOUT,
+    wait_timeout=DEFAULT_WAIT_TIMEOUT,
+):
+    """
+    Returns the cached value for ``key``, computing it with ``compute`` when
+    needed, while protecting the cache against stampedes.
+
+    - A fresh value (younger than ``soft_timeout``) is returned directly.
+    - A stale value (older than ``soft_timeout`` but younger than
+      ``hard_timeout``) is returned immediately, and a single worker rebuilds
+      it: inline, or through Celery when ``refresh`` is given as a
+      ``(loader_name, args)`` pair and ``CACHE_BACKGROUND_REFRESH`` is enabled.
+    - On a miss only the worker holding the per-key lock computes the value;
+      the others wait up to ``wait_timeout`` seconds for it to appear.
+    """
+    hard_timeout = hard_timeout or soft_timeout
+    values = cache.get_many([key, _fresh_key(key)])
+    value = values.get(key)
+
+    if value is not None:
+        if _fresh_key(key) in values:
+            return value
+        if not acquire_lock(key, lock_timeout):
+            # Someone else is already refreshing this entry.
+            return value
+        background = refresh and getattr(settings, "CACHE_BACKGROUND_REFRESH", False)
+        if background and _schedule_refresh(key, refresh, soft_timeout, hard_timeout):
+            return value
+        return _compute_and_store(key, compute, soft_timeout, hard_timeout)
+
+    if acquire_lock(key, lock_timeout):
+        return _compute_and_store(key, compute, soft_timeout, hard_timeout)
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    # The lock holder is too slow (or died); serve this request ourselves
+    # rather than failing it.
+    value = compute()
+    store(key, value, soft_timeout, hard_timeout)
+    return value
@@ -0,0 +1,169 @@
+"""
+Circuit breaker for outbound provider calls, shared by all processes through
+Redis.
+
+The state of each provider is a Redis hash with the number of recent
+failures and, once it has tripped, the time until which the circuit stays
+open:
+
+* closed: requests go through. ``failure_threshold`` failures within
+  ``failure_window`` seconds open the circuit.
+* open: requests fail at once with ``CircuitOpenError`` for
+  ``reset_timeout`` seconds, without touching the network.
+* half-open: after that, one request per ``probe_timeout`` seconds (across
+  all processes) is let through as a probe. Its success closes the circuit
+  and its failure opens it again.
+
+If Redis is unreachable the breaker lets requests through rather than
+taking the provider down with it.
+"""
+
+import logging
+import sys
+import time
+
+import redis
+import requests
+from django.conf import settings
+from prometheus_client import Counter, Gauge
+
+if "test" in sys.argv or getattr(settings, "TESTING", False):
+    from fakeredis import FakeRedis
+
+    r = FakeRedis()
+else:
+    r = redis.from_url(settings.REDIS_URL)
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_KEY = "circuit:{}"
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+CIRCUIT_STATE = Gauge(
+    "outbound_circuit_state",
+    "Circuit state of a third-party provider as last seen by this process "
+    "(0 closed, 1 half-open, 2 open).",
+    ["provider"],
+)
+CIRCUIT_REJECTIONS = Counter(
+    "outbound_circuit_rejections_total",
+    "Requests to third-party providers refused without being sent.",
+    ["provider", "reason"],
+)
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request to a provider whose circuit is open.
+    Being a ``RequestException``, it is handled like a network error.
+    """
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        provider,
+        failure_threshold=5,
+        failure_window=60,
+        reset_timeout=30,
+        probe_timeout=10,
+    ):
+        self.provider = provider
+        self.key = CIRCUIT_KEY.format(provider)
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+
+    def _load(self):
+        try:
+            stored = r.hgetall(self.key)
+        except redis.RedisError:
+            logger.warning(f"Circuit state of {self.provider} is unavailable.")
+            return {}
+        return {field.decode(): value.decode() for field, value in stored.items()}
+
+    def _state(self, stored, now):
+        opened_until = stored.get("opened_until")
+        if opened_until is None:
+            state = CLOSED
+        elif now < float(opened_until):
+            state = OPEN
+        else:
+            state = HALF_OPEN
+        CIRCUIT_STATE.labels(self.provider).set(_STATE_VALUES[state])
+        return state
+
+    @property
+    def state(self):
+        return self._state(self._load(), time.time())
+
+    def before_request(self):
+        """
+        Raises ``CircuitOpenError`` if the request must not be sent. Returns
+        the stored state, to be passed to ``record_success`` or
+        ``record_failure``.
+        """
+        now = time.time()
+        stored = self._load()
+        state = self._state(stored, now)
+        if state == CLOSED:
+            return stored
+
+        opened_until = float(stored["opened_until"])
+        if state == HALF_OPEN:
+            # The first request of each probe slot is the probe.
+            slot = int((now - opened_until) // self.probe_timeout)
+            try:
+                if r.hincrby(self.key, f"probe:{slot}", 1) == 1:
+                    logger.info(f"Probing {self.provider} (circuit half-open).")
+                    return stored
+            except redis.RedisError:
+                return stored
+            retry_in = self.probe_timeout
+        else:
+            retry_in = opened_until - now
+
+        CIRCUIT_REJECTIONS.labels(self.provider, "open").inc()
+        raise CircuitOpenError(
+            f"{self.provider} is unavailable (circuit open); "
+            f"retry in {max(int(retry_in), 1)}s."
+        )
+
+    def record_success(self, stored):
+        if not stored:
+            return
+        try:
+            r.delete(self.key)
+        except redis.RedisError:
+            return
+        if "opened_until" in stored:
+            logger.info(f"Circuit of {self.provider} closed.")
+        CIRCUIT_STATE.labels(self.provider).set(_STATE_VALUES[CLOSED])
+
+    def record_failure(self, stored):
+        try:
+            if "opened_until" not in stored:
+                failures = r.hincrby(self.key, "failures", 1)
+                if failures == 1:
+                    r.expire(self.key, self.failure_window)
+                if failures < self.failure_threshold:
+                    return
+            self._open()
+        except redis.RedisError:
+            logger.warning(f"Could not record a failure of {self.provider}.")
+
+    def _open(self):
+        opened_until = time.time() + self.reset_timeout
+        pipe = r.pipeline()
+        pipe.delete(self.key)
+        pipe.hset(self.key, "opened_until", opened_until)
+        # Forget the circuit if nobody calls the provider for a while.
+        pipe.expire(self.key, self.reset_timeout + self.failure_window)
+        pipe.execute()
+        logger.warning(f"Circuit of {self.provider} opened for {self.reset_timeout}s.")
+        CIRCUIT_STATE.labels(self.provider).set(_STATE_VALUES[OPEN])
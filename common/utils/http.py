@@ -0,0 +1,172 @@
+"""
+Shared outbound HTTP clients for third-party providers (Zibal, Postex,
+SMS.ir).
+
+Each provider gets one process-wide ``requests.Session`` whose connection
+pool keeps connections to its host alive between calls, instead of opening a
+new connection (and TLS handshake) per request. Pool size, timeout and retry
+policy come from ``HTTP_CLIENTS[provider]``, falling back to
+``HTTP_CLIENT_DEFAULTS``. Every request is timed and counted in Prometheus,
+labelled by provider.
+
+Connect errors are always retried, since the request never reached the
+provider. Read errors and ``status_forcelist`` responses are only retried
+for ``retry_methods``, so non-idempotent calls (e.g. sending an SMS) are not
+repeated unless a provider is configured to allow it.
+
+Calls are also guarded by a ``CircuitBreaker`` shared through Redis, and by
+a bulkhead allowing at most ``max_concurrency`` requests to a provider at a
+time in each process. Both refuse requests with a ``RequestException``
+subclass, so providers report them like network errors, within
+milliseconds instead of after a timeout. Network errors and 5xx responses
+count as failures.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from prometheus_client import Counter, Histogram
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .circuit_breaker import CIRCUIT_REJECTIONS, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DURATION = Histogram(
+    "outbound_http_request_duration_seconds",
+    "Duration of HTTP requests to third-party providers.",
+    ["provider", "method", "status"],
+)
+REQUEST_ERRORS = Counter(
+    "outbound_http_request_errors_total",
+    "HTTP requests to third-party providers that failed without a response.",
+    ["provider", "method", "error"],
+)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class BulkheadFullError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request to a provider that already has
+    ``max_concurrency`` requests in flight from this process.
+    """
+
+
+def get_client_config(provider):
+    config = dict(settings.HTTP_CLIENT_DEFAULTS)
+    config.update(settings.HTTP_CLIENTS.get(provider, {}))
+    return config
+
+
+class HttpClient:
+    """
+    A pooled keep-alive session for one provider. Takes absolute URLs and the
+    keyword arguments of ``requests.Session.request``.
+    """
+
+    def __init__(self, provider, config=None):
+        self.provider = provider
+        config = config or get_client_config(provider)
+        self.timeout = config["timeout"]
+        retry = Retry(
+            total=config["retries"],
+            backoff_factor=config["backoff_factor"],
+            status_forcelist=config["status_forcelist"],
+            allowed_methods=config["retry_methods"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config["pool_size"],
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.breaker = CircuitBreaker(
+            provider,
+            failure_threshold=config["failure_threshold"],
+            failure_window=config["failure_window"],
+            reset_timeout=config["reset_timeout"],
+            probe_timeout=config["probe_timeout"],
+        )
+        self._bulkhead = threading.BoundedSemaphore(config["max_concurrency"])
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        method = method.upper()
+        if not self._bulkhead.acquire(blocking=False):
+            CIRCUIT_REJECTIONS.labels(self.provider, "bulkhead").inc()
+            raise BulkheadFullError(
+                f"{self.provider} is busy: too many requests in flight."
+            )
+        try:
+            circuit = self.breaker.before_request()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                REQUEST_DURATION.labels(self.provider, method, "error").observe(
+                    time.perf_counter() - start
+                )
+                REQUEST_ERRORS.labels(self.provider, method, type(e).__name__).inc()
+                self.breaker.record_failure(circuit)
+                raise
+        finally:
+            self._bulkhead.release()
+
+        REQUEST_DURATION.labels(
+            self.provider, method, str(response.status_code)
+        ).observe(time.perf_counter() - start)
+        if response.status_code >= 500:
+            self.breaker.record_failure(circuit)
+        else:
+            self.breaker.record_success(circuit)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def get_client(provider):
+    """
+    Returns the shared ``HttpClient`` of ``provider``, creating it on first use.
+    """
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = _clients[provider] = HttpClient(provider)
+    return client
+
+
+def reset_clients():
+    """
+    Closes and forgets all clients, so the next ones pick up changed settings.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+# Pooled sockets must not be shared with forked (e.g. Celery prefork) workers.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_clients.clear)
@@ -1,5 +1,6 @@
 import json
 import os
+import shutil
 from types import SimpleNamespace
 from unittest.mock import patch
 
@@ -12,6 +13,12 @@ from django.core.management import call_command
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecommerce_api.settings.test")
 
 
+@pytest.fixture(autouse=True, scope="session")
+def remove_test_media():
+    yield
+    shutil.rmtree(django_settings.MEDIA_ROOT, ignore_errors=True)
+
+
 @pytest.fixture(autouse=True)
 def enable_db_access_for_all_tests(db):
     return db
@@ -23,6 +30,24 @@ def flush_db(db):
     call_command("flush", verbosity=0, interactive=False)
 
 
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    from common.utils.circuit_breaker import r
+
+    r.flushdb()
+    yield
+    r.flushdb()
+
+
+@pytest.fixture(autouse=True)
+def reset_discount_usage():
+    from discounts.usage import r
+
+    r.flushdb()
+    yield
+    r.flushdb()
+
+
 class SettingsWrapper:
     def __init__(self, settings):
         self._settings = settings
@@ -115,8 +140,99 @@ class RequestsMock:
 def requests_mock(monkeypatch):
     mocker = RequestsMock()
 
-    def _post(self, url, **kwargs):
-        return mocker._handle("POST", url)
+    def _request(self, method, url, **kwargs):
+        return mocker._handle(method, url)
 
-    monkeypatch.setattr(requests.Session, "post", _post)
+    monkeypatch.setattr(requests.Session, "request", _request)
     return mocker
+
+
+class ProviderStubServer:
+    """
+    A local HTTP server answering like Zibal, Postex and SMS.ir, so the
+    providers can be exercised (and benchmarked) without network access.
+    Connections are kept alive, like the real providers do.
+    """
+
+    ROUTES = {
+        ("POST", "/zibal/v1/request"): (200, {"result": 100, "trackId": 1000}),
+        ("POST", "/zibal/v1/verify"): (
+            200,
+            {"result": 100, "amount": 0, "orderId": "", "refNumber": "stub"},
+        ),
+        ("POST", "/sms/v1/send/verify"): (200, {"status": 1, "data": {"id": 1}}),
+        ("POST", "/sms/v1/send/bulk"): (200, {"status": 1, "data": {"id": 1}}),
+        ("POST", "/postex/api/v1/parcels/bulk"): (200, {"data": {"orders": []}}),
+        ("POST", "/postex/api/v1/shipping/quotes"): (200, {"data": []}),
+        ("GET", "/postex/api/v1/locality/cities/all"): (200, {"data": []}),
+    }
+
+    def __init__(self):
+        self.routes = dict(self.ROUTES)
+        self.requests = []
+        self._server = None
+
+    def respond(self, method, path, status_code=200, json_data=None):
+        self.routes[(method, path)] = (status_code, json_data or {})
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def connections(self):
+        """The client ports the requests arrived from."""
+        return {port for _method, _path, port in self.requests}
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import threading
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                path = self.path.split("?", 1)[0]
+                stub.requests.append((self.command, path, self.client_address[1]))
+                status_code, body = stub.routes.get(
+                    (self.command, path), (404, {"message": "Not found."})
+                )
+                content = json.dumps(body).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def provider_stub_server(settings):
+    from common.utils.http import reset_clients
+
+    server = ProviderStubServer()
+    server.start()
+    settings.ZIBAL_API_URL = f"{server.url}/zibal/v1"
+    settings.POSTEX_API_URL = f"{server.url}/postex"
+    settings.SMS_IR_API_URL = f"{server.url}/sms/v1"
+    reset_clients()
+    yield server
+    reset_clients()
+    server.stop()
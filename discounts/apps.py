@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DiscountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "discounts"
+
+    def ready(self):
+        import discounts.signals  # noqa: F401
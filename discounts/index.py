@@ -0,0 +1,169 @@
+"""
+In-memory eligibility index of discount rules.
+
+The rules of every active, unexpired discount are compiled into inverted
+maps from variant, product, category and tag ids to the discounts they make
+an item eligible for. With the index, the eligible subtotal of every
+candidate discount is computed in a single pass over the cart, whatever the
+number of discounts and rules, without querying per item or per discount.
+
+The compiled index is stored in the shared cache under a version key bumped
+by the discount signals (see ``discounts.signals``), and each process keeps
+the last version it loaded in memory. Validity dates, minimum purchase and
+usage limits are still checked against the database by
+``DiscountService.get_applicable_discounts``, since they change without
+touching the rules.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.utils import timezone
+
+from shop.caching import bump_generations, get_generations
+from shop.custom_taggit import CustomTaggedItem
+from shop.models import Product
+
+from .models import Discount, DiscountRule
+
+DISCOUNT_INDEX_VERSION_KEY = "discounts:index:version"
+DISCOUNT_INDEX_CACHE_KEY = "discounts:index:{}"
+DISCOUNT_INDEX_CACHE_TIMEOUT = 60 * 60 * 24
+
+# (DiscountRule relation, index map) pairs.
+RULE_RELATIONS = (
+    ("variants", "by_variant"),
+    ("products", "by_product"),
+    ("categories", "by_category"),
+    ("tags", "by_tag"),
+)
+
+
+class DiscountIndex:
+    """
+    The compiled rules of a set of discounts. Discounts without any rule
+    restriction apply to the whole cart and are kept in ``unrestricted``.
+    """
+
+    def __init__(self, discount_ids=(), relations=None):
+        self.discount_ids = set(discount_ids)
+        self.by_variant = {}
+        self.by_product = {}
+        self.by_category = {}
+        self.by_tag = {}
+        for attribute, rows in (relations or {}).items():
+            index = defaultdict(set)
+            for discount_id, target_id in rows:
+                index[target_id].add(discount_id)
+            setattr(self, attribute, dict(index))
+
+        restricted = set()
+        for attribute in ("by_variant", "by_product", "by_category", "by_tag"):
+            for discount_ids in getattr(self, attribute).values():
+                restricted |= discount_ids
+        self.unrestricted = self.discount_ids - restricted
+        self.tag_restricted = set().union(*self.by_tag.values())
+
+    @classmethod
+    def build(cls):
+        """
+        Compiles the rules of every active discount that has not expired, in
+        one query per rule relation.
+        """
+        discounts = Discount.objects.filter(active=True, valid_to__gte=timezone.now())
+        relations = {}
+        for relation, attribute in RULE_RELATIONS:
+            field = DiscountRule._meta.get_field(relation)
+            rule_field = field.m2m_field_name()
+            relations[attribute] = list(
+                field.remote_field.through.objects.filter(
+                    **{f"{rule_field}__discount__in": discounts}
+                ).values_list(
+                    f"{rule_field}__discount_id", f"{field.m2m_reverse_field_name()}_id"
+                )
+            )
+        return cls(discounts.values_list("id", flat=True), relations)
+
+    def eligible_prices(self, cart_items, total_price, discount_ids):
+        """
+        Returns the eligible subtotal of each of ``discount_ids`` (all of
+        which must be indexed) for the given cart items.
+        """
+        discount_ids = set(discount_ids)
+        prices = {
+            discount_id: Decimal("0.00")
+            for discount_id in discount_ids - self.unrestricted
+        }
+        if prices:
+            tag_ids = {}
+            if not self.tag_restricted.isdisjoint(prices):
+                tag_ids = load_product_tag_ids(
+                    {item["variant"].product_id for item in cart_items}
+                )
+            for item in cart_items:
+                variant = item["variant"]
+                matched = set(self.by_variant.get(variant.pk, ()))
+                matched.update(self.by_product.get(variant.product_id, ()))
+                matched.update(self.by_category.get(variant.product.category_id, ()))
+                for tag_id in tag_ids.get(variant.product_id, ()):
+                    matched.update(self.by_tag.get(tag_id, ()))
+                for discount_id in matched & prices.keys():
+                    prices[discount_id] += item["total_price"]
+
+        for discount_id in discount_ids & self.unrestricted:
+            prices[discount_id] = total_price
+        return prices
+
+
+def load_product_tag_ids(product_ids):
+    """
+    Returns the tag ids of the given products, in a single query.
+    """
+    tag_ids = defaultdict(set)
+    rows = CustomTaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Product),
+        object_id__in=product_ids,
+    ).values_list("object_id", "tag_id")
+    for product_id, tag_id in rows:
+        tag_ids[product_id].add(tag_id)
+    return tag_ids
+
+
+def get_index_version():
+    return get_generations([DISCOUNT_INDEX_VERSION_KEY])[0]
+
+
+def invalidate_index():
+    bump_generations([DISCOUNT_INDEX_VERSION_KEY])
+
+
+_compiled = (None, None)
+
+
+def get_index(discount_ids=()):
+    """
+    Returns the current ``DiscountIndex``, from this process, the shared
+    cache or the database, in that order. It is rebuilt if any of
+    ``discount_ids`` is missing from it, e.g. because a discount was changed
+    with a queryset ``update()``, which sends no signal.
+    """
+    global _compiled
+
+    version = get_index_version()
+    loaded_version, index = _compiled
+    if loaded_version != version:
+        index = cache.get(DISCOUNT_INDEX_CACHE_KEY.format(version))
+    if index is None or not index.discount_ids.issuperset(discount_ids):
+        if index is not None:
+            invalidate_index()
+            version = get_index_version()
+        index = DiscountIndex.build()
+        cache.set(
+            DISCOUNT_INDEX_CACHE_KEY.format(version),
+            index,
+            DISCOUNT_INDEX_CACHE_TIMEOUT,
+        )
+    _compiled = (version, index)
+    return index
@@ -1,6 +1,8 @@
 from decimal import Decimal
 from django.db.models import F, Q
 from django.utils import timezone
+from . import usage
+from .index import get_index as get_discount_index
 from .models import Discount, UserDiscountUsage
 
 
@@ -50,96 +52,61 @@ class DiscountService:
         Otherwise, it finds and applies the best automatic discount.
         Returns the discount amount and the discount object.
         """
-        discounts_qs = DiscountService.get_applicable_discounts(
-            cart, user, discount_code
-        ).prefetch_related(
-            "rules__products", "rules__categories", "rules__tags", "rules__variants"
+        discounts = list(
+            DiscountService.get_applicable_discounts(cart, user, discount_code)
         )
-
         if discount_code:
-            discount = discounts_qs.first()
-            if not discount:
-                return Decimal("0.00"), None
+            discounts = discounts[:1]
+        if not discounts:
+            return Decimal("0.00"), None
 
-            amount = DiscountService._calculate_single_discount_amount(cart, discount)
-            return amount, discount
+        amounts = DiscountService._calculate_discount_amounts(cart, discounts)
+        if discount_code:
+            return amounts[discounts[0].id], discounts[0]
 
-        else:  # Find the best automatic discount
-            best_amount = Decimal("0.00")
-            best_discount = None
-            for discount in discounts_qs:
-                amount = DiscountService._calculate_single_discount_amount(
-                    cart, discount
-                )
-                if amount > best_amount:
-                    best_amount = amount
-                    best_discount = discount
-            return best_amount, best_discount
+        # Find the best automatic discount
+        best_amount = Decimal("0.00")
+        best_discount = None
+        for discount in discounts:
+            if amounts[discount.id] > best_amount:
+                best_amount = amounts[discount.id]
+                best_discount = discount
+        return best_amount, best_discount
 
     @staticmethod
-    def _calculate_single_discount_amount(cart, discount):
-        """Helper method to calculate the amount for a single discount."""
-        cart_items = list(cart)
-        eligible_price = Decimal("0.00")
-        rules = list(discount.rules.all())
-
-        if not any(
-            rule.products.exists()
-            or rule.categories.exists()
-            or rule.tags.exists()
-            or rule.variants.exists()
-            for rule in rules
-        ):
-            eligible_price = cart.get_total_price()
-        else:
-            eligible_product_ids = set()
-            eligible_category_ids = set()
-            eligible_tag_ids = set()
-            eligible_variant_ids = set()
-
-            for rule in rules:
-                eligible_product_ids.update(p.product_id for p in rule.products.all())
-                eligible_category_ids.update(c.id for c in rule.categories.all())
-                eligible_tag_ids.update(t.id for t in rule.tags.all())
-                eligible_variant_ids.update(v.variant_id for v in rule.variants.all())
-
-            for item in cart_items:
-                variant = item["variant"]
-                product = variant.product
-                product_tags = set(product.tags.values_list("id", flat=True))
-
-                if (
-                    variant.variant_id in eligible_variant_ids
-                    or product.product_id in eligible_product_ids
-                    or product.category_id in eligible_category_ids
-                    or not product_tags.isdisjoint(eligible_tag_ids)
-                ):
-                    eligible_price += item["total_price"]
-
-        if eligible_price > 0:
-            if discount.type == Discount.DISCOUNT_TYPE_PERCENTAGE:
-                return (discount.amount / Decimal("100")) * eligible_price
-            elif discount.type == Discount.DISCOUNT_TYPE_FIXED:
-                return min(discount.amount, eligible_price)
+    def _calculate_discount_amounts(cart, discounts):
+        """
+        Calculates the amount of each discount for the cart, keyed by
+        discount id. The eligible items of all discounts are found in a single
+        pass over the cart, using the compiled rule index.
+        """
+        index = get_discount_index(discount.id for discount in discounts)
+        eligible_prices = index.eligible_prices(
+            list(cart), cart.get_total_price(), [discount.id for discount in discounts]
+        )
 
-        return Decimal("0.00")
+        amounts = {}
+        for discount in discounts:
+            eligible_price = eligible_prices[discount.id]
+            amount = Decimal("0.00")
+            if eligible_price > 0:
+                if discount.type == Discount.DISCOUNT_TYPE_PERCENTAGE:
+                    amount = (discount.amount / Decimal("100")) * eligible_price
+                elif discount.type == Discount.DISCOUNT_TYPE_FIXED:
+                    amount = min(discount.amount, eligible_price)
+            amounts[discount.id] = amount
+        return amounts
 
     @staticmethod
-    def record_discount_usage(discount, user):
+    def reserve_usage(discount, user):
         """
-        Atomically increments the usage count for a discount and for the specific user.
+        Reserves a use of the discount for the user at checkout. Raises
+        ``DiscountUsageLimitReached`` if the discount or the user's share of
+        it is used up. See ``discounts.usage``.
         """
-        if discount:
-            # Increment the overall usage count
-            Discount.objects.filter(id=discount.id).update(
-                usage_count=F("usage_count") + 1
-            )
+        usage.reserve(discount, user.pk if user.is_authenticated else None)
 
-            # Record or update the user-specific usage
-            if user.is_authenticated:
-                usage, created = UserDiscountUsage.objects.get_or_create(
-                    user=user, discount=discount, defaults={"usage_count": 1}
-                )
-                if not created:
-                    usage.usage_count = F("usage_count") + 1
-                    usage.save(update_fields=["usage_count"])
+    @staticmethod
+    def release_usage(discount, user):
+        """Gives back a use reserved by ``reserve_usage``."""
+        usage.release([(discount.pk, user.pk if user.is_authenticated else None)])
@@ -0,0 +1,34 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .index import invalidate_index
+from .models import Discount, DiscountRule
+
+
+@receiver([post_save, post_delete], sender=Discount)
+def invalidate_index_on_discount_change(sender, update_fields=None, **kwargs):
+    """
+    Recompile the discount index when a discount is saved or deleted, unless
+    only its usage count changed.
+    """
+    if update_fields and set(update_fields) <= {"usage_count"}:
+        return
+    invalidate_index()
+
+
+@receiver([post_save, post_delete], sender=DiscountRule)
+def invalidate_index_on_rule_change(sender, **kwargs):
+    invalidate_index()
+
+
+@receiver(m2m_changed, sender=DiscountRule.products.through)
+@receiver(m2m_changed, sender=DiscountRule.categories.through)
+@receiver(m2m_changed, sender=DiscountRule.tags.through)
+@receiver(m2m_changed, sender=DiscountRule.variants.through)
+def invalidate_index_on_rule_targets_change(sender, action, **kwargs):
+    """
+    Recompile the discount index when products, categories, tags or variants
+    are added to or removed from a rule.
+    """
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_index()
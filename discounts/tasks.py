@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from . import usage
+
+
+@shared_task
+def sync_discount_usage():
+    """
+    Task to write the discount usage counters kept in Redis back to the
+    database.
+    """
+    return usage.sync_to_database()
@@ -9,6 +9,7 @@ from factory.django import DjangoModelFactory
 from account.tests.factories import UserFactory
 from shop.tests.factories import ProductFactory, CategoryFactory, ProductVariantFactory
 from discounts.models import Discount, DiscountRule, UserDiscountUsage
+from taggit.models import Tag
 from discounts.services import DiscountService
 
 
@@ -260,19 +261,112 @@ class TestDiscountService:
         amount, discount_obj = DiscountService.apply_discount(mock_cart, user)
         assert amount == Decimal("0.00")
 
-    def test_record_discount_usage(self, user):
-        """Tests that discount usage is recorded correctly for both the discount and the user."""
-        discount = DiscountFactory(usage_count=5)
 
-        DiscountService.record_discount_usage(discount, user)
+@pytest.fixture
+def loaded_cart(product1, product2):
+    """A mock cart whose variants have their products loaded, like Cart's."""
+    variants = [product1.variants.first(), product2.variants.first()]
+    items = []
+    for variant in variants:
+        variant.product  # noqa: B018
+        items.append(
+            {
+                "variant": variant,
+                "quantity": 1,
+                "price": variant.price,
+                "total_price": variant.price,
+            }
+        )
+    cart = MagicMock()
+    cart.get_total_price.return_value = sum(item["total_price"] for item in items)
+    cart.__iter__.side_effect = lambda: iter(items)
+    return cart
 
-        discount.refresh_from_db()
-        assert discount.usage_count == 6
 
-        user_usage = UserDiscountUsage.objects.get(user=user, discount=discount)
-        assert user_usage.usage_count == 1
+@pytest.mark.django_db
+class TestDiscountIndex:
+    def test_apply_discount_with_variant_rule(self, loaded_cart, user, product2):
+        discount = DiscountFactory(
+            type=Discount.DISCOUNT_TYPE_FIXED, amount=Decimal("50.00"), code=None
+        )
+        rule = DiscountRuleFactory(discount=discount)
+        rule.variants.add(product2.variants.first())
+        amount, discount_obj = DiscountService.apply_discount(loaded_cart, user)
+        assert amount == Decimal("50.00")
+        assert discount_obj == discount
+
+    def test_apply_discount_with_tag_rule(self, loaded_cart, user, product1):
+        product1.tags.add("sale")
+        # Rules reference taggit tags, products are tagged with CustomTag;
+        # rules match by tag id.
+        tag = Tag.objects.create(
+            id=product1.tags.get().id, name="sale", slug="sale-rule"
+        )
+        discount = DiscountFactory(
+            type=Discount.DISCOUNT_TYPE_PERCENTAGE, amount=Decimal("10.00"), code=None
+        )
+        DiscountRuleFactory(discount=discount).tags.add(tag)
+        amount, discount_obj = DiscountService.apply_discount(loaded_cart, user)
+        assert amount == Decimal("10.00")
+
+    def test_rule_changes_recompile_index(
+        self, loaded_cart, user, category1, category2
+    ):
+        discount = DiscountFactory(
+            type=Discount.DISCOUNT_TYPE_PERCENTAGE, amount=Decimal("10.00"), code=None
+        )
+        rule = DiscountRuleFactory(discount=discount)
+        rule.categories.add(category2)
+        assert DiscountService.apply_discount(loaded_cart, user)[0] == Decimal("20.00")
 
-        # Test incrementing existing usage
-        DiscountService.record_discount_usage(discount, user)
-        user_usage.refresh_from_db()
-        assert user_usage.usage_count == 2
+        rule.categories.add(category1)
+        assert DiscountService.apply_discount(loaded_cart, user)[0] == Decimal("30.00")
+
+        rule.categories.clear()
+        assert DiscountService.apply_discount(loaded_cart, user)[0] == Decimal("30.00")
+
+        rule.categories.add(category1)
+        discount.amount = Decimal("50.00")
+        discount.save()
+        assert DiscountService.apply_discount(loaded_cart, user)[0] == Decimal("50.00")
+
+    def test_discount_changed_without_signals_is_indexed(self, loaded_cart, user):
+        DiscountService.apply_discount(loaded_cart, user)
+        Discount.objects.bulk_create(
+            [
+                Discount(
+                    name="Bulk",
+                    type=Discount.DISCOUNT_TYPE_FIXED,
+                    amount=Decimal("25.00"),
+                    valid_from=timezone.now(),
+                    valid_to=timezone.now() + timedelta(days=1),
+                )
+            ]
+        )
+        assert DiscountService.apply_discount(loaded_cart, user)[0] == Decimal("25.00")
+
+    @pytest.mark.parametrize("campaigns", [1, 30])
+    def test_best_discount_queries_do_not_grow_with_campaigns(
+        self,
+        campaigns,
+        loaded_cart,
+        user,
+        product1,
+        category2,
+        django_assert_num_queries,
+    ):
+        for number in range(campaigns):
+            discount = DiscountFactory(
+                type=Discount.DISCOUNT_TYPE_FIXED,
+                amount=Decimal(number + 1),
+                code=None,
+            )
+            rule = DiscountRuleFactory(discount=discount)
+            rule.products.add(product1)
+            rule.categories.add(category2)
+        DiscountService.apply_discount(loaded_cart, user)  # compiles the index
+
+        # The user's discount usages and the applicable discounts.
+        with django_assert_num_queries(2):
+            amount, discount_obj = DiscountService.apply_discount(loaded_cart, user)
+        assert amount == Decimal(campaigns)
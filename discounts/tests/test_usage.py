@@ -0,0 +1,88 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.utils import timezone
+
+from account.tests.factories import UserFactory
+from discounts import usage
+from discounts.models import Discount, UserDiscountUsage
+from discounts.tasks import sync_discount_usage
+
+pytestmark = pytest.mark.django_db
+
+
+def _discount(**kwargs):
+    defaults = {
+        "name": "Limited",
+        "type": Discount.DISCOUNT_TYPE_FIXED,
+        "amount": Decimal("10.00"),
+        "valid_from": timezone.now(),
+        "valid_to": timezone.now() + timedelta(days=1),
+        "max_usage": 3,
+        "usage_per_user": 1,
+    }
+    defaults.update(kwargs)
+    return Discount.objects.create(**defaults)
+
+
+def test_reserve_stops_at_max_usage():
+    discount = _discount(max_usage=2)
+    users = [UserFactory() for _ in range(3)]
+
+    usage.reserve(discount, users[0].pk)
+    usage.reserve(discount, users[1].pk)
+    with pytest.raises(usage.DiscountUsageLimitReached):
+        usage.reserve(discount, users[2].pk)
+
+    # The refused reservation is not counted.
+    usage.release([(discount.pk, users[0].pk)])
+    usage.reserve(discount, users[2].pk)
+
+
+def test_reserve_stops_at_usage_per_user():
+    discount = _discount(usage_per_user=1)
+    user = UserFactory()
+
+    usage.reserve(discount, user.pk)
+    with pytest.raises(usage.DiscountUsageLimitReached):
+        usage.reserve(discount, user.pk)
+    usage.reserve(discount, UserFactory().pk)
+
+
+def test_counters_are_seeded_from_the_database():
+    discount = _discount(max_usage=6, usage_per_user=3)
+    discount.usage_count = 5
+    discount.save()
+    user = UserFactory()
+    UserDiscountUsage.objects.create(user=user, discount=discount, usage_count=2)
+
+    usage.reserve(discount, user.pk)
+    with pytest.raises(usage.DiscountUsageLimitReached):
+        usage.reserve(discount, UserFactory().pk)
+
+
+def test_sync_writes_changed_counters_to_the_database():
+    discount = _discount(max_usage=10, usage_per_user=2)
+    user, other_user = UserFactory(), UserFactory()
+    usage.reserve(discount, user.pk)
+    usage.reserve(discount, user.pk)
+    usage.reserve(discount, other_user.pk)
+    usage.release([(discount.pk, other_user.pk)])
+
+    assert sync_discount_usage() == 1
+
+    discount.refresh_from_db()
+    assert discount.usage_count == 2
+    counts = dict(
+        UserDiscountUsage.objects.filter(discount=discount).values_list(
+            "user_id", "usage_count"
+        )
+    )
+    assert counts == {user.pk: 2, other_user.pk: 0}
+
+    # Nothing changed since, so nothing is synced again.
+    assert sync_discount_usage() == 0
+    usage.reserve(discount, other_user.pk)
+    assert sync_discount_usage() == 1
+    assert UserDiscountUsage.objects.get(user=other_user).usage_count == 1
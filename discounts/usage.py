@@ -0,0 +1,223 @@
+"""
+Discount usage limits, counted in Redis.
+
+Checkout reserves a use of its discount before creating the order, and a
+canceled order gives it back. Each discount has a Redis hash with its total
+number of uses and the number of uses of each user. A reservation increments
+both counters in one MULTI/EXEC and, if either went over its limit, takes
+them back and is refused. Concurrent checkouts of a popular discount
+therefore never wait on each other or on the ``Discount`` row, and no more
+than ``max_usage`` (or ``usage_per_user``) reservations succeed.
+
+The counters are seeded from the database the first time they are used and
+written back to ``Discount.usage_count`` and ``UserDiscountUsage`` by the
+``sync_discount_usage`` task, for the counters that changed since the last
+sync. Until then, the database counts (used by
+``DiscountService.get_applicable_discounts`` to pre-filter discounts) lag
+behind.
+"""
+
+import logging
+import sys
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .models import Discount, UserDiscountUsage
+
+if "test" in sys.argv or getattr(settings, "TESTING", False):
+    from fakeredis import FakeRedis
+
+    r = FakeRedis()
+else:
+    r = redis.from_url(settings.REDIS_URL)
+
+logger = logging.getLogger(__name__)
+
+USAGE_KEY = "discount:usage:{}"
+TOTAL_FIELD = "total"
+USER_FIELD = "user:{}"
+
+# Changes not yet written back to the database, by "<discount id>" (total)
+# and "<discount id>:<user id>" (uses of a user).
+DIRTY_KEY = "discount:usage:dirty"
+
+
+class DiscountUsageLimitReached(Exception):
+    """Raised when a discount, or a user's share of it, is used up."""
+
+    def __init__(self, discount):
+        self.discount = discount
+        super().__init__(f"Discount {discount.pk} has reached its usage limit.")
+
+
+def _fields(user_id):
+    fields = [TOTAL_FIELD]
+    if user_id is not None:
+        fields.append(USER_FIELD.format(user_id))
+    return fields
+
+
+def _dirty_fields(discount_id, user_id):
+    fields = [str(discount_id)]
+    if user_id is not None:
+        fields.append(f"{discount_id}:{user_id}")
+    return fields
+
+
+def _seed(uses):
+    """
+    Copies the database counts of the given ``(discount_id, user_id)`` uses
+    to Redis, for the counters that do not exist there yet.
+    """
+    uses = set(uses)
+    pipe = r.pipeline()
+    for discount_id, user_id in uses:
+        for field in _fields(user_id):
+            pipe.hget(USAGE_KEY.format(discount_id), field)
+    stored = iter(pipe.execute())
+
+    missing_totals, missing_users = set(), set()
+    for discount_id, user_id in uses:
+        if next(stored) is None:
+            missing_totals.add(discount_id)
+        if user_id is not None and next(stored) is None:
+            missing_users.add((discount_id, user_id))
+    if not missing_totals and not missing_users:
+        return
+
+    pipe = r.pipeline()
+    for discount_id, usage_count in Discount.objects.filter(
+        pk__in=missing_totals
+    ).values_list("pk", "usage_count"):
+        pipe.hsetnx(USAGE_KEY.format(discount_id), TOTAL_FIELD, usage_count)
+    user_counts = dict.fromkeys(missing_users, 0)
+    if missing_users:
+        rows = UserDiscountUsage.objects.filter(
+            discount_id__in={discount_id for discount_id, _user in missing_users},
+            user_id__in={user_id for _discount, user_id in missing_users},
+        ).values_list("discount_id", "user_id", "usage_count")
+        for discount_id, user_id, usage_count in rows:
+            if (discount_id, user_id) in user_counts:
+                user_counts[(discount_id, user_id)] = usage_count
+    for (discount_id, user_id), usage_count in user_counts.items():
+        pipe.hsetnx(
+            USAGE_KEY.format(discount_id), USER_FIELD.format(user_id), usage_count
+        )
+    pipe.execute()
+
+
+def _increment(uses, amount):
+    pipe = r.pipeline()
+    for discount_id, user_id in uses:
+        for field in _fields(user_id):
+            pipe.hincrby(USAGE_KEY.format(discount_id), field, amount)
+    return pipe.execute()
+
+
+def _mark_dirty(uses):
+    pipe = r.pipeline()
+    for discount_id, user_id in uses:
+        for field in _dirty_fields(discount_id, user_id):
+            pipe.hincrby(DIRTY_KEY, field, 1)
+    pipe.execute()
+
+
+def reserve(discount, user_id=None):
+    """
+    Reserves a use of ``discount`` for the user, or raises
+    ``DiscountUsageLimitReached``.
+    """
+    use = (discount.pk, user_id)
+    _seed([use])
+    counts = _increment([use], 1)
+    if counts[0] > discount.max_usage or (
+        user_id is not None and counts[1] > discount.usage_per_user
+    ):
+        _increment([use], -1)
+        raise DiscountUsageLimitReached(discount)
+    _mark_dirty([use])
+
+
+def release(uses):
+    """
+    Gives back the given ``(discount_id, user_id)`` uses, e.g. of canceled
+    orders.
+    """
+    uses = list(uses)
+    if not uses:
+        return
+    _seed(uses)
+    _increment(uses, -1)
+    _mark_dirty(uses)
+
+
+def sync_to_database():
+    """
+    Writes the Redis counters changed since the last sync to the database.
+    Returns the number of discounts synced.
+    """
+    dirty = {
+        field.decode(): int(value)
+        for field, value in r.hgetall(DIRTY_KEY).items()
+        if int(value) > 0
+    }
+    if not dirty:
+        return 0
+
+    users = {}
+    for field in dirty:
+        discount_id, _sep, user_id = field.partition(":")
+        user_ids = users.setdefault(int(discount_id), set())
+        if user_id:
+            user_ids.add(int(user_id))
+    existing_discounts = set(
+        Discount.objects.filter(pk__in=users).values_list("pk", flat=True)
+    )
+    existing_users = set(
+        get_user_model()
+        .objects.filter(pk__in=set().union(*users.values()))
+        .values_list("pk", flat=True)
+    )
+
+    pipe = r.pipeline()
+    for discount_id, user_ids in users.items():
+        key = USAGE_KEY.format(discount_id)
+        pipe.hget(key, TOTAL_FIELD)
+        for user_id in sorted(user_ids):
+            pipe.hget(key, USER_FIELD.format(user_id))
+    stored = iter(pipe.execute())
+
+    discounts, user_usages = [], []
+    for discount_id, user_ids in users.items():
+        total = next(stored)
+        counts = {user_id: next(stored) for user_id in sorted(user_ids)}
+        if discount_id not in existing_discounts:
+            continue
+        if total is not None:
+            discounts.append(Discount(pk=discount_id, usage_count=max(int(total), 0)))
+        user_usages += [
+            UserDiscountUsage(
+                discount_id=discount_id,
+                user_id=user_id,
+                usage_count=max(int(count), 0),
+            )
+            for user_id, count in counts.items()
+            if count is not None and user_id in existing_users
+        ]
+    Discount.objects.bulk_update(discounts, ["usage_count"])
+    UserDiscountUsage.objects.bulk_create(
+        user_usages,
+        update_conflicts=True,
+        unique_fields=["user", "discount"],
+        update_fields=["usage_count"],
+    )
+
+    # Changes made while syncing stay dirty for the next run.
+    pipe = r.pipeline()
+    for field, seen in dirty.items():
+        pipe.hincrby(DIRTY_KEY, field, -seen)
+    pipe.execute()
+    logger.info(f"Synced the usage counts of {len(users)} discounts.")
+    return len(users)
@@ -353,6 +353,30 @@ CKEDITOR_5_CONFIGS = {
 }
 
 CART_SESSION_ID = "cart"
+# Storage of anonymous carts (cart.backends). Redis hashes expire after
+# CART_SESSION_TTL seconds without changes; database carts of anonymous
+# sessions (and empty user carts) are purged after CART_ABANDONED_DAYS.
+CART_ANONYMOUS_BACKEND = get_env(
+    "CART_ANONYMOUS_BACKEND", "cart.backends.RedisCartBackend"
+)
+CART_SESSION_TTL = int(get_env("CART_SESSION_TTL", 60 * 60 * 24 * 7))
+CART_ABANDONED_DAYS = int(get_env("CART_ABANDONED_DAYS", 30))
+
+# How long (in seconds) checkout holds stock for an unpaid order
+# (orders.reservations) before it is returned.
+STOCK_RESERVATION_TTL = int(get_env("STOCK_RESERVATION_TTL", 60 * 20))
+
+# How long (in seconds) a payment request or verification sent to the gateway
+# blocks another one for the same order or trackId (payment.services).
+PAYMENT_GATEWAY_IN_FLIGHT_TIMEOUT = int(
+    get_env("PAYMENT_GATEWAY_IN_FLIGHT_TIMEOUT", 60)
+)
+# Acknowledge gateway callbacks at once and verify them in a Celery worker
+# (payment.tasks.verify_payment_callback); the result page polls
+# payment/status/<trackId>/. Callbacks still unverified after
+# PAYMENT_CALLBACK_RETRY_AFTER seconds are queued again.
+PAYMENT_ASYNC_VERIFICATION = get_env_bool("PAYMENT_ASYNC_VERIFICATION", False)
+PAYMENT_CALLBACK_RETRY_AFTER = int(get_env("PAYMENT_CALLBACK_RETRY_AFTER", 300))
 SITE_ID = 1
 ASGI_APPLICATION = "ecommerce_api.asgi.application"
 
@@ -386,6 +410,7 @@ LOGGING = {
 }
 
 SMS_IR_OTP_TEMPLATE_ID = int(get_env("SMS_IR_OTP_TEMPLATE_ID", 123456))
+SMS_IR_API_URL = get_env("SMS_IR_API_URL", "https://api.sms.ir/v1")
 
 POSTEX_SENDER_NAME = get_env("POSTEX_SENDER_NAME", "Your Company Name")
 POSTEX_SENDER_PHONE = get_env("POSTEX_SENDER_PHONE", "Your Company Phone")
@@ -396,6 +421,13 @@ POSTEX_SENDER_POSTAL_CODE = get_env(
 POSTEX_API_KEY = get_env("POSTEX_API_KEY", "")
 POSTEX_FROM_CITY_CODE = int(get_env("POSTEX_FROM_CITY_CODE", 1))
 POSTEX_SERVICE_TYPE = get_env("POSTEX_SERVICE_TYPE", "standard")
+POSTEX_API_URL = get_env("POSTEX_API_URL", "https://api.postex.ir")
+# Shipping quotes are cached per bucket of weight (g), largest dimensions (cm)
+# and declared value, and requested for the bucket's upper bound.
+SHIPPING_QUOTE_CACHE_TIMEOUT = int(get_env("SHIPPING_QUOTE_CACHE_TIMEOUT", 60 * 60 * 6))
+SHIPPING_QUOTE_WEIGHT_STEP = int(get_env("SHIPPING_QUOTE_WEIGHT_STEP", 500))
+SHIPPING_QUOTE_DIMENSION_STEP = int(get_env("SHIPPING_QUOTE_DIMENSION_STEP", 10))
+SHIPPING_QUOTE_VALUE_STEP = int(get_env("SHIPPING_QUOTE_VALUE_STEP", 1000000))
 
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
@@ -455,6 +487,41 @@ else:
     ZIBAL_MERCHANT_ID = get_env("ZIBAL_MERCHANT_ID")
     ZIBAL_WEBHOOK_SECRET = get_env("ZIBAL_WEBHOOK_SECRET")
 ZIBAL_ALLOWED_IPS = get_env_list("ZIBAL_ALLOWED_IPS", "127.0.0.1")
+ZIBAL_API_URL = get_env("ZIBAL_API_URL", "https://gateway.zibal.ir/v1")
+
+# Outbound HTTP clients (common.utils.http): one pooled keep-alive session per
+# provider. Keys missing from a provider's entry fall back to the defaults.
+# Read errors and status_forcelist responses are only retried for
+# retry_methods; connect errors are always retried.
+# failure_threshold failures within failure_window seconds open a provider's
+# circuit (shared through Redis) for reset_timeout seconds; then one probe
+# per probe_timeout seconds is let through. Each process sends at most
+# max_concurrency requests to a provider at a time.
+HTTP_CLIENT_DEFAULTS = {
+    "pool_size": int(get_env("HTTP_CLIENT_POOL_SIZE", 10)),
+    "timeout": 10,
+    "retries": int(get_env("HTTP_CLIENT_RETRIES", 2)),
+    "backoff_factor": 0.5,
+    "status_forcelist": [502, 503, 504],
+    "retry_methods": ["HEAD", "GET", "OPTIONS"],
+    "failure_threshold": int(get_env("CIRCUIT_FAILURE_THRESHOLD", 5)),
+    "failure_window": 60,
+    "reset_timeout": int(get_env("CIRCUIT_RESET_TIMEOUT", 30)),
+    "probe_timeout": 10,
+    "max_concurrency": int(get_env("HTTP_CLIENT_MAX_CONCURRENCY", 10)),
+}
+HTTP_CLIENTS = {
+    "zibal": {
+        "timeout": 5,
+        "retries": 3,
+        "backoff_factor": 1,
+        "status_forcelist": [429, 500, 502, 503, 504],
+        # Zibal deduplicates requests by orderId and verifications by trackId.
+        "retry_methods": ["HEAD", "GET", "POST", "OPTIONS"],
+    },
+    "postex": {"timeout": 10},
+    "sms_ir": {"timeout": 10},
+}
 
 # Celery Configuration
 if is_test_env:
@@ -476,8 +543,80 @@ CELERY_BEAT_SCHEDULE = {
             get_env("CANCEL_PENDING_ORDERS_INTERVAL", 600.0)
         ),  # Default to 10 minutes
     },
+    "release-expired-stock-reservations": {
+        "task": "orders.tasks.release_expired_stock_reservations",
+        "schedule": float(
+            get_env("RELEASE_RESERVATIONS_INTERVAL", 60.0)
+        ),  # Default to 1 minute
+    },
+    "requeue-payment-callbacks": {
+        "task": "payment.tasks.requeue_payment_callbacks",
+        "schedule": float(
+            get_env("REQUEUE_PAYMENT_CALLBACKS_INTERVAL", 300.0)
+        ),  # Default to 5 minutes
+    },
+    "sync-discount-usage": {
+        "task": "discounts.tasks.sync_discount_usage",
+        "schedule": float(
+            get_env("SYNC_DISCOUNT_USAGE_INTERVAL", 60.0)
+        ),  # Default to 1 minute
+    },
+    "refresh-postex-cities": {
+        "task": "shipping.tasks.refresh_postex_cities",
+        "schedule": float(
+            get_env("REFRESH_POSTEX_CITIES_INTERVAL", 86400.0)
+        ),  # Default to 1 day
+    },
+    "purge-abandoned-carts": {
+        "task": "cart.tasks.purge_abandoned_carts",
+        "schedule": float(
+            get_env("PURGE_ABANDONED_CARTS_INTERVAL", 86400.0)
+        ),  # Default to 1 day
+    },
+    "refresh-user-recommendations": {
+        "task": "shop.tasks.refresh_user_recommendations",
+        "schedule": float(
+            get_env("USER_RECOMMENDATIONS_INTERVAL", 3600.0)
+        ),  # Default to 1 hour
+    },
+    "regenerate-product-feeds": {
+        "task": "integrations.tasks.regenerate_product_feeds",
+        "schedule": float(
+            get_env("PRODUCT_FEEDS_INTERVAL", 600.0)
+        ),  # Default to 10 minutes
+    },
+    "update-popular-products": {
+        "task": "shop.tasks.update_popular_products",
+        "schedule": float(
+            get_env("POPULAR_PRODUCTS_INTERVAL", 21600.0)
+        ),  # Default to 6 hours
+    },
 }
 
+# Co-purchase recommendations (shop.recommender). Purchase weights double every
+# half-life after the epoch, so older purchases fade relative to new ones.
+RECOMMENDER_HALF_LIFE_DAYS = float(get_env("RECOMMENDER_HALF_LIFE_DAYS", 30))
+RECOMMENDER_DECAY_EPOCH = get_env("RECOMMENDER_DECAY_EPOCH", "2024-01-01")
+RECOMMENDER_MAX_RELATED = int(get_env("RECOMMENDER_MAX_RELATED", 100))
+
+# Text search configuration of the product search vectors (shop.search).
+# "simple" does no stemming, which suits mixed Persian/English catalogs.
+PRODUCT_SEARCH_CONFIG = get_env("PRODUCT_SEARCH_CONFIG", "simple")
+
+# How often (in seconds) each ASGI worker checks whether its in-memory
+# product name index for the live search websocket is out of date.
+SEARCH_INDEX_CHECK_INTERVAL = float(get_env("SEARCH_INDEX_CHECK_INTERVAL", 5))
+
+# Torob/Emalls feed snapshots (integrations.tasks). Without FEED_BASE_URL,
+# links use the site URL of the last crawler request.
+FEED_SNAPSHOT_DIR = get_env("FEED_SNAPSHOT_DIR", str(BASE_DIR / "var" / "feeds"))
+FEED_BASE_URL = get_env("FEED_BASE_URL", "")
+FEED_SNAPSHOT_MAX_AGE = int(get_env("FEED_SNAPSHOT_MAX_AGE", 60 * 60 * 6))
+
+# Rebuild stale cache entries (see common.utils.cache) in a Celery worker
+# instead of inline in the request that noticed they were stale.
+CACHE_BACKGROUND_REFRESH = get_env_bool("CACHE_BACKGROUND_REFRESH", False)
+
 # Session cookie settings
 SESSION_COOKIE_SAMESITE = "Lax"
 SESSION_COOKIE_SECURE = get_env_bool("SESSION_COOKIE_SECURE", not DEBUG)
@@ -1,3 +1,5 @@
+import tempfile
+
 from .base import *
 
 # Override settings for testing
@@ -25,6 +27,10 @@ DATABASES = {
     }
 }
 
+# Keep files uploaded by tests out of the repository's media directory;
+# conftest.py removes it after the run.
+MEDIA_ROOT = tempfile.mkdtemp(prefix="ecommerce-test-media-")
+
 # Use in-memory cache for tests
 CACHES = {
     "default": {
@@ -1,13 +1,91 @@
 from collections import defaultdict
 
 
-class FakeRedis:
+class FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        results = [command(*args, **kwargs) for command, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
+class FakeServer:
+    """The data of a fake Redis server, shared by the clients given it."""
+
     def __init__(self):
-        self._data = defaultdict(dict)
+        self.data = defaultdict(dict)
+        self.ttls = {}
+
+
+class FakeRedis:
+    def __init__(self, server=None):
+        server = server or FakeServer()
+        self._data = server.data
+        self._ttls = server.ttls
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
 
     def zincrby(self, key, amount, value):
         value = str(value)
         self._data[key][value] = self._data[key].get(value, 0) + amount
+        return self._data[key][value]
+
+    def zscore(self, key, value):
+        return self._data.get(key, {}).get(str(value))
+
+    def get(self, key):
+        value = self._data.get(key)
+        return None if value is None else str(value).encode()
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self._data:
+            return None
+        self._data[key] = value
+        self._ttls.pop(key, None)
+        if ex is not None:
+            self._ttls[key] = ex
+        return True
+
+    def incr(self, key, amount=1):
+        self._data[key] = int(self._data.get(key, 0)) + amount
+        return self._data[key]
+
+    def rpush(self, key, *values):
+        items = self._data.setdefault(key, [])
+        if not isinstance(items, list):
+            items = self._data[key] = []
+        items.extend(values)
+        return len(items)
+
+    def lrange(self, key, start, end):
+        items = self._data.get(key) or []
+        end = None if end == -1 else end + 1
+        return [
+            value if isinstance(value, bytes) else str(value).encode()
+            for value in items[start:end]
+        ]
+
+    def ltrim(self, key, start, end):
+        items = self._data.get(key) or []
+        end = None if end == -1 else end + 1
+        self._data[key] = items[start:end]
+        return True
+
+    def zcard(self, key):
+        return len(self._data.get(key, {}))
 
     def zrange(self, key, start, end, desc=False):
         items = self._data.get(key, {})
@@ -17,6 +95,14 @@ class FakeRedis:
             end = len(members) - 1
         return members[start : end + 1]
 
+    def zremrangebyrank(self, key, start, end):
+        items = self._data.get(key, {})
+        members = sorted(items, key=lambda member: items[member])
+        removed = members[start : (end + 1) or None]
+        for member in removed:
+            items.pop(member, None)
+        return len(removed)
+
     def zunionstore(self, dest, keys):
         combined = defaultdict(int)
         for key in keys:
@@ -28,5 +114,99 @@ class FakeRedis:
         for value in values:
             self._data.get(key, {}).pop(str(value), None)
 
-    def delete(self, key):
-        self._data.pop(key, None)
+    def sadd(self, key, *values):
+        members = self._data.get(key)
+        if not isinstance(members, set):
+            members = self._data[key] = set()
+        added = {str(value) for value in values} - members
+        members.update(added)
+        return len(added)
+
+    def sismember(self, key, value):
+        members = self._data.get(key)
+        return isinstance(members, set) and str(value) in members
+
+    def hget(self, key, field):
+        value = self._data.get(key, {}).get(str(field))
+        return None if value is None else str(value).encode()
+
+    def hgetall(self, key):
+        return {
+            str(field).encode(): str(value).encode()
+            for field, value in self._data.get(key, {}).items()
+        }
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        mapping = dict(mapping or {})
+        if field is not None:
+            mapping[field] = value
+        added = 0
+        for field, value in mapping.items():
+            added += str(field) not in self._data[key]
+            self._data[key][str(field)] = value
+        return added
+
+    def hsetnx(self, key, field, value):
+        if str(field) in self._data.get(key, {}):
+            return 0
+        self._data[key][str(field)] = value
+        return 1
+
+    def hincrby(self, key, field, amount=1):
+        field = str(field)
+        self._data[key][field] = int(self._data[key].get(field, 0)) + amount
+        return self._data[key][field]
+
+    def hdel(self, key, *fields):
+        removed = 0
+        for field in fields:
+            removed += self._data.get(key, {}).pop(str(field), None) is not None
+        return removed
+
+    def expire(self, key, seconds):
+        if key not in self._data:
+            return False
+        self._ttls[key] = seconds
+        return True
+
+    def ttl(self, key):
+        if key not in self._data:
+            return -2
+        return self._ttls.get(key, -1)
+
+    def exists(self, *keys):
+        return sum(1 for key in keys if self._data.get(key))
+
+    def delete(self, *keys):
+        for key in keys:
+            self._data.pop(key, None)
+            self._ttls.pop(key, None)
+
+    def flushdb(self):
+        self._data.clear()
+        self._ttls.clear()
+
+
+class FakeAsyncPipeline(FakePipeline):
+    async def execute(self):
+        return super().execute()
+
+
+class FakeAsyncRedis:
+    """
+    An asyncio client (like ``redis.asyncio.Redis``) over the same commands.
+    """
+
+    def __init__(self, server=None):
+        self._redis = FakeRedis(server=server)
+
+    def pipeline(self, transaction=True):
+        return FakeAsyncPipeline(self._redis)
+
+    def __getattr__(self, name):
+        command = getattr(self._redis, name)
+
+        async def call(*args, **kwargs):
+            return command(*args, **kwargs)
+
+        return call
@@ -1,44 +1,143 @@
-from typing import List, Dict, Any
-from django.http import HttpRequest
+import gzip
+import hashlib
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
 from shop.models import ProductVariant
 
+# Number of variants fetched from the database per round trip.
+FEED_CHUNK_SIZE = 2000
+
+# XML element names of each platform's feed, keyed by feed item field.
+FEED_ELEMENTS = {
+    "torob": {"product_url": "product_url", "image_url": "image_url"},
+    "emalls": {"product_url": "url", "image_url": "image"},
+}
+CDATA_FIELDS = ("title", "product_url", "image_url", "category")
+_SLUG_PLACEHOLDER = "__slug__"
+
 
-def generate_product_feed_data(request: HttpRequest) -> List[Dict[str, Any]]:
+def iter_product_feed(base_uri: str) -> Iterator[Dict[str, Any]]:
     """
-    Fetches active and in-stock product variants and formats them for a feed.
+    Yields the active, in-stock product variants formatted for a feed.
+
+    Rows are streamed from the database in chunks, without building model
+    instances, and absolute URLs are joined onto ``base_uri`` directly.
 
     Args:
-        request: The HttpRequest object, used to build absolute URLs.
-
-    Returns:
-        A list of dictionaries, where each dictionary represents a product
-        variant with the necessary data for the feed.
-    """
-    variants = ProductVariant.objects.filter(
-        stock__gt=0, product__deleted_at__isnull=True
-    ).select_related("product", "product__category")
-
-    feed_data = []
-    for variant in variants:
-        product = variant.product
-
-        # Determine the image URL, preferring the variant's image
-        image_obj = variant.image or product.thumbnail
-        image_url = request.build_absolute_uri(image_obj.url) if image_obj else ""
-
-        # Build the absolute URL for the product
-        product_url = request.build_absolute_uri(product.get_absolute_url())
-
-        feed_data.append(
-            {
-                "id": variant.sku or str(variant.variant_id),
-                "title": product.name,
-                "price": variant.price,
-                "availability": "instock",  # Or True, depending on the platform's requirement
-                "product_url": product_url,
-                "image_url": image_url,
-                "category": product.category.name,
-            }
+        base_uri: The absolute root URL of the site, e.g. "https://shop.ir/".
+    """
+    product_path = reverse("api-v1:product-detail", kwargs={"slug": _SLUG_PLACEHOLDER})
+    rows = (
+        ProductVariant.objects.filter(stock__gt=0, product__deleted_at__isnull=True)
+        .order_by("product_id", "variant_id")
+        .values_list(
+            "variant_id",
+            "sku",
+            "price",
+            "image",
+            "product__name",
+            "product__slug",
+            "product__thumbnail",
+            "product__category__name",
         )
+        .iterator(chunk_size=FEED_CHUNK_SIZE)
+    )
 
-    return feed_data
+    for variant_id, sku, price, image, name, slug, thumbnail, category in rows:
+        # Prefer the variant's image over the product thumbnail
+        image_name = image or thumbnail
+        image_url = (
+            urljoin(base_uri, default_storage.url(image_name)) if image_name else ""
+        )
+        yield {
+            "id": sku or str(variant_id),
+            "title": name,
+            "price": price,
+            "availability": "instock",  # Or True, depending on the platform's requirement
+            "product_url": urljoin(
+                base_uri, product_path.replace(_SLUG_PLACEHOLDER, slug)
+            ),
+            "image_url": image_url,
+            "category": category,
+        }
+
+
+def _cdata(value) -> str:
+    # "]]>" cannot appear inside a CDATA section; split it across two.
+    return "<![CDATA[" + str(value).replace("]]>", "]]]]><![CDATA[>") + "]]>"
+
+
+def render_feed(platform: str, items: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Renders the XML feed of ``platform`` incrementally, one product at a time.
+    """
+    elements = FEED_ELEMENTS[platform]
+    fields = (
+        "id",
+        "title",
+        "price",
+        "availability",
+        "product_url",
+        "image_url",
+        "category",
+    )
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<products>\n'
+    for item in items:
+        parts = ["<product>"]
+        for field in fields:
+            tag = elements.get(field, field)
+            value = item[field]
+            value = _cdata(value) if field in CDATA_FIELDS else escape(str(value))
+            parts.append(f"<{tag}>{value}</{tag}>")
+        parts.append("</product>\n")
+        yield "".join(parts)
+    yield "</products>\n"
+
+
+def read_gzip(path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with gzip.open(path, "rb") as snapshot:
+        while chunk := snapshot.read(chunk_size):
+            yield chunk
+
+
+def snapshot_path(platform: str) -> str:
+    return os.path.join(settings.FEED_SNAPSHOT_DIR, f"{platform}.xml.gz")
+
+
+def write_feed_snapshot(platform: str, base_uri: str) -> str:
+    """
+    Renders the feed of ``platform`` into a gzip-compressed snapshot file.
+    The file is written next to its final location and moved into place, so
+    readers never see a partial snapshot.
+    """
+    path = snapshot_path(platform)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(
+            fileobj=raw, mode="wb", mtime=0
+        ) as compressed:
+            for chunk in render_feed(platform, iter_product_feed(base_uri)):
+                compressed.write(chunk.encode("utf-8"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def snapshot_validators(path: str):
+    """
+    Returns the (ETag, Last-Modified timestamp) pair of a snapshot file.
+    """
+    stat = os.stat(path)
+    digest = hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode()).hexdigest()
+    return f'"{digest}"', stat.st_mtime
@@ -0,0 +1,59 @@
+import logging
+import os
+import time
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+
+from shop.caching import PRODUCT_LIST_GENERATION_KEY, get_generations
+from .models import IntegrationSettings
+from .services import FEED_ELEMENTS, snapshot_path, write_feed_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Root URL feed links are built on, remembered from the last crawler request
+# when FEED_BASE_URL is not configured.
+FEED_BASE_URI_KEY = "feed_snapshot:base_uri"
+# Catalog generation each platform's snapshot was built from.
+FEED_SNAPSHOT_VERSION_KEY = "feed_snapshot:{}:version"
+
+
+def _is_stale(platform, version):
+    path = snapshot_path(platform)
+    if not os.path.exists(path):
+        return True
+    if cache.get(FEED_SNAPSHOT_VERSION_KEY.format(platform)) != version:
+        return True
+    # Stock sold through bulk updates does not bump the catalog generation,
+    # so snapshots are also rebuilt after a maximum age.
+    return time.time() - os.path.getmtime(path) > settings.FEED_SNAPSHOT_MAX_AGE
+
+
+@shared_task
+def regenerate_product_feeds(force=False):
+    """
+    Rebuilds the gzip snapshots of the enabled Torob/Emalls feeds whose
+    catalog generation changed since they were built (or that are too old).
+    """
+    base_uri = settings.FEED_BASE_URL or cache.get(FEED_BASE_URI_KEY)
+    if not base_uri:
+        logger.info("Skipping feed snapshots: no base URL known yet.")
+        return []
+
+    integration_settings = IntegrationSettings.load()
+    version = get_generations([PRODUCT_LIST_GENERATION_KEY])[0]
+
+    rebuilt = []
+    for platform in FEED_ELEMENTS:
+        if not getattr(integration_settings, f"{platform}_enabled", False):
+            continue
+        if not force and not _is_stale(platform, version):
+            continue
+        try:
+            write_feed_snapshot(platform, base_uri)
+            cache.set(FEED_SNAPSHOT_VERSION_KEY.format(platform), version, None)
+            rebuilt.append(platform)
+        except Exception as e:
+            logger.error(f"Error building the {platform} feed snapshot: {e}")
+    return rebuilt
@@ -1,4 +1,8 @@
-from django.test import TestCase, RequestFactory
+import gzip
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
@@ -6,12 +10,12 @@ from rest_framework import status
 from account.factories import UserAccountFactory as UserFactory
 from shop.factories import ProductFactory, ProductVariantFactory
 from .models import IntegrationSettings
-from .services import generate_product_feed_data
+from .services import iter_product_feed, render_feed, snapshot_path
+from .tasks import regenerate_product_feeds
 
 
 class IntegrationServiceTests(TestCase):
     def setUp(self):
-        self.factory = RequestFactory()
         self.product1 = ProductFactory()
         self.variant1 = ProductVariantFactory(product=self.product1, stock=10)
 
@@ -23,12 +27,55 @@ class IntegrationServiceTests(TestCase):
         self.product3 = ProductFactory(deleted_at=timezone.now())  # Soft-deleted
         self.variant3 = ProductVariantFactory(product=self.product3, stock=5)
 
-    def test_generate_product_feed_data(self):
-        request = self.factory.get("/")
-        feed_data = generate_product_feed_data(request)
+    def test_iter_product_feed(self):
+        self.product1.variants.exclude(pk=self.variant1.pk).delete()
+        self.product2.variants.exclude(pk=self.variant2.pk).delete()
+
+        feed_data = list(iter_product_feed("http://testserver/"))
 
         self.assertEqual(len(feed_data), 1)
         self.assertEqual(feed_data[0]["id"], self.variant1.sku)
+        self.assertEqual(
+            feed_data[0]["product_url"],
+            "http://testserver" + self.product1.get_absolute_url(),
+        )
+
+    def test_render_feed_escapes_values(self):
+        item = {
+            "id": "a&b",
+            "title": "Tricky ]]> name",
+            "price": 10,
+            "availability": "instock",
+            "product_url": "http://testserver/p/",
+            "image_url": "",
+            "category": "Cat",
+        }
+
+        xml = "".join(render_feed("torob", [item]))
+
+        self.assertIn("<id>a&amp;b</id>", xml)
+        self.assertIn("<title><![CDATA[Tricky ]]]]><![CDATA[> name]]></title>", xml)
+        self.assertIn(
+            "<product_url><![CDATA[http://testserver/p/]]></product_url>", xml
+        )
+        self.assertIn("<image_url><![CDATA[]]></image_url>", xml)
+
+    def test_render_feed_uses_platform_element_names(self):
+        item = {
+            "id": "1",
+            "title": "Name",
+            "price": 10,
+            "availability": "instock",
+            "product_url": "http://testserver/p/",
+            "image_url": "http://testserver/i.jpg",
+            "category": "Cat",
+        }
+
+        xml = "".join(render_feed("emalls", [item]))
+
+        self.assertIn("<url><![CDATA[http://testserver/p/]]></url>", xml)
+        self.assertIn("<image><![CDATA[http://testserver/i.jpg]]></image>", xml)
+        self.assertNotIn("<product_url>", xml)
 
 
 class IntegrationFeedTests(TestCase):
@@ -36,31 +83,79 @@ class IntegrationFeedTests(TestCase):
         self.client = APIClient()
         self.settings = IntegrationSettings.load()
         self.product = ProductFactory()
+        self.product.variants.all().delete()
         ProductVariantFactory(product=self.product, stock=5)
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        snapshot_settings = override_settings(
+            FEED_SNAPSHOT_DIR=snapshot_dir, FEED_BASE_URL="http://testserver/"
+        )
+        snapshot_settings.enable()
+        self.addCleanup(snapshot_settings.disable)
 
     def test_feed_disabled(self):
         self.settings.torob_enabled = False
         self.settings.save()
-        url = reverse("integrations:torob_feed") + f"?token={self.settings.feed_token}"
+        url = (
+            reverse("api-v1:integrations:torob_feed")
+            + f"?token={self.settings.feed_token}"
+        )
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_feed_invalid_token(self):
         self.settings.torob_enabled = True
         self.settings.save()
-        url = reverse("integrations:torob_feed") + "?token=invalid-token"
+        url = reverse("api-v1:integrations:torob_feed") + "?token=invalid-token"
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
     def test_feed_success(self):
         self.settings.torob_enabled = True
         self.settings.save()
-        url = reverse("integrations:torob_feed") + f"?token={self.settings.feed_token}"
+        url = (
+            reverse("api-v1:integrations:torob_feed")
+            + f"?token={self.settings.feed_token}"
+        )
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response["Content-Type"], "application/xml")
         self.assertContains(response, f"<id>{self.product.variants.first().sku}</id>")
 
+    def test_feed_served_from_snapshot_with_validators(self):
+        self.settings.torob_enabled = True
+        self.settings.save()
+        self.assertEqual(regenerate_product_feeds(), ["torob"])
+        url = (
+            reverse("api-v1:integrations:torob_feed")
+            + f"?token={self.settings.feed_token}"
+        )
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        body = gzip.decompress(b"".join(response.streaming_content))
+        self.assertIn(f"<id>{self.product.variants.first().sku}</id>".encode(), body)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        plain = self.client.get(url)
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(b"".join(plain.streaming_content), body)
+
+    def test_snapshot_only_rebuilt_after_catalog_change(self):
+        self.settings.torob_enabled = True
+        self.settings.save()
+        self.assertEqual(regenerate_product_feeds(), ["torob"])
+        self.assertEqual(regenerate_product_feeds(), [])
+
+        ProductFactory().variants.update(stock=3)
+
+        self.assertEqual(regenerate_product_feeds(), ["torob"])
+        with gzip.open(snapshot_path("torob")) as snapshot:
+            self.assertEqual(snapshot.read().count(b"<product>"), 2)
+
 
 class IntegrationToggleAPITests(TestCase):
     def setUp(self):
@@ -68,7 +163,7 @@ class IntegrationToggleAPITests(TestCase):
         self.admin_user = UserFactory(is_staff=True, is_superuser=True)
         self.normal_user = UserFactory()
         self.settings = IntegrationSettings.load()
-        self.url = reverse("integrations:toggle_integration")
+        self.url = reverse("api-v1:integrations:toggle_integration")
 
     def test_toggle_permission_denied_for_anonymous(self):
         response = self.client.post(self.url, {"name": "torob", "enabled": True})
@@ -1,19 +1,34 @@
-from django.http import HttpResponse, Http404
+import os
+
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django.views import View
-from django.template.loader import render_to_string
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAdminUser
 
 from .models import IntegrationSettings
-from .services import generate_product_feed_data
+from .services import (
+    iter_product_feed,
+    read_gzip,
+    render_feed,
+    snapshot_path,
+    snapshot_validators,
+)
+from .tasks import FEED_BASE_URI_KEY
 from .serializers import IntegrationToggleSerializer
 
 
 class BaseFeedView(View):
     """
     A base view for handling common logic for Torob and Emalls feeds.
+
+    The feed is served from the gzip snapshot kept up to date by
+    `integrations.tasks.regenerate_product_feeds`, with ETag/Last-Modified
+    validators. Until a snapshot exists, it is streamed from the database.
     """
 
     platform_name = None  # Should be 'torob' or 'emalls'
@@ -31,15 +46,40 @@ class BaseFeedView(View):
         if not token or str(settings.feed_token) != token:
             return HttpResponse("Forbidden: Invalid or missing token.", status=403)
 
-        # Generate feed data
-        products = generate_product_feed_data(request)
-
-        # Render XML content
-        xml_content = render_to_string(
-            f"integrations/{self.platform_name}_feed.xml", {"products": products}
+        path = snapshot_path(self.platform_name)
+        if os.path.exists(path):
+            return self.snapshot_response(request, path)
+
+        # No snapshot yet: stream the feed, and remember the site URL so the
+        # snapshot task can build one with the same links.
+        base_uri = request.build_absolute_uri("/")
+        cache.set(FEED_BASE_URI_KEY, base_uri, None)
+        return StreamingHttpResponse(
+            render_feed(self.platform_name, iter_product_feed(base_uri)),
+            content_type="application/xml",
         )
 
-        return HttpResponse(xml_content, content_type="application/xml")
+    def snapshot_response(self, request, path):
+        etag, last_modified = snapshot_validators(path)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified)
+        )
+        if response is None:
+            if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+                response = FileResponse(
+                    open(path, "rb"),
+                    content_type="application/xml",
+                    filename=f"{self.platform_name}.xml",
+                )
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = StreamingHttpResponse(
+                    read_gzip(path), content_type="application/xml"
+                )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
 
 
 class TorobFeedView(BaseFeedView):
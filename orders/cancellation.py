@@ -0,0 +1,101 @@
+"""
+Bulk cancellation of pending orders that were never paid for.
+
+Orders are canceled in batches, each in its own transaction: the batch is
+locked with ``SELECT ... FOR UPDATE SKIP LOCKED`` (so an order being paid
+for right now is left alone), its stock is returned with one UPDATE per
+batch, and the status change is written with one bulk UPDATE plus one bulk
+INSERT of history rows, instead of an ``Order.save()`` per order.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from simple_history.utils import bulk_update_with_history
+
+from discounts import usage as discount_usage
+
+from .models import Order, OrderItem, StockReservation
+from .reservations import release_reservations, return_to_stock
+
+CANCELLATION_REASON = "Not paid in time"
+
+
+def _restore_stock(order_ids):
+    """
+    Returns the stock of the given orders: their held reservations, or, for
+    orders placed before stock was reserved, their items.
+    """
+    reserved = set(
+        StockReservation.objects.filter(order_id__in=order_ids).values_list(
+            "order_id", flat=True
+        )
+    )
+    if reserved:
+        release_reservations(StockReservation.objects.filter(order_id__in=reserved))
+
+    unreserved = [order_id for order_id in order_ids if order_id not in reserved]
+    if unreserved:
+        quantities = defaultdict(int)
+        rows = (
+            OrderItem.objects.filter(order_id__in=unreserved)
+            .values("variant_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("variant_id", "total")
+        )
+        for variant_id, total in rows:
+            quantities[variant_id] += total
+        return_to_stock(quantities)
+
+
+def cancel_batch(placed_before, batch_size=500):
+    """
+    Cancels up to ``batch_size`` pending orders placed before
+    ``placed_before`` and returns the number canceled.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(
+                status=Order.Status.PENDING, order_date__lte=placed_before
+            )
+            .order_by("order_date")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not orders:
+            return 0
+
+        _restore_stock([order.pk for order in orders])
+
+        now = timezone.now()
+        for order in orders:
+            order.status = Order.Status.CANCELED
+            order.updated = now
+        bulk_update_with_history(
+            orders,
+            Order,
+            ["status", "updated"],
+            default_change_reason=CANCELLATION_REASON,
+            default_date=now,
+        )
+
+        discount_uses = [
+            (order.discount_id, order.user_id) for order in orders if order.discount_id
+        ]
+        if discount_uses:
+            transaction.on_commit(lambda: discount_usage.release(discount_uses))
+    return len(orders)
+
+
+def cancel_stale_orders(placed_before, batch_size=500):
+    """
+    Cancels every pending order placed before ``placed_before``, one batch
+    at a time. Returns the number canceled.
+    """
+    canceled = 0
+    while True:
+        count = cancel_batch(placed_before, batch_size)
+        canceled += count
+        if count < batch_size:
+            return canceled
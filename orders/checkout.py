@@ -0,0 +1,64 @@
+"""
+Request-scoped checkout state.
+
+A checkout reads the cart and picks the discount once, when the order
+request is validated, and every later step (stock reservation, order and
+item creation, totals) works from that snapshot instead of iterating the
+cart and recomputing discounts and totals again.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from discounts.services import DiscountService
+
+
+class CheckoutContext:
+    """
+    A snapshot of the cart lines, their subtotal and the discount chosen for
+    them. It iterates and totals like a ``Cart``, so it can be passed to the
+    discount service in place of one.
+    """
+
+    def __init__(self, cart, user):
+        self.cart = cart
+        self.user = user
+        self.lines = list(cart)
+        self.subtotal = sum(
+            (line["total_price"] for line in self.lines), Decimal("0.00")
+        )
+        self.discount = None
+        self.discount_amount = Decimal("0.00")
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return sum(line["quantity"] for line in self.lines)
+
+    def get_total_price(self):
+        return self.subtotal
+
+    def apply_discount(self, discount_code=None):
+        """
+        Picks the discount of ``discount_code``, or the best automatic one,
+        and returns it (``None`` if there is none).
+        """
+        self.discount_amount, self.discount = DiscountService.apply_discount(
+            self, self.user, discount_code
+        )
+        return self.discount
+
+    def quantities(self):
+        """Returns the quantity to reserve of each variant, by variant id."""
+        quantities = defaultdict(int)
+        for line in self.lines:
+            quantities[line["variant"].variant_id] += line["quantity"]
+        return quantities
+
+    def get_variant(self, variant_id):
+        return next(
+            line["variant"]
+            for line in self.lines
+            if line["variant"].variant_id == variant_id
+        )
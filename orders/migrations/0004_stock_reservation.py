@@ -0,0 +1,109 @@
+# Generated by Django 5.2 on 2026-10-17 07:44
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def reserve_existing_orders(apps, schema_editor):
+    """
+    Orders placed before reservations existed already took their stock.
+    Record it, so it is neither taken again at payment nor lost on cancel:
+    pending orders get active reservations, later ones committed ones.
+    """
+    OrderItem = apps.get_model("orders", "OrderItem")
+    StockReservation = apps.get_model("orders", "StockReservation")
+    expires_at = timezone.now() + timedelta(
+        seconds=getattr(settings, "STOCK_RESERVATION_TTL", 60 * 20)
+    )
+    items = (
+        OrderItem.objects.exclude(order__status="canceled")
+        .values_list("order_id", "variant_id", "quantity", "order__status")
+        .iterator(chunk_size=2000)
+    )
+    batch = []
+    for order_id, variant_id, quantity, status in items:
+        batch.append(
+            StockReservation(
+                order_id=order_id,
+                variant_id=variant_id,
+                quantity=quantity,
+                status="active" if status == "pending" else "committed",
+                expires_at=expires_at,
+            )
+        )
+        if len(batch) >= 2000:
+            StockReservation.objects.bulk_create(batch)
+            batch = []
+    StockReservation.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_remove_historicalorder_coupon_remove_order_coupon_and_more"),
+        ("shop", "0004_product_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("committed", "Committed"),
+                            ("released", "Released"),
+                        ],
+                        default="active",
+                        max_length=20,
+                    ),
+                ),
+                ("expires_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="orders.order",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="shop.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock Reservation",
+                "verbose_name_plural": "Stock Reservations",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "expires_at"],
+                        name="orders_stoc_status_e8aa04_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(reserve_existing_orders, migrations.RunPython.noop),
+    ]
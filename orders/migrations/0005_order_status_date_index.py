@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-17 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_stock_reservation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "order_date"], name="orders_orde_status_389324_idx"
+            ),
+        ),
+    ]
@@ -2,7 +2,7 @@ import uuid
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django_prometheus.models import ExportModelOperationsMixin
 from simple_history.models import HistoricalRecords
 
@@ -85,6 +85,7 @@ class Order(ExportModelOperationsMixin("order"), models.Model):
         indexes = [
             models.Index(fields=["user"]),
             models.Index(fields=["-order_date"]),
+            models.Index(fields=["status", "order_date"]),
         ]
         ordering = ["-order_date"]
 
@@ -113,6 +114,7 @@ class Order(ExportModelOperationsMixin("order"), models.Model):
 
         if is_canceling:
             self.restore_stock()
+            self.release_discount()
 
         self.clean()
         super().save(*args, **kwargs)
@@ -128,12 +130,32 @@ class Order(ExportModelOperationsMixin("order"), models.Model):
             # For now, we just prevent stock restoration
             return
 
+        if self.pk and self.reservations.exists():
+            from .reservations import release_reservations
+
+            # Expired reservations were already returned to stock.
+            release_reservations(self.reservations.all())
+            return
+
+        # Orders without reservations decremented stock directly.
         for item in self.items.all():
             variant = item.variant
             # Use atomic update to prevent race conditions
             variant.stock = models.F("stock") + item.quantity
             variant.save(update_fields=["stock"])
 
+    def release_discount(self):
+        """
+        Give back the discount use reserved at checkout for a canceled order,
+        once the cancellation is committed.
+        """
+        if not self.discount_id:
+            return
+        from discounts import usage
+
+        use = (self.discount_id, self.user_id)
+        transaction.on_commit(lambda: usage.release([use]))
+
     def get_total_cost_before_discount(self):
         """
         Calculate the total cost of all items in the order before applying any discounts.
@@ -154,10 +176,11 @@ class Order(ExportModelOperationsMixin("order"), models.Model):
         total_cost = self.get_total_cost_before_discount()
         return total_cost - self.discount_amount
 
-    def calculate_total_payable(self):
+    def calculate_total_payable(self, subtotal=None):
         """
         Calculates the final amount to be paid by the user.
         This now relies on the discount_amount being pre-calculated and stored.
+        A ``subtotal`` already known to the caller saves summing the items.
         """
 
         def _as_decimal(value):
@@ -165,7 +188,9 @@ class Order(ExportModelOperationsMixin("order"), models.Model):
                 return value
             return Decimal(str(value or 0))
 
-        self.subtotal = _as_decimal(self.get_total_cost_before_discount())
+        if subtotal is None:
+            subtotal = self.get_total_cost_before_discount()
+        self.subtotal = _as_decimal(subtotal)
         # self.discount_amount is now set directly when the order is created.
         total = (
             self.subtotal
@@ -206,3 +231,40 @@ class OrderItem(models.Model):
         return (
             f"Order Item: {self.variant.product.name} (Order ID: {self.order.order_id})"
         )
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for an order. Reserving decrements ``ProductVariant.stock``
+    right away; an active reservation that is not committed by a successful
+    payment before ``expires_at`` is released and its quantity returned.
+    """
+
+    class Status(models.TextChoices):
+        ACTIVE = "active", "Active"
+        COMMITTED = "committed", "Committed"
+        RELEASED = "released", "Released"
+
+    order = models.ForeignKey(
+        Order, related_name="reservations", on_delete=models.CASCADE
+    )
+    variant = models.ForeignKey(
+        ProductVariant, related_name="reservations", on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.ACTIVE
+    )
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Stock Reservation"
+        verbose_name_plural = "Stock Reservations"
+        indexes = [
+            models.Index(fields=["status", "expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} of {self.variant_id} for order {self.order_id} ({self.status})"
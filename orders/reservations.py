@@ -0,0 +1,205 @@
+"""
+Stock reservations.
+
+Checkout takes stock with conditional decrements (``UPDATE ... SET stock =
+stock - n WHERE stock >= n``) instead of locking variant rows with SELECT
+... FOR UPDATE, so concurrent checkouts of the same variant only contend
+for the duration of one UPDATE. Every decrement is recorded as a
+``StockReservation`` with an expiry: a successful payment commits it, an
+expired or canceled one is released and its quantity returned in bulk.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from shop.models import Product, ProductVariant
+
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+HELD_STATUSES = [StockReservation.Status.ACTIVE, StockReservation.Status.COMMITTED]
+
+
+class InsufficientStock(Exception):
+    """Raised when a variant does not have enough stock left to reserve."""
+
+    def __init__(self, variant_id):
+        self.variant_id = variant_id
+        super().__init__(f"Insufficient stock for variant {variant_id}")
+
+
+def _expiry():
+    return timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+
+
+def _refresh_products(variant_ids):
+    Product.refresh_variant_summaries(
+        ProductVariant.objects.filter(pk__in=variant_ids).values("product_id")
+    )
+
+
+def reserve_stock(order, quantities):
+    """
+    Reserves ``{variant_id: quantity}`` for ``order``. Either every variant
+    is reserved or, if one lacks stock, none is and InsufficientStock is
+    raised with its id.
+    """
+    quantities = {
+        variant_id: quantity for variant_id, quantity in quantities.items() if quantity
+    }
+    if not quantities:
+        return []
+
+    with transaction.atomic():
+        # A fixed order keeps concurrent checkouts from deadlocking.
+        for variant_id in sorted(quantities, key=str):
+            quantity = quantities[variant_id]
+            taken = ProductVariant.objects.filter(
+                pk=variant_id, stock__gte=quantity
+            ).update(stock=F("stock") - quantity)
+            if not taken:
+                raise InsufficientStock(variant_id)
+
+        expires_at = _expiry()
+        reservations = StockReservation.objects.bulk_create(
+            [
+                StockReservation(
+                    order=order,
+                    variant_id=variant_id,
+                    quantity=quantity,
+                    expires_at=expires_at,
+                )
+                for variant_id, quantity in quantities.items()
+            ]
+        )
+        _refresh_products(quantities)
+    return reservations
+
+
+def ensure_reserved(order):
+    """
+    Makes sure every item of ``order`` is covered by a held reservation,
+    reserving again what has expired, and extends the active reservations.
+    """
+    with transaction.atomic():
+        needed = defaultdict(int)
+        for variant_id, quantity in order.items.values_list("variant_id", "quantity"):
+            needed[variant_id] += quantity
+        held = dict(
+            order.reservations.filter(status__in=HELD_STATUSES)
+            .values("variant_id")
+            .annotate(total=Sum("quantity"))
+            .values_list("variant_id", "total")
+        )
+        reserve_stock(
+            order,
+            {
+                variant_id: quantity - held.get(variant_id, 0)
+                for variant_id, quantity in needed.items()
+                if quantity > held.get(variant_id, 0)
+            },
+        )
+        order.reservations.filter(status=StockReservation.Status.ACTIVE).update(
+            expires_at=_expiry(), updated_at=timezone.now()
+        )
+
+
+def commit_reservations(order):
+    """
+    Marks the reservations of a paid order as committed, so they are no
+    longer released on expiry. Stock that expired before the payment came
+    in is reserved again if still available; a shortfall is logged rather
+    than failing the already captured payment.
+    """
+    try:
+        ensure_reserved(order)
+    except InsufficientStock as e:
+        logger.error(
+            f"Order {order.order_id} was paid but variant {e.variant_id} "
+            f"no longer has enough stock to cover it."
+        )
+    return order.reservations.filter(status=StockReservation.Status.ACTIVE).update(
+        status=StockReservation.Status.COMMITTED, updated_at=timezone.now()
+    )
+
+
+def release_reservations(reservations, expired_only=False):
+    """
+    Releases the held reservations among ``reservations`` and returns their
+    quantities to stock, with one UPDATE for the reservations and one for
+    the variants. Returns the number of reservations released.
+
+    Committed reservations are only released when their order is canceled.
+    With ``expired_only``, the rows are re-checked under the lock to still
+    be active and expired, so a reservation committed or extended by a
+    payment since it was picked is left alone, and rows locked by another
+    transaction are skipped for the next sweep. Otherwise (an order being
+    canceled) locked rows are waited for, so none of them stays held.
+    """
+    if expired_only:
+        held = reservations.filter(
+            status=StockReservation.Status.ACTIVE, expires_at__lte=timezone.now()
+        )
+    else:
+        held = reservations.filter(status__in=HELD_STATUSES)
+    with transaction.atomic():
+        rows = list(
+            held.select_for_update(skip_locked=expired_only).values_list(
+                "pk", "variant_id", "quantity"
+            )
+        )
+        if not rows:
+            return 0
+
+        StockReservation.objects.filter(pk__in=[pk for pk, _v, _q in rows]).update(
+            status=StockReservation.Status.RELEASED, updated_at=timezone.now()
+        )
+        totals = defaultdict(int)
+        for _pk, variant_id, quantity in rows:
+            totals[variant_id] += quantity
+        return_to_stock(totals)
+    return len(rows)
+
+
+def return_to_stock(quantities):
+    """
+    Adds ``{variant_id: quantity}`` back to stock with a single UPDATE.
+    """
+    if not quantities:
+        return
+    ProductVariant.objects.filter(pk__in=quantities).update(
+        stock=F("stock")
+        + Case(
+            *[
+                When(pk=variant_id, then=Value(q))
+                for variant_id, q in quantities.items()
+            ],
+            default=Value(0),
+        )
+    )
+    _refresh_products(quantities)
+
+
+def release_expired_reservations(batch_size=1000):
+    """
+    Releases active reservations past their expiry, ``batch_size`` at a
+    time. Returns the number released.
+    """
+    released = 0
+    while True:
+        batch = StockReservation.objects.filter(
+            status=StockReservation.Status.ACTIVE, expires_at__lte=timezone.now()
+        ).values_list("pk", flat=True)[:batch_size]
+        count = release_reservations(
+            StockReservation.objects.filter(pk__in=list(batch)), expired_only=True
+        )
+        released += count
+        if count < batch_size:
+            return released
@@ -1,13 +1,16 @@
 from decimal import Decimal
+
 from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from account.models import Address
 from cart.cart import Cart
+from orders.checkout import CheckoutContext
 from orders.models import Order, OrderItem
-from shop.models import ProductVariant
+from orders.reservations import InsufficientStock, reserve_stock
 from discounts.services import DiscountService
+from discounts.usage import DiscountUsageLimitReached
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -85,107 +88,99 @@ class OrderCreateSerializer(serializers.Serializer):
         return address
 
     def validate(self, data):
-        """Validate discount code."""
-        cart = self._get_cart()
-        user = self.context["request"].user
+        """
+        Snapshot the cart and pick its discount, validating the discount code.
+        The snapshot is used by ``save``.
+        """
+        self.checkout = CheckoutContext(self._get_cart(), self.context["request"].user)
         code = data.get("discount_code")
-        if code:
-            # Check if the discount code is valid
-            applicable_discounts = DiscountService.get_applicable_discounts(
-                cart, user, discount_code=code
+        if not self.checkout.apply_discount(code) and code:
+            raise ValidationError(
+                {"discount_code": "This discount code is invalid or has expired."}
             )
-            if not applicable_discounts.exists():
-                raise ValidationError(
-                    {"discount_code": "This discount code is invalid or has expired."}
-                )
         return data
 
     def save(self, **kwargs):
         """
-        Create and save the order and its items from the cart, applying the best discount.
+        Create and save the order and its items from the checkout snapshot,
+        with the discount picked during validation.
         """
-        cart = self._get_cart()
-        if len(cart) == 0:
+        checkout = self.checkout
+        if len(checkout) == 0:
             raise ValidationError("Your cart is empty.")
 
-        user = self.context["request"].user
-        address = self.validated_data["address_id"]
-        discount_code = self.validated_data.get("discount_code")
-
-        with transaction.atomic():
-            # Apply discount (either coded or automatic)
-            discount_amount, discount_object = DiscountService.apply_discount(
-                cart, user, discount_code
-            )
-
-            # Lock products to prevent race conditions
-            variant_ids = [item["variant"].variant_id for item in cart]
-            locked_variants = list(
-                ProductVariant.objects.select_for_update().filter(
-                    variant_id__in=variant_ids
-                )
-            )
-
-            if len(locked_variants) != len(variant_ids):
-                raise ValidationError(
-                    "Some products in your cart are no longer available."
-                )
+        # Reserve a use of the discount before writing anything. A coded
+        # discount that ran out fails the checkout; an automatic one is
+        # dropped.
+        if checkout.discount:
+            try:
+                DiscountService.reserve_usage(checkout.discount, checkout.user)
+            except DiscountUsageLimitReached:
+                if self.validated_data.get("discount_code"):
+                    raise ValidationError(
+                        {
+                            "discount_code": "This discount code has reached its usage limit."
+                        }
+                    )
+                checkout.discount = None
+                checkout.discount_amount = Decimal("0.00")
 
-            locked_variants_map = {v.variant_id: v for v in locked_variants}
+        # The order is written in a durable (outermost) transaction: once it
+        # fails, nothing of the order can be committed anymore, so the use is
+        # given back right away; once it succeeds, the order that holds the use
+        # is committed.
+        try:
+            return self._create_order(checkout)
+        except Exception:
+            if checkout.discount:
+                DiscountService.release_usage(checkout.discount, checkout.user)
+            raise
+
+    def _create_order(self, checkout):
+        user = checkout.user
+        address = self.validated_data["address_id"]
 
+        with transaction.atomic(durable=True):
             # Create the order with discount information
             order = Order.objects.create(
                 user=user,
                 address=address,
-                discount=discount_object,
-                discount_amount=discount_amount,
+                discount=checkout.discount,
+                discount_amount=checkout.discount_amount,
             )
 
-            items_to_create = []
-            variants_to_update = []
-
-            for item in cart:
-                variant = locked_variants_map.get(item["variant"].variant_id)
-
-                # Re-validate stock at the moment of purchase
-                if variant.stock < item["quantity"]:
-                    raise ValidationError(
-                        f"Not enough stock for {variant.product.name}."
-                    )
-
-                # Price snapshotting is handled by the Cart logic, assuming it's up-to-date
-
-                variant.stock -= item["quantity"]
-                variants_to_update.append(variant)
+            # Take the stock with conditional decrements instead of locking
+            # the variant rows; the reservation expires if not paid for.
+            try:
+                reserve_stock(order, checkout.quantities())
+            except InsufficientStock as e:
+                variant = checkout.get_variant(e.variant_id)
+                raise ValidationError(f"Not enough stock for {variant.product.name}.")
 
-                items_to_create.append(
+            OrderItem.objects.bulk_create(
+                [
                     OrderItem(
                         order=order,
-                        variant=variant,
-                        product_name=variant.product.name,
-                        product_sku=variant.sku,
-                        quantity=item["quantity"],
-                        price=item[
+                        variant=line["variant"],
+                        product_name=line["variant"].product.name,
+                        product_sku=line["variant"].sku,
+                        quantity=line["quantity"],
+                        price=line[
                             "price"
                         ],  # Use price from cart to preserve it at time of order
                     )
-                )
-
-            OrderItem.objects.bulk_create(items_to_create)
-            ProductVariant.objects.bulk_update(variants_to_update, ["stock"])
-
-            # Record discount usage after the order is successfully created
-            if discount_object:
-                DiscountService.record_discount_usage(discount_object, user)
+                    for line in checkout
+                ]
+            )
 
             # Set shipping and tax (assuming fixed values for now)
             order.shipping_cost = Decimal("15.00")
-            order.tax_amount = order.get_total_cost_before_discount() * Decimal("0.09")
+            order.tax_amount = checkout.subtotal * Decimal("0.09")
 
             # Calculate final order total
-            order.calculate_total_payable()
+            order.calculate_total_payable(subtotal=checkout.subtotal)
             order.save()
 
-            cart.clear()
+            checkout.cart.clear()
 
             return order
@@ -1,8 +1,6 @@
 import logging
 import sys
 
-from django.db import transaction
-
 from .models import Order
 from .serializers import OrderCreateSerializer
 from .tasks import send_order_confirmation_email
@@ -20,12 +18,13 @@ def get_user_orders(user):
     )
 
 
-@transaction.atomic
 def create_order(request, validated_data):
     serializer = OrderCreateSerializer(
         data=validated_data, context={"request": request}
     )
     serializer.is_valid(raise_exception=True)
+    # Not wrapped in a transaction: the serializer writes the order in its own
+    # durable one, so the discount use is only kept when the order commits.
     order = serializer.save()
     if "test" not in sys.argv:
         try:
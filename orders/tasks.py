@@ -1,3 +1,4 @@
+import uuid
 from datetime import timedelta
 
 from celery import shared_task
@@ -5,10 +6,17 @@ from celery.utils.log import get_task_logger
 from django.core.mail import send_mail
 from django.utils import timezone
 
+from common.utils.cache import acquire_lock, release_lock
+
+from .cancellation import cancel_stale_orders
 from .models import Order
+from .reservations import release_expired_reservations
 
 logger = get_task_logger(__name__)
 
+CANCEL_PENDING_ORDERS_LOCK_KEY = "orders:cancel_pending"
+CANCEL_PENDING_ORDERS_LOCK_TIMEOUT = 60 * 30
+
 
 @shared_task(
     bind=True,
@@ -41,13 +49,33 @@ def send_order_confirmation_email(self, order_pk):
 def cancel_pending_orders():
     """
     Task to cancel pending orders that have not been paid for within a certain timeframe.
+    Runs that would overlap a previous one still in progress are skipped.
+    """
+    # A run outliving the lock timeout must not release the lock of the run
+    # that took it over, so the lock holds a token of this run.
+    token = uuid.uuid4().hex
+    if not acquire_lock(
+        CANCEL_PENDING_ORDERS_LOCK_KEY, CANCEL_PENDING_ORDERS_LOCK_TIMEOUT, token
+    ):
+        logger.info("Pending orders are already being canceled.")
+        return 0
+
+    try:
+        time_threshold = timezone.now() - timedelta(minutes=20)
+        canceled = cancel_stale_orders(time_threshold)
+    finally:
+        release_lock(CANCEL_PENDING_ORDERS_LOCK_KEY, token)
+    if canceled:
+        logger.info(f"Canceled {canceled} pending orders")
+    return canceled
+
+
+@shared_task
+def release_expired_stock_reservations():
+    """
+    Task to return the stock of reservations that expired without payment.
     """
-    time_threshold = timezone.now() - timedelta(minutes=20)
-    pending_orders = Order.objects.filter(
-        status=Order.Status.PENDING, order_date__lte=time_threshold
-    )
-
-    for order in pending_orders:
-        order.status = Order.Status.CANCELED
-        order.save()
-        logger.info(f"Canceled pending order {order.order_id}")
+    released = release_expired_reservations()
+    if released:
+        logger.info(f"Released {released} expired stock reservations")
+    return released
@@ -0,0 +1,194 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from orders.models import Order, StockReservation
+from orders.reservations import (
+    InsufficientStock,
+    commit_reservations,
+    ensure_reserved,
+    release_expired_reservations,
+    release_reservations,
+    reserve_stock,
+)
+from orders.tasks import release_expired_stock_reservations
+from orders.tests.factories import OrderFactory, OrderItemFactory
+from shop.tests.factories import ProductVariantFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _stock(variant):
+    variant.refresh_from_db()
+    return variant.stock
+
+
+def _expire(order):
+    order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+
+def test_reserve_stock_decrements_and_records_reservations():
+    order = OrderFactory()
+    variant1 = ProductVariantFactory(stock=5)
+    variant2 = ProductVariantFactory(stock=3)
+    variant2.product.variants.exclude(pk=variant2.pk).delete()
+
+    reserve_stock(order, {variant1.pk: 2, variant2.pk: 3})
+
+    assert _stock(variant1) == 3
+    assert _stock(variant2) == 0
+    assert set(order.reservations.values_list("variant_id", "quantity", "status")) == {
+        (variant1.pk, 2, StockReservation.Status.ACTIVE),
+        (variant2.pk, 3, StockReservation.Status.ACTIVE),
+    }
+    variant2.product.refresh_from_db()
+    assert not variant2.product.is_in_stock
+
+
+def test_reserve_stock_is_all_or_nothing():
+    order = OrderFactory()
+    variant1 = ProductVariantFactory(stock=5)
+    variant2 = ProductVariantFactory(stock=1)
+
+    with pytest.raises(InsufficientStock) as excinfo:
+        reserve_stock(order, {variant1.pk: 2, variant2.pk: 2})
+
+    assert excinfo.value.variant_id == variant2.pk
+    assert _stock(variant1) == 5
+    assert _stock(variant2) == 1
+    assert not StockReservation.objects.exists()
+
+
+def test_release_expired_reservations_returns_stock_in_bulk():
+    variant = ProductVariantFactory(stock=10)
+    expired_orders = [OrderFactory() for _ in range(3)]
+    for order in expired_orders:
+        reserve_stock(order, {variant.pk: 2})
+        _expire(order)
+    live_order = OrderFactory()
+    reserve_stock(live_order, {variant.pk: 1})
+
+    released = release_expired_stock_reservations()
+
+    assert released == 3
+    assert _stock(variant) == 9
+    assert (
+        StockReservation.objects.filter(status=StockReservation.Status.RELEASED).count()
+        == 3
+    )
+    assert release_expired_reservations() == 0
+
+
+def test_ensure_reserved_reacquires_expired_stock():
+    variant = ProductVariantFactory(stock=10)
+    order = OrderFactory()
+    OrderItemFactory(order=order, variant=variant, quantity=4)
+    reserve_stock(order, {variant.pk: 4})
+    _expire(order)
+    release_expired_reservations()
+    assert _stock(variant) == 10
+
+    ensure_reserved(order)
+
+    assert _stock(variant) == 6
+    reservation = order.reservations.get(status=StockReservation.Status.ACTIVE)
+    assert reservation.quantity == 4
+    assert reservation.expires_at > timezone.now()
+
+
+def test_ensure_reserved_does_not_take_held_stock_twice():
+    variant = ProductVariantFactory(stock=10)
+    order = OrderFactory()
+    OrderItemFactory(order=order, variant=variant, quantity=4)
+    reserve_stock(order, {variant.pk: 4})
+
+    ensure_reserved(order)
+
+    assert _stock(variant) == 6
+    assert order.reservations.count() == 1
+
+
+def test_committed_reservations_are_not_released_on_expiry():
+    variant = ProductVariantFactory(stock=10)
+    order = OrderFactory()
+    OrderItemFactory(order=order, variant=variant, quantity=4)
+    reserve_stock(order, {variant.pk: 4})
+
+    assert commit_reservations(order) == 1
+    _expire(order)
+
+    assert release_expired_reservations() == 0
+    assert _stock(variant) == 6
+
+
+def test_expiry_release_rechecks_reservations_under_lock():
+    """
+    Reservations picked as expired, then committed or extended by a payment
+    before the release, keep their stock.
+    """
+    variant = ProductVariantFactory(stock=10)
+    committed, extended = OrderFactory(), OrderFactory()
+    for order in (committed, extended):
+        OrderItemFactory(order=order, variant=variant, quantity=2)
+        reserve_stock(order, {variant.pk: 2})
+        _expire(order)
+    picked = list(
+        StockReservation.objects.filter(
+            status=StockReservation.Status.ACTIVE, expires_at__lte=timezone.now()
+        ).values_list("pk", flat=True)
+    )
+
+    assert commit_reservations(committed) == 1
+    ensure_reserved(extended)
+
+    released = release_reservations(
+        StockReservation.objects.filter(pk__in=picked), expired_only=True
+    )
+    assert released == 0
+    assert _stock(variant) == 6
+
+
+def test_cancel_releases_reservations():
+    variant = ProductVariantFactory(stock=10)
+    order = OrderFactory(status=Order.Status.PENDING)
+    OrderItemFactory(order=order, variant=variant, quantity=3)
+    reserve_stock(order, {variant.pk: 3})
+
+    order.status = Order.Status.CANCELED
+    order.save()
+
+    assert _stock(variant) == 10
+    assert order.reservations.get().status == StockReservation.Status.RELEASED
+
+
+def test_only_the_expiry_sweep_skips_locked_reservations():
+    order = OrderFactory(status=Order.Status.PENDING)
+    reserve_stock(order, {ProductVariantFactory(stock=10).pk: 1})
+
+    with patch.object(
+        QuerySet, "select_for_update", autospec=True, side_effect=lambda qs, **kw: qs
+    ) as select_for_update:
+        release_reservations(order.reservations.all(), expired_only=True)
+        release_reservations(order.reservations.all())
+
+    assert [call.kwargs for call in select_for_update.call_args_list] == [
+        {"skip_locked": True},
+        {"skip_locked": False},
+    ]
+
+
+def test_cancel_after_expiry_does_not_return_stock_twice():
+    variant = ProductVariantFactory(stock=10)
+    order = OrderFactory(status=Order.Status.PENDING)
+    OrderItemFactory(order=order, variant=variant, quantity=3)
+    reserve_stock(order, {variant.pk: 3})
+    _expire(order)
+    release_expired_reservations()
+
+    order.status = Order.Status.CANCELED
+    order.save()
+
+    assert _stock(variant) == 10
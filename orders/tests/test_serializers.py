@@ -1,12 +1,20 @@
+from decimal import Decimal
 from unittest.mock import patch
 
 import pytest
+from django.db import connection, transaction
 from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from rest_framework.exceptions import ValidationError
 
 from account.tests.factories import UserFactory, AddressFactory
 from cart.cart import Cart
+from discounts import usage
+from discounts.models import Discount, DiscountRule
+from discounts.services import DiscountService
+from orders.models import Order, StockReservation
 from orders.serializers import OrderCreateSerializer
+from shop.models import ProductVariant
 from shop.tests.factories import ProductVariantFactory
 
 pytestmark = pytest.mark.django_db
@@ -42,6 +50,69 @@ def test_order_create_serializer_valid(mock_request):
     assert serializer.is_valid(raise_exception=True)
 
 
+def test_order_create_serializer_updates_product_stock_summary(mock_request):
+    """
+    Test that placing an order keeps the product's denormalized stock in sync.
+    """
+    request, user, address, cart = mock_request
+    variant = ProductVariantFactory(stock=2)
+    product = variant.product
+    product.variants.exclude(pk=variant.pk).delete()
+    cart.add(variant, quantity=2)
+
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id}, context={"request": request}
+    )
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+
+    product.refresh_from_db()
+    assert product.total_stock == 0
+    assert not product.is_in_stock
+
+
+def test_order_create_serializer_reserves_stock(mock_request):
+    """
+    Test that placing an order holds its stock with an active reservation.
+    """
+    request, user, address, cart = mock_request
+    variant = ProductVariantFactory(stock=5)
+    cart.add(variant, quantity=2)
+
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id}, context={"request": request}
+    )
+    serializer.is_valid(raise_exception=True)
+    order = serializer.save()
+
+    reservation = order.reservations.get()
+    assert reservation.variant_id == variant.pk
+    assert reservation.quantity == 2
+    assert reservation.status == StockReservation.Status.ACTIVE
+
+
+def test_order_create_serializer_stock_sold_out_before_checkout(mock_request):
+    """
+    Test that checkout fails without side effects if stock ran out after the
+    items were added to the cart.
+    """
+    request, user, address, cart = mock_request
+    variant = ProductVariantFactory(stock=5)
+    cart.add(variant, quantity=2)
+    ProductVariant.objects.filter(pk=variant.pk).update(stock=1)
+
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id}, context={"request": request}
+    )
+    serializer.is_valid(raise_exception=True)
+    with pytest.raises(ValidationError, match="Not enough stock"):
+        serializer.save()
+
+    variant.refresh_from_db()
+    assert variant.stock == 1
+    assert not Order.objects.exists()
+
+
 def test_order_create_serializer_insufficient_stock(mock_request):
     """
     Test that the serializer raises a ValidationError if stock is insufficient.
@@ -116,3 +187,177 @@ def test_order_create_serializer_invalid_discount_code(
     with pytest.raises(ValidationError) as excinfo:
         serializer.is_valid(raise_exception=True)
     assert "discount code is invalid" in str(excinfo.value).lower()
+
+
+def _create_discounts(count, variants):
+    for number in range(count):
+        discount = Discount.objects.create(
+            name=f"Campaign {number}",
+            type=Discount.DISCOUNT_TYPE_FIXED,
+            amount=Decimal(number + 1),
+            valid_from="2000-01-01T00:00:00Z",
+            valid_to="2999-01-01T00:00:00Z",
+            max_usage=100,
+        )
+        rule = DiscountRule.objects.create(discount=discount)
+        rule.variants.add(*variants)
+
+
+def _checkout_queries(request, address):
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id}, context={"request": request}
+    )
+    with CaptureQueriesContext(connection) as queries:
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+    return order, len(queries)
+
+
+def test_order_create_serializer_uses_checkout_snapshot(mock_request):
+    """
+    Test that the discount and totals computed during validation are the ones
+    stored on the order.
+    """
+    request, user, address, cart = mock_request
+    variant = ProductVariantFactory(stock=10, price=Decimal("50.00"))
+    cart.add(variant, quantity=2)
+    _create_discounts(3, [variant])
+
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id}, context={"request": request}
+    )
+    serializer.is_valid(raise_exception=True)
+    assert serializer.checkout.subtotal == Decimal("100.00")
+    assert serializer.checkout.discount_amount == Decimal("3")
+
+    order = serializer.save()
+    assert order.discount == serializer.checkout.discount
+    assert order.subtotal == Decimal("100.00")
+    assert order.tax_amount == Decimal("9.00")
+    assert order.total_payable == Decimal("121.00")
+
+
+def test_order_create_serializer_query_count_ignores_discounts(mock_request):
+    """
+    Test that checkout queries do not grow with the number of discounts.
+    """
+    request, user, address, cart = mock_request
+    variants = [ProductVariantFactory(stock=10) for _ in range(3)]
+    _create_discounts(1, variants)
+    DiscountService.apply_discount(cart, user)  # compiles the discount index
+    for variant in variants:
+        cart.add(variant, quantity=1)
+    _order, few_discounts = _checkout_queries(request, address)
+
+    request.cart = cart = Cart(request)
+    _create_discounts(20, variants)
+    DiscountService.apply_discount(cart, user)
+    for variant in variants:
+        cart.add(variant, quantity=1)
+    order, many_discounts = _checkout_queries(request, address)
+
+    assert order.discount_amount == Decimal("20")
+    assert many_discounts == few_discounts
+
+
+def test_order_create_serializer_refuses_used_up_discount_code(
+    mock_request, django_capture_on_commit_callbacks
+):
+    """
+    Test that a discount code is refused once its uses are all reserved, and
+    that canceling an order gives its use back.
+    """
+    request, user, address, cart = mock_request
+    variant = ProductVariantFactory(stock=10)
+    Discount.objects.create(
+        name="One use",
+        code="ONCE",
+        type=Discount.DISCOUNT_TYPE_FIXED,
+        amount=Decimal("1"),
+        valid_from="2000-01-01T00:00:00Z",
+        valid_to="2999-01-01T00:00:00Z",
+        max_usage=1,
+    )
+    other_request = RequestFactory().post("/fake-url/")
+    other_request.user = UserFactory()
+    other_request.session = {}
+    other_request.cart = Cart(other_request)
+    other_address = AddressFactory(user=other_request.user)
+
+    cart.add(variant, quantity=1)
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id, "discount_code": "ONCE"},
+        context={"request": request},
+    )
+    serializer.is_valid(raise_exception=True)
+    order = serializer.save()
+
+    # Both checkouts passed validation; only one use was left.
+    other_request.cart.add(variant, quantity=1)
+    other = OrderCreateSerializer(
+        data={"address_id": other_address.id, "discount_code": "ONCE"},
+        context={"request": other_request},
+    )
+    other.is_valid(raise_exception=True)
+    with pytest.raises(ValidationError, match="usage limit"):
+        other.save()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        order.status = Order.Status.CANCELED
+        order.save()
+    other = OrderCreateSerializer(
+        data={"address_id": other_address.id, "discount_code": "ONCE"},
+        context={"request": other_request},
+    )
+    other.is_valid(raise_exception=True)
+    assert other.save().discount.code == "ONCE"
+
+
+def test_order_create_serializer_drops_used_up_automatic_discount(mock_request):
+    """
+    Test that checkout goes on without an automatic discount that ran out.
+    """
+    request, user, address, cart = mock_request
+    variant = ProductVariantFactory(stock=10)
+    _create_discounts(1, [variant])
+    discount = Discount.objects.get()
+    usage.reserve(discount, None)  # takes the discount's only use
+    Discount.objects.filter(pk=discount.pk).update(max_usage=1)
+
+    cart.add(variant, quantity=1)
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id}, context={"request": request}
+    )
+    serializer.is_valid(raise_exception=True)
+    order = serializer.save()
+
+    assert order.discount is None
+    assert order.discount_amount == Decimal("0.00")
+
+
+def test_order_create_serializer_gives_back_use_of_failed_checkout(mock_request):
+    """
+    Test that a checkout that fails, including one nested in a transaction
+    that could still be rolled back, does not keep its discount use.
+    """
+    request, user, address, cart = mock_request
+    variant = ProductVariantFactory(stock=5)
+    _create_discounts(1, [variant])
+    discount = Discount.objects.get()
+    Discount.objects.filter(pk=discount.pk).update(max_usage=1)
+    cart.add(variant, quantity=2)
+
+    ProductVariant.objects.filter(pk=variant.pk).update(stock=1)
+    serializer = OrderCreateSerializer(
+        data={"address_id": address.id}, context={"request": request}
+    )
+    serializer.is_valid(raise_exception=True)
+    with pytest.raises(ValidationError, match="Not enough stock"):
+        serializer.save()
+
+    ProductVariant.objects.filter(pk=variant.pk).update(stock=5)
+    with pytest.raises(RuntimeError, match="durable"):
+        with transaction.atomic():
+            serializer.save()
+
+    assert serializer.save().discount == discount
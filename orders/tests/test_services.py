@@ -7,6 +7,7 @@ from rest_framework.exceptions import ValidationError
 
 from account.tests.factories import AddressFactory, UserFactory
 from cart.cart import Cart
+from discounts.models import Discount
 from orders import services
 from orders.models import Order
 from orders.tests.factories import OrderFactory
@@ -87,12 +88,11 @@ def test_create_order_success(mock_send_email):
     mock_send_email.assert_called_once_with(order.order_id)
 
 
-@patch("orders.serializers.DiscountService")
 @patch("orders.services.send_order_confirmation_email.delay")
-def test_create_order_with_valid_discount_code(mock_send_email, mock_discount_service):
+def test_create_order_with_valid_discount_code(mock_send_email):
     user = UserFactory()
     address = AddressFactory(user=user)
-    variant = ProductVariantFactory(stock=20)
+    variant = ProductVariantFactory(stock=20, price=Decimal("100.00"))
 
     factory = RequestFactory()
     request = factory.post("/fake-url/")
@@ -102,20 +102,22 @@ def test_create_order_with_valid_discount_code(mock_send_email, mock_discount_se
     cart.add(variant, quantity=1)
     request.cart = cart
 
-    mock_discount_service.get_applicable_discounts.return_value.exists.return_value = (
-        True
+    discount = Discount.objects.create(
+        name="Save ten",
+        code="SAVE10",
+        type=Discount.DISCOUNT_TYPE_PERCENTAGE,
+        amount=Decimal("10"),
+        valid_from="2000-01-01T00:00:00Z",
+        valid_to="2999-01-01T00:00:00Z",
     )
-    mock_discount_service.apply_discount.return_value = (Decimal("0.00"), None)
 
     validated_data = {"address_id": address.id, "discount_code": "SAVE10"}
 
     order = services.create_order(request=request, validated_data=validated_data)
 
-    assert order.discount_amount == Decimal("0.00")
-    mock_discount_service.get_applicable_discounts.assert_called_once_with(
-        cart, user, discount_code="SAVE10"
-    )
-    mock_discount_service.apply_discount.assert_called_once_with(cart, user, "SAVE10")
+    assert order.discount == discount
+    assert order.discount_amount == Decimal("10.00")
+    assert order.subtotal == Decimal("100.00")
     mock_send_email.assert_called_once_with(order.order_id)
 
 
@@ -3,11 +3,23 @@ from unittest.mock import patch
 
 import pytest
 from celery.exceptions import Retry
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
+from common.utils.cache import acquire_lock, release_lock
+from discounts import usage
+from discounts.models import Discount
 from orders.models import Order
-from orders.tasks import cancel_pending_orders, send_order_confirmation_email
-from orders.tests.factories import OrderFactory
+from orders.reservations import reserve_stock
+from orders.tasks import (
+    CANCEL_PENDING_ORDERS_LOCK_KEY,
+    cancel_pending_orders,
+    send_order_confirmation_email,
+)
+from orders.tests.factories import OrderFactory, OrderItemFactory
+from shop.tests.factories import ProductVariantFactory
 
 pytestmark = pytest.mark.django_db
 
@@ -54,3 +66,84 @@ def test_cancel_pending_orders_cancels_stale_orders():
 
     assert stale_order.status == Order.Status.CANCELED
     assert fresh_order.status == Order.Status.PENDING
+
+
+def _stale_order(**kwargs):
+    order = OrderFactory(status=Order.Status.PENDING, **kwargs)
+    Order.objects.filter(pk=order.pk).update(
+        order_date=timezone.now() - timedelta(hours=1)
+    )
+    return order
+
+
+def test_cancel_pending_orders_returns_stock_in_bulk(
+    django_capture_on_commit_callbacks,
+):
+    variant = ProductVariantFactory(stock=10)
+    reserved = _stale_order()
+    OrderItemFactory(order=reserved, variant=variant, quantity=3)
+    reserve_stock(reserved, {variant.pk: 3})
+    # Orders placed before stock reservations give back their items.
+    legacy = _stale_order()
+    OrderItemFactory(order=legacy, variant=variant, quantity=2)
+    discount = Discount.objects.create(
+        name="Once",
+        type=Discount.DISCOUNT_TYPE_FIXED,
+        amount=1,
+        valid_from=timezone.now(),
+        valid_to=timezone.now() + timedelta(days=1),
+        max_usage=1,
+    )
+    usage.reserve(discount, legacy.user_id)
+    Order.objects.filter(pk=legacy.pk).update(discount=discount)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert cancel_pending_orders() == 2
+
+    variant.refresh_from_db()
+    assert variant.stock == 12
+    assert set(Order.objects.values_list("status", flat=True)) == {
+        Order.Status.CANCELED
+    }
+    assert reserved.history.first().status == Order.Status.CANCELED
+    assert reserved.history.first().history_change_reason == "Not paid in time"
+    # The discount use of the canceled order is free again.
+    usage.reserve(discount, legacy.user_id)
+
+
+def test_cancel_pending_orders_query_count_does_not_grow_with_orders():
+    def run(orders):
+        for _ in range(orders):
+            _stale_order()
+        with CaptureQueriesContext(connection) as queries:
+            assert cancel_pending_orders() == orders
+        return len(queries)
+
+    assert run(2) == run(20)
+
+
+def test_cancel_pending_orders_skips_overlapping_runs():
+    order = _stale_order()
+    acquire_lock(CANCEL_PENDING_ORDERS_LOCK_KEY)
+    try:
+        assert cancel_pending_orders() == 0
+    finally:
+        release_lock(CANCEL_PENDING_ORDERS_LOCK_KEY)
+
+    order.refresh_from_db()
+    assert order.status == Order.Status.PENDING
+
+
+def test_cancel_pending_orders_keeps_lock_taken_over_by_another_run():
+    lock_key = f"{CANCEL_PENDING_ORDERS_LOCK_KEY}:lock"
+
+    def take_over(placed_before):
+        # The lock expired during the run and another run took it.
+        cache.set(lock_key, "other-run")
+        return 0
+
+    with patch("orders.tasks.cancel_stale_orders", side_effect=take_over):
+        cancel_pending_orders()
+
+    assert cache.get(lock_key) == "other-run"
+    cache.delete(lock_key)
@@ -2,8 +2,8 @@ import requests
 from abc import ABC, abstractmethod
 from django.conf import settings
 import logging
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from common.utils.http import get_client
 
 logger = logging.getLogger(__name__)
 
@@ -27,19 +27,9 @@ class ZibalGatewayError(Exception):
 class ZibalGateway(PaymentGateway):
     def __init__(self):
         self.merchant_id = getattr(settings, "ZIBAL_MERCHANT_ID", None)
-        self.api_url = "https://gateway.zibal.ir/v1"
-
-        # Configure retry mechanism
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "POST", "OPTIONS"],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session = requests.Session()
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        self.api_url = settings.ZIBAL_API_URL
+        # Shared keep-alive session, with the retry policy of HTTP_CLIENTS["zibal"].
+        self.session = get_client("zibal")
 
     def create_payment_request(self, amount, order_id, callback_url):
         headers = {"Content-Type": "application/json"}
@@ -52,7 +42,7 @@ class ZibalGateway(PaymentGateway):
         logger.info(f"Creating Zibal payment request for order {order_id}: {data}")
         try:
             response = self.session.post(
-                f"{self.api_url}/request", json=data, headers=headers, timeout=5
+                f"{self.api_url}/request", json=data, headers=headers
             )
             response.raise_for_status()
             response_data = response.json()
@@ -83,7 +73,7 @@ class ZibalGateway(PaymentGateway):
         )
         try:
             response = self.session.post(
-                f"{self.api_url}/verify", json=data, headers=headers, timeout=5
+                f"{self.api_url}/verify", json=data, headers=headers
             )
             response.raise_for_status()
             response_data = response.json()
@@ -35,6 +35,10 @@ class PaymentTransaction(models.Model):
     message = models.TextField(blank=True)
     raw_payload = models.JSONField(default=dict, blank=True)
     gateway_response = models.JSONField(default=dict, blank=True)
+    # Identifies one gateway call, so its outcome is recorded exactly once.
+    idempotency_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True
+    )
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
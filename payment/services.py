@@ -1,92 +1,149 @@
+"""
+Payment initiation and verification.
+
+Both flows call the Zibal gateway over HTTP, which can take several seconds
+with retries, so neither holds a database transaction or row lock while
+waiting for it. Each runs in three steps:
+
+1. Prepare: a short transaction locks the order, validates it and records a
+   ``RECEIVED`` ``PaymentTransaction`` carrying a fresh idempotency key.
+2. Call the gateway with no transaction open.
+3. Record the outcome in a second short transaction. Only the ``RECEIVED``
+   row with that idempotency key is finalized, so an outcome is never
+   recorded twice.
+
+While a gateway call for an order (or trackId) is pending, another request
+for it is refused for up to ``PAYMENT_GATEWAY_IN_FLIGHT_TIMEOUT`` seconds
+instead of reaching the gateway a second time.
+
+With ``PAYMENT_ASYNC_VERIFICATION`` enabled, gateway callbacks are only
+stored as ``RECEIVED`` ``CALLBACK`` transactions by ``enqueue_verification``
+and verified by the ``payment.tasks.verify_payment_callback`` worker.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import transaction
 from django.urls import reverse
-from orders.models import Order
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from orders.reservations import InsufficientStock, commit_reservations, ensure_reserved
+from shop.models import ProductVariant
 from .gateways import ZibalGateway, ZibalGatewayError
 from shipping.tasks import create_postex_shipment_task
+from shop.tasks import record_order_purchases
 from .models import PaymentTransaction
+from .tasks import verify_payment_callback
 
+ALREADY_VERIFIED_MESSAGE = "This payment has already been successfully verified."
+VERIFICATION_IN_PROGRESS_MESSAGE = "Payment verification is already in progress."
 
-def process_payment(request, order_id):
-    try:
-        with transaction.atomic():
-            # Lock the order to prevent race conditions during payment processing.
-            order = Order.objects.select_for_update().get(
-                order_id=order_id, user=request.user
-            )
 
-            if order.payment_status == Order.PaymentStatus.SUCCESS:
-                raise ValueError("This order has already been paid.")
-
-            # Atomically update item prices and check stock before any calculations.
-            # Lock the related products to prevent overselling race conditions.
-            for item in order.items.select_related(
-                "variant__product"
-            ).select_for_update(of=("self", "variant")):
-                if item.variant.stock < item.quantity:
-                    raise ValueError(
-                        f"Insufficient stock for product: {item.variant.product.name}"
-                    )
-                # Snapshot the current price, in case it has changed since the order was created.
-                if item.price != item.variant.price:
-                    item.price = item.variant.price
-                    item.save(update_fields=["price"])
-
-            # Re-validate coupon with the most up-to-date prices.
-            if order.coupon:
-                if not order.coupon.is_valid():
-                    raise ValueError(
-                        f"The coupon '{order.coupon.code}' is no longer valid."
-                    )
-
-                if order.coupon.usage_count >= order.coupon.max_usage:
-                    raise ValueError(
-                        f"The coupon '{order.coupon.code}' has reached its usage limit."
-                    )
-
-                subtotal = order.get_total_cost_before_discount()
-                if subtotal < order.coupon.min_purchase_amount:
-                    raise ValueError(
-                        f"Order subtotal does not meet the minimum purchase amount of "
-                        f"{order.coupon.min_purchase_amount} for coupon '{order.coupon.code}'."
-                    )
-
-            # Recalculate all order totals based on the latest data.
-            order.calculate_total_payable()
-            order.save()
-
-            # The callback URL is now the verify URL, as Zibal will redirect the user here.
-            callback_url = request.build_absolute_uri(reverse("payment:verify"))
-            gateway = ZibalGateway()
-
-            # Assuming total_payable is in Toman, converting to Rials for Zibal
-            amount_in_rials = int(order.total_payable * 100)
-            response = gateway.create_payment_request(
-                amount=amount_in_rials,
-                order_id=str(order.order_id),
-                callback_url=callback_url,
-            )
+def _in_flight(event_type, **lookup):
+    """
+    Returns whether a gateway call of ``event_type`` matching ``lookup`` was
+    started recently and has no recorded outcome yet.
+    """
+    started_after = timezone.now() - timedelta(
+        seconds=settings.PAYMENT_GATEWAY_IN_FLIGHT_TIMEOUT
+    )
+    return PaymentTransaction.objects.filter(
+        event_type=event_type,
+        status=PaymentTransaction.Status.RECEIVED,
+        created_at__gte=started_after,
+        **lookup,
+    ).exists()
 
-            order.payment_gateway = "zibal"
-            order.payment_track_id = response.get("trackId")
-            order.save(update_fields=["payment_gateway", "payment_track_id", "updated"])
 
-            PaymentTransaction.objects.create(
-                order=order,
-                track_id=order.payment_track_id,
-                event_type=PaymentTransaction.EventType.INITIATE,
-                status=PaymentTransaction.Status.PROCESSED,
-                amount=amount_in_rials,
-                result_code=str(response.get("result")),
-                message="Payment request created successfully.",
-                raw_payload={"order_id": str(order.order_id)},
-                gateway_response=response,
+def _finish(transaction_log, **fields):
+    """
+    Records the outcome of the gateway call started by ``transaction_log``.
+    Returns False, without writing anything, if it was already recorded.
+    """
+    fields["updated_at"] = timezone.now()
+    updated = PaymentTransaction.objects.filter(
+        idempotency_key=transaction_log.idempotency_key,
+        status=PaymentTransaction.Status.RECEIVED,
+    ).update(**fields)
+    for name, value in fields.items():
+        setattr(transaction_log, name, value)
+    return bool(updated)
+
+
+def _prepare_payment(request, order_id):
+    with transaction.atomic():
+        # Lock the order to prevent race conditions during payment processing.
+        order = Order.objects.select_for_update().get(
+            order_id=order_id, user=request.user
+        )
+
+        if order.payment_status == Order.PaymentStatus.SUCCESS:
+            raise ValueError("This order has already been paid.")
+
+        if _in_flight(PaymentTransaction.EventType.INITIATE, order=order):
+            raise ValueError("A payment request for this order is already in progress.")
+
+        # Make sure the order's stock is still reserved (re-reserving it if
+        # the reservation expired) rather than locking the variant rows.
+        try:
+            ensure_reserved(order)
+        except InsufficientStock as e:
+            variant = ProductVariant.objects.select_related("product").get(
+                pk=e.variant_id
             )
-            payment_url = f"https://gateway.zibal.ir/start/{response.get('trackId')}"
-            return payment_url
+            raise ValueError(f"Insufficient stock for product: {variant.product.name}")
+
+        # Snapshot the current price, in case it has changed since the order was created.
+        changed_items = []
+        for item in order.items.select_related("variant"):
+            if item.price != item.variant.price:
+                item.price = item.variant.price
+                changed_items.append(item)
+        OrderItem.objects.bulk_update(changed_items, ["price"])
 
+        # Re-validate coupon with the most up-to-date prices.
+        if order.coupon:
+            if not order.coupon.is_valid():
+                raise ValueError(
+                    f"The coupon '{order.coupon.code}' is no longer valid."
+                )
+
+            if order.coupon.usage_count >= order.coupon.max_usage:
+                raise ValueError(
+                    f"The coupon '{order.coupon.code}' has reached its usage limit."
+                )
+
+            subtotal = order.get_total_cost_before_discount()
+            if subtotal < order.coupon.min_purchase_amount:
+                raise ValueError(
+                    f"Order subtotal does not meet the minimum purchase amount of "
+                    f"{order.coupon.min_purchase_amount} for coupon '{order.coupon.code}'."
+                )
+
+        # Recalculate all order totals based on the latest data.
+        order.calculate_total_payable()
+        order.save()
+
+        # Assuming total_payable is in Toman, converting to Rials for Zibal
+        transaction_log = PaymentTransaction.objects.create(
+            order=order,
+            event_type=PaymentTransaction.EventType.INITIATE,
+            status=PaymentTransaction.Status.RECEIVED,
+            amount=int(order.total_payable * 100),
+            raw_payload={"order_id": str(order.order_id)},
+            idempotency_key=uuid.uuid4().hex,
+        )
+    return order, transaction_log
+
+
+def process_payment(request, order_id):
+    try:
+        order, transaction_log = _prepare_payment(request, order_id)
     except Order.DoesNotExist:
         raise ValueError("Order not found or you do not have permission to access it.")
-    except (ZibalGatewayError, ValueError) as e:
+    except ValueError as e:
         # Try to log the failure, but don't fail if the order can't be found.
         order = Order.objects.filter(order_id=order_id, user=request.user).first()
         if order:
@@ -101,6 +158,155 @@ def process_payment(request, order_id):
         # Re-raise the original exception to be handled by the view.
         raise e
 
+    # The callback URL is now the verify URL, as Zibal will redirect the user here.
+    callback_url = request.build_absolute_uri(reverse("payment:verify"))
+
+    # No transaction is open here: the order row is not locked while the
+    # gateway is slow to answer.
+    try:
+        response = ZibalGateway().create_payment_request(
+            amount=transaction_log.amount,
+            order_id=str(order.order_id),
+            callback_url=callback_url,
+        )
+    except ZibalGatewayError as e:
+        _finish(
+            transaction_log,
+            status=PaymentTransaction.Status.FAILED,
+            message=f"Failed to create payment request: {e}",
+        )
+        raise e
+
+    track_id = response.get("trackId")
+    with transaction.atomic():
+        if _finish(
+            transaction_log,
+            track_id=track_id,
+            status=PaymentTransaction.Status.PROCESSED,
+            result_code=str(response.get("result")),
+            message="Payment request created successfully.",
+            gateway_response=response,
+        ):
+            # A payment verified in the meantime keeps its trackId.
+            Order.objects.filter(pk=order.pk).exclude(
+                payment_status=Order.PaymentStatus.SUCCESS
+            ).update(
+                payment_gateway="zibal",
+                payment_track_id=track_id,
+                updated=timezone.now(),
+            )
+    return f"https://gateway.zibal.ir/start/{track_id}"
+
+
+def _prepare_verification(track_id, signature, ip_address, raw_payload):
+    """
+    Returns the order and the ``RECEIVED`` log of a new verification, plus
+    the message to answer with instead when there is nothing to verify.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(payment_track_id=track_id)
+
+        # Idempotency Check: If already successful, do nothing more.
+        if order.payment_status == Order.PaymentStatus.SUCCESS:
+            PaymentTransaction.objects.create(
+                order=order,
+                track_id=track_id,
+                event_type=PaymentTransaction.EventType.VERIFY,
+                status=PaymentTransaction.Status.SKIPPED,
+                ip_address=ip_address,
+                signature=signature or "",
+                raw_payload=raw_payload or {},
+                message="Order already marked as successful.",
+            )
+            return order, None, ALREADY_VERIFIED_MESSAGE
+
+        if _in_flight(PaymentTransaction.EventType.VERIFY, track_id=track_id):
+            return order, None, VERIFICATION_IN_PROGRESS_MESSAGE
+
+        transaction_log = PaymentTransaction.objects.create(
+            order=order,
+            track_id=track_id,
+            event_type=PaymentTransaction.EventType.VERIFY,
+            status=PaymentTransaction.Status.RECEIVED,
+            ip_address=ip_address,
+            signature=signature or "",
+            raw_payload=raw_payload or {},
+            idempotency_key=uuid.uuid4().hex,
+        )
+    return order, transaction_log, None
+
+
+def _fail_verification(order, transaction_log, message, **fields):
+    order.payment_status = Order.PaymentStatus.FAILED
+    order.save(update_fields=["payment_status", "updated"])
+    _finish(
+        transaction_log,
+        status=PaymentTransaction.Status.FAILED,
+        message=message,
+        **fields,
+    )
+    return ValueError(message)
+
+
+def _record_verification(order, transaction_log, response):
+    """
+    Applies the gateway's verification ``response`` to the locked ``order``.
+    Returns the error to raise, or None if the payment was verified.
+    """
+    result = response.get("result")
+    fields = {"gateway_response": response, "result_code": str(result)}
+
+    # A successful verification can have result 100 (new) or 201 (already verified by Zibal).
+    if result not in [100, 201]:
+        # Verification failed at the gateway.
+        error_message = response.get("message", "Unknown error.")
+        return _fail_verification(
+            order,
+            transaction_log,
+            f"Payment verification failed: {error_message} (Result code: {result})",
+            **fields,
+        )
+
+    # Integrity Check: Verify amount and orderId match the gateway's response.
+    amount_from_gateway = response.get("amount")
+    expected_amount = int(
+        order.total_payable * 100
+    )  # Assuming Toman to Rials conversion
+    if amount_from_gateway != expected_amount:
+        return _fail_verification(
+            order,
+            transaction_log,
+            f"Amount mismatch. Expected {expected_amount}, but gateway reported {amount_from_gateway}.",
+            amount=amount_from_gateway,
+            **fields,
+        )
+
+    order_id_from_gateway = response.get("orderId")
+    if order_id_from_gateway != str(order.order_id):
+        return _fail_verification(
+            order,
+            transaction_log,
+            f"OrderId mismatch. Expected {order.order_id}, but gateway reported {order_id_from_gateway}.",
+            **fields,
+        )
+
+    # All checks passed, update the order.
+    order.payment_status = Order.PaymentStatus.SUCCESS
+    order.payment_ref_id = response.get("refNumber", "")
+    order.status = Order.Status.PAID
+    order.save(update_fields=["payment_status", "payment_ref_id", "status", "updated"])
+    commit_reservations(order)
+
+    _finish(
+        transaction_log,
+        status=PaymentTransaction.Status.PROCESSED,
+        amount=amount_from_gateway,
+        ref_id=order.payment_ref_id,
+        message="Payment verified successfully.",
+        **fields,
+    )
+    return None
+
 
 def verify_payment(track_id, signature=None, ip_address=None, raw_payload=None):
     # Idempotency Check: Prevent re-processing successful verifications.
@@ -109,132 +315,101 @@ def verify_payment(track_id, signature=None, ip_address=None, raw_payload=None):
         event_type=PaymentTransaction.EventType.VERIFY,
         status=PaymentTransaction.Status.PROCESSED,
     ).exists():
-        return "This payment has already been successfully verified."
+        return ALREADY_VERIFIED_MESSAGE
+
+    # Order.DoesNotExist is caught by the view and results in a 404.
+    order, transaction_log, message = _prepare_verification(
+        track_id, signature, ip_address, raw_payload
+    )
+    if message:
+        return message
 
+    # No transaction is open while the gateway verifies the payment.
     try:
-        error = None
-        with transaction.atomic():
-            order = Order.objects.select_for_update().get(payment_track_id=track_id)
+        response = ZibalGateway().verify_payment(track_id)
+    except ZibalGatewayError as e:
+        _finish(
+            transaction_log,
+            status=PaymentTransaction.Status.FAILED,
+            message=f"Payment verification failed: {e}",
+        )
+        raise
 
-            transaction_log = PaymentTransaction.objects.create(
-                order=order,
-                track_id=track_id,
-                event_type=PaymentTransaction.EventType.VERIFY,
-                status=PaymentTransaction.Status.RECEIVED,
-                ip_address=ip_address,
-                signature=signature or "",
-                raw_payload=raw_payload or {},
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.payment_status == Order.PaymentStatus.SUCCESS:
+            # Another verification of this payment finished first.
+            _finish(
+                transaction_log,
+                status=PaymentTransaction.Status.SKIPPED,
+                message="Order already marked as successful.",
+                gateway_response=response,
             )
+            return ALREADY_VERIFIED_MESSAGE
+        error = _record_verification(order, transaction_log, response)
 
-            # Idempotency Check: If already successful, do nothing more.
-            if order.payment_status == Order.PaymentStatus.SUCCESS:
-                transaction_log.status = PaymentTransaction.Status.SKIPPED
-                transaction_log.message = "Order already marked as successful."
-                transaction_log.save(update_fields=["status", "message", "updated_at"])
-                return "This payment has already been successfully verified."
-
-            gateway = ZibalGateway()
-            response = gateway.verify_payment(track_id)
-            result = response.get("result")
-
-            transaction_log.gateway_response = response
-            transaction_log.result_code = str(result)
-
-            # A successful verification can have result 100 (new) or 201 (already verified by Zibal).
-            if result in [100, 201]:
-                # Integrity Check: Verify amount and orderId match the gateway's response.
-                amount_from_gateway = response.get("amount")
-                expected_amount = int(
-                    order.total_payable * 100
-                )  # Assuming Toman to Rials conversion
-
-                if amount_from_gateway != expected_amount:
-                    order.payment_status = Order.PaymentStatus.FAILED
-                    order.save(update_fields=["payment_status", "updated"])
-                    transaction_log.status = PaymentTransaction.Status.FAILED
-                    transaction_log.amount = amount_from_gateway
-                    transaction_log.message = f"Amount mismatch. Expected {expected_amount}, but gateway reported {amount_from_gateway}."
-                    transaction_log.save(
-                        update_fields=[
-                            "status",
-                            "amount",
-                            "message",
-                            "gateway_response",
-                            "result_code",
-                            "updated_at",
-                        ]
-                    )
-                    error = ValueError(transaction_log.message)
-
-                order_id_from_gateway = response.get("orderId")
-                if error is None and order_id_from_gateway != str(order.order_id):
-                    order.payment_status = Order.PaymentStatus.FAILED
-                    order.save(update_fields=["payment_status", "updated"])
-                    transaction_log.status = PaymentTransaction.Status.FAILED
-                    transaction_log.message = f"OrderId mismatch. Expected {order.order_id}, but gateway reported {order_id_from_gateway}."
-                    transaction_log.save(
-                        update_fields=[
-                            "status",
-                            "message",
-                            "gateway_response",
-                            "result_code",
-                            "updated_at",
-                        ]
-                    )
-                    error = ValueError(transaction_log.message)
-
-                if error is None:
-                    # All checks passed, update the order.
-                    order.payment_status = Order.PaymentStatus.SUCCESS
-                    order.payment_ref_id = response.get("refNumber", "")
-                    order.status = Order.Status.PAID
-                    order.save(
-                        update_fields=[
-                            "payment_status",
-                            "payment_ref_id",
-                            "status",
-                            "updated",
-                        ]
-                    )
-
-                    transaction_log.status = PaymentTransaction.Status.PROCESSED
-                    transaction_log.amount = amount_from_gateway
-                    transaction_log.ref_id = order.payment_ref_id
-                    transaction_log.message = "Payment verified successfully."
-                    transaction_log.save(
-                        update_fields=[
-                            "status",
-                            "amount",
-                            "ref_id",
-                            "message",
-                            "gateway_response",
-                            "result_code",
-                            "updated_at",
-                        ]
-                    )
-
-                    # Trigger asynchronous post-payment tasks.
-                    create_postex_shipment_task.delay(order.order_id)
-                    return "Payment verified successfully. Shipment creation is in progress."
-            else:
-                # Verification failed at the gateway.
-                order.payment_status = Order.PaymentStatus.FAILED
-                order.save(update_fields=["payment_status", "updated"])
-                error_message = response.get("message", "Unknown error.")
-                transaction_log.status = PaymentTransaction.Status.FAILED
-                transaction_log.message = f"Payment verification failed: {error_message} (Result code: {result})"
-                transaction_log.save(
-                    update_fields=[
-                        "status",
-                        "message",
-                        "gateway_response",
-                        "result_code",
-                        "updated_at",
-                    ]
-                )
-                error = ValueError(transaction_log.message)
-        if error:
-            raise error
-    except Order.DoesNotExist:
-        # This will be caught by the view and result in a 404.
-        raise
+    if error:
+        raise error
+
+    # Trigger asynchronous post-payment tasks.
+    create_postex_shipment_task.delay(order.order_id)
+    record_order_purchases.delay(str(order.order_id))
+    return "Payment verified successfully. Shipment creation is in progress."
+
+
+def enqueue_verification(track_id, signature=None, ip_address=None, raw_payload=None):
+    """
+    Stores a gateway callback as a ``RECEIVED`` transaction and queues its
+    verification, without calling the gateway or locking the order.
+    """
+    order_id = (
+        Order.objects.filter(payment_track_id=track_id)
+        .values_list("order_id", flat=True)
+        .first()
+    )
+    if order_id is None:
+        raise Order.DoesNotExist
+    callback = PaymentTransaction.objects.create(
+        order_id=order_id,
+        track_id=track_id,
+        event_type=PaymentTransaction.EventType.CALLBACK,
+        status=PaymentTransaction.Status.RECEIVED,
+        ip_address=ip_address,
+        signature=signature or "",
+        raw_payload=raw_payload or {},
+        message="Callback queued for verification.",
+    )
+    transaction.on_commit(lambda: verify_payment_callback.delay(track_id))
+    return callback
+
+
+def get_payment_status(track_id, user):
+    """
+    Returns the payment state of ``user``'s order with ``track_id``, or None
+    if there is no such order. Cheap enough to be polled by the result page.
+    """
+    order = (
+        Order.objects.filter(payment_track_id=track_id, user=user)
+        .values("order_id", "status", "payment_status")
+        .first()
+    )
+    if order is None:
+        return None
+    pending = (
+        order["payment_status"] == Order.PaymentStatus.PENDING
+        and PaymentTransaction.objects.filter(
+            track_id=track_id,
+            event_type__in=[
+                PaymentTransaction.EventType.CALLBACK,
+                PaymentTransaction.EventType.VERIFY,
+            ],
+            status=PaymentTransaction.Status.RECEIVED,
+        ).exists()
+    )
+    return {
+        "track_id": track_id,
+        "order_id": order["order_id"],
+        "order_status": order["status"],
+        "payment_status": order["payment_status"],
+        "verification_pending": pending,
+    }
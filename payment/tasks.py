@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.utils import timezone
+
+from common.utils.cache import acquire_lock, release_lock
+from orders.models import Order
+
+from .gateways import ZibalGatewayError
+from .models import PaymentTransaction
+
+logger = get_task_logger(__name__)
+
+VERIFY_LOCK_KEY = "payment:verify:{}"
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def verify_payment_callback(self, track_id):
+    """
+    Verifies the queued callbacks of ``track_id`` with the gateway. Only one
+    worker verifies a given trackId at a time; duplicate callbacks of it are
+    settled by the same verification.
+    """
+    # Imported here because payment.services queues this task.
+    from . import services
+
+    lock_key = VERIFY_LOCK_KEY.format(track_id)
+    if not acquire_lock(lock_key, timeout=settings.PAYMENT_GATEWAY_IN_FLIGHT_TIMEOUT):
+        logger.info(f"Verification of trackId {track_id} is already running.")
+        return None
+
+    try:
+        callbacks = PaymentTransaction.objects.filter(
+            track_id=track_id,
+            event_type=PaymentTransaction.EventType.CALLBACK,
+            status=PaymentTransaction.Status.RECEIVED,
+        )
+        callback = callbacks.order_by("-created_at").first()
+        if callback is None:
+            return None
+
+        try:
+            message = services.verify_payment(
+                track_id,
+                signature=callback.signature,
+                ip_address=callback.ip_address,
+                raw_payload=callback.raw_payload,
+            )
+            if message == services.VERIFICATION_IN_PROGRESS_MESSAGE:
+                # Another verification of the trackId has not finished: the
+                # callbacks stay RECEIVED and are checked again later.
+                logger.info(f"Verification of trackId {track_id} is in progress.")
+                raise self.retry()
+            outcome = PaymentTransaction.Status.PROCESSED
+        except ZibalGatewayError as e:
+            # The callbacks stay RECEIVED, so the verification is retried.
+            logger.warning(f"Gateway error verifying trackId {track_id}: {e}")
+            raise self.retry(exc=e)
+        except Order.DoesNotExist:
+            message = "Order not found for provided trackId."
+            outcome = PaymentTransaction.Status.REJECTED
+        except ValueError as e:
+            message = str(e)
+            outcome = PaymentTransaction.Status.FAILED
+
+        callbacks.update(status=outcome, message=message, updated_at=timezone.now())
+        return message
+    finally:
+        release_lock(lock_key)
+
+
+@shared_task
+def requeue_payment_callbacks(max_age_hours=24):
+    """
+    Queues the verification of callbacks still waiting after
+    ``PAYMENT_CALLBACK_RETRY_AFTER`` seconds, e.g. because their task was
+    lost or ran out of retries while the gateway was down.
+    """
+    now = timezone.now()
+    track_ids = (
+        PaymentTransaction.objects.filter(
+            event_type=PaymentTransaction.EventType.CALLBACK,
+            status=PaymentTransaction.Status.RECEIVED,
+            created_at__lt=now
+            - timedelta(seconds=settings.PAYMENT_CALLBACK_RETRY_AFTER),
+            created_at__gte=now - timedelta(hours=max_age_hours),
+        )
+        .order_by("track_id")
+        .values_list("track_id", flat=True)
+        .distinct()
+    )
+    count = 0
+    for track_id in track_ids:
+        verify_payment_callback.delay(track_id)
+        count += 1
+    if count:
+        logger.info(f"Requeued verification of {count} payment callbacks.")
+    return count
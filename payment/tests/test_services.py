@@ -2,6 +2,7 @@ from decimal import Decimal
 from unittest.mock import Mock
 
 import pytest
+from django.db import connection
 from django.test import RequestFactory
 
 from coupons.factories import CouponFactory
@@ -177,6 +178,7 @@ def test_verify_payment_success_updates_order_and_transaction(mocker):
         "payment.services.ZibalGateway.verify_payment", return_value=response_payload
     )
     delay_mock = mocker.patch("payment.services.create_postex_shipment_task.delay")
+    purchases_mock = mocker.patch("payment.services.record_order_purchases.delay")
 
     message = verify_payment(
         order.payment_track_id,
@@ -198,6 +200,7 @@ def test_verify_payment_success_updates_order_and_transaction(mocker):
     assert transaction_log.amount == response_payload["amount"]
     assert transaction_log.ref_id == "ref-999"
     delay_mock.assert_called_once_with(order.order_id)
+    purchases_mock.assert_called_once_with(str(order.order_id))
 
 
 def test_verify_payment_amount_mismatch_fails(mocker):
@@ -302,3 +305,126 @@ def test_verify_payment_idempotent_when_already_verified(mocker):
         ).count()
         == 1
     )
+
+
+def test_process_payment_calls_gateway_outside_transaction(mocker):
+    user = OrderFactory().user
+    order = _create_order_with_item(user)
+    request = _build_request(user)
+    mocker.patch("payment.services.reverse", return_value="/payment/verify/")
+    savepoints = len(connection.savepoint_ids)
+
+    def create_payment_request(**kwargs):
+        # The prepare step is committed and no lock is held on the order.
+        assert len(connection.savepoint_ids) == savepoints
+        transaction_log = PaymentTransaction.objects.get(order=order)
+        assert transaction_log.status == PaymentTransaction.Status.RECEIVED
+        assert transaction_log.idempotency_key
+        return {"trackId": "track-789", "result": 100}
+
+    mocker.patch(
+        "payment.services.ZibalGateway.create_payment_request",
+        side_effect=create_payment_request,
+    )
+
+    payment_url = process_payment(request, order.order_id)
+
+    assert payment_url == "https://gateway.zibal.ir/start/track-789"
+    order.refresh_from_db()
+    assert order.payment_track_id == "track-789"
+    transaction_log = PaymentTransaction.objects.get(order=order)
+    assert transaction_log.status == PaymentTransaction.Status.PROCESSED
+    assert transaction_log.track_id == "track-789"
+
+
+def test_process_payment_refuses_while_request_in_flight(mocker):
+    user = OrderFactory().user
+    order = _create_order_with_item(user)
+    PaymentTransaction.objects.create(
+        order=order,
+        event_type=PaymentTransaction.EventType.INITIATE,
+        status=PaymentTransaction.Status.RECEIVED,
+        idempotency_key="pending",
+    )
+    gateway_mock = mocker.patch("payment.services.ZibalGateway.create_payment_request")
+
+    with pytest.raises(ValueError, match="already in progress"):
+        process_payment(_build_request(user), order.order_id)
+
+    gateway_mock.assert_not_called()
+
+
+def test_verify_payment_calls_gateway_outside_transaction(mocker):
+    order = _create_order_with_item(OrderFactory().user)
+    order.payment_track_id = "track-654"
+    order.save(update_fields=["payment_track_id"])
+    savepoints = len(connection.savepoint_ids)
+
+    def verify(track_id):
+        assert len(connection.savepoint_ids) == savepoints
+        return {
+            "result": 100,
+            "amount": int(order.total_payable * 100),
+            "orderId": str(order.order_id),
+            "refNumber": "ref-1",
+        }
+
+    mocker.patch("payment.services.ZibalGateway.verify_payment", side_effect=verify)
+    mocker.patch("payment.services.create_postex_shipment_task.delay")
+    mocker.patch("payment.services.record_order_purchases.delay")
+
+    message = verify_payment(order.payment_track_id)
+
+    assert "Payment verified successfully" in message
+    order.refresh_from_db()
+    assert order.payment_status == Order.PaymentStatus.SUCCESS
+
+
+def test_verify_payment_gateway_error_logs_failure_and_allows_retry(mocker):
+    order = _create_order_with_item(OrderFactory().user)
+    order.payment_track_id = "track-321"
+    order.save(update_fields=["payment_track_id"])
+    mocker.patch(
+        "payment.services.ZibalGateway.verify_payment",
+        side_effect=ZibalGatewayError("gateway down"),
+    )
+
+    with pytest.raises(ZibalGatewayError, match="gateway down"):
+        verify_payment(order.payment_track_id)
+
+    transaction_log = PaymentTransaction.objects.get(order=order)
+    assert transaction_log.status == PaymentTransaction.Status.FAILED
+    order.refresh_from_db()
+    assert order.payment_status == Order.PaymentStatus.PENDING
+
+    # The failed attempt does not block the next one.
+    with pytest.raises(ZibalGatewayError):
+        verify_payment(order.payment_track_id)
+    assert PaymentTransaction.objects.filter(order=order).count() == 2
+
+
+def test_verify_payment_skips_when_verified_concurrently(mocker):
+    order = _create_order_with_item(OrderFactory().user)
+    order.payment_track_id = "track-987"
+    order.save(update_fields=["payment_track_id"])
+
+    def verify(track_id):
+        # Another verification completes while this one waits on the gateway.
+        Order.objects.filter(pk=order.pk).update(
+            payment_status=Order.PaymentStatus.SUCCESS
+        )
+        return {
+            "result": 201,
+            "amount": int(order.total_payable * 100),
+            "orderId": str(order.order_id),
+        }
+
+    mocker.patch("payment.services.ZibalGateway.verify_payment", side_effect=verify)
+    delay_mock = mocker.patch("payment.services.create_postex_shipment_task.delay")
+
+    message = verify_payment(order.payment_track_id)
+
+    assert "already been successfully verified" in message
+    delay_mock.assert_not_called()
+    transaction_log = PaymentTransaction.objects.get(order=order)
+    assert transaction_log.status == PaymentTransaction.Status.SKIPPED
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+import pytest
+from celery.exceptions import Retry
+from django.core.cache import cache
+from django.utils import timezone
+
+from orders.tests.factories import OrderFactory
+from payment.gateways import ZibalGatewayError
+from payment.models import PaymentTransaction
+from payment.tasks import (
+    VERIFY_LOCK_KEY,
+    requeue_payment_callbacks,
+    verify_payment_callback,
+)
+
+
+pytestmark = pytest.mark.django_db
+
+
+def _queue_callbacks(track_id, count=1, **kwargs):
+    order = OrderFactory()
+    order.payment_track_id = track_id
+    order.save(update_fields=["payment_track_id"])
+    for _ in range(count):
+        PaymentTransaction.objects.create(
+            order=order,
+            track_id=track_id,
+            event_type=PaymentTransaction.EventType.CALLBACK,
+            status=PaymentTransaction.Status.RECEIVED,
+            signature="sig",
+            raw_payload={"trackId": track_id, "success": "1"},
+            **kwargs,
+        )
+    return order
+
+
+def _callback_statuses(track_id):
+    return set(
+        PaymentTransaction.objects.filter(
+            track_id=track_id, event_type=PaymentTransaction.EventType.CALLBACK
+        ).values_list("status", flat=True)
+    )
+
+
+def test_verify_payment_callback_settles_duplicate_callbacks(mocker):
+    _queue_callbacks("track-1", count=2)
+    verify_mock = mocker.patch(
+        "payment.services.verify_payment", return_value="Payment verified."
+    )
+
+    assert verify_payment_callback("track-1") == "Payment verified."
+
+    verify_mock.assert_called_once_with(
+        "track-1",
+        signature="sig",
+        ip_address=None,
+        raw_payload={"trackId": "track-1", "success": "1"},
+    )
+    assert _callback_statuses("track-1") == {PaymentTransaction.Status.PROCESSED}
+
+    # A late duplicate task finds nothing left to verify.
+    assert verify_payment_callback("track-1") is None
+    verify_mock.assert_called_once()
+
+
+def test_verify_payment_callback_records_failed_verification(mocker):
+    _queue_callbacks("track-2")
+    mocker.patch(
+        "payment.services.verify_payment", side_effect=ValueError("Amount mismatch.")
+    )
+
+    verify_payment_callback("track-2")
+
+    callback = PaymentTransaction.objects.get(track_id="track-2")
+    assert callback.status == PaymentTransaction.Status.FAILED
+    assert callback.message == "Amount mismatch."
+
+
+def test_verify_payment_callback_keeps_callbacks_on_gateway_error(mocker):
+    _queue_callbacks("track-3")
+    mocker.patch(
+        "payment.services.verify_payment",
+        side_effect=ZibalGatewayError("gateway down"),
+    )
+
+    with pytest.raises(ZibalGatewayError):
+        verify_payment_callback("track-3")
+
+    assert _callback_statuses("track-3") == {PaymentTransaction.Status.RECEIVED}
+    assert cache.add(f"{VERIFY_LOCK_KEY.format('track-3')}:lock", 1)
+
+
+def test_verify_payment_callback_retries_verification_in_progress(mocker):
+    _queue_callbacks("track-5")
+    mocker.patch(
+        "payment.services.verify_payment",
+        return_value="Payment verification is already in progress.",
+    )
+
+    with pytest.raises(Retry):
+        verify_payment_callback("track-5")
+
+    assert _callback_statuses("track-5") == {PaymentTransaction.Status.RECEIVED}
+
+
+def test_verify_payment_callback_skips_track_id_being_verified(mocker):
+    _queue_callbacks("track-4")
+    verify_mock = mocker.patch("payment.services.verify_payment")
+    cache.add(f"{VERIFY_LOCK_KEY.format('track-4')}:lock", 1)
+
+    assert verify_payment_callback("track-4") is None
+
+    verify_mock.assert_not_called()
+    assert _callback_statuses("track-4") == {PaymentTransaction.Status.RECEIVED}
+
+
+def test_requeue_payment_callbacks_queues_stale_track_ids(mocker):
+    stale = timezone.now() - timedelta(minutes=10)
+    _queue_callbacks("track-stale", count=2, created_at=stale)
+    _queue_callbacks("track-fresh")
+    delay_mock = mocker.patch("payment.tasks.verify_payment_callback.delay")
+
+    assert requeue_payment_callbacks() == 1
+
+    delay_mock.assert_called_once_with("track-stale")
@@ -193,3 +193,76 @@ def test_verify_payment_idempotent_api_callback(api_client, mocker):
         == 1
     )
     delay_mock.assert_called_once_with(order.order_id)
+
+
+def test_verify_payment_async_mode_queues_callback(
+    api_client, mocker, settings, django_capture_on_commit_callbacks
+):
+    settings.PAYMENT_ASYNC_VERIFICATION = True
+    order = OrderFactory()
+    order.payment_track_id = "track-async"
+    order.save(update_fields=["payment_track_id"])
+    payload = {"trackId": order.payment_track_id, "success": "1"}
+    verify_mock = mocker.patch("payment.views.services.verify_payment")
+    task_mock = mocker.patch("payment.services.verify_payment_callback.delay")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.get(
+            reverse("api-v1:payment:verify"),
+            payload,
+            HTTP_X_ZIBAL_SIGNATURE=_signature_for(payload),
+        )
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    verify_mock.assert_not_called()
+    task_mock.assert_called_once_with(order.payment_track_id)
+    callback = PaymentTransaction.objects.get(track_id=order.payment_track_id)
+    assert callback.event_type == PaymentTransaction.EventType.CALLBACK
+    assert callback.status == PaymentTransaction.Status.RECEIVED
+
+
+def test_verify_payment_async_mode_unknown_track_id(api_client, settings):
+    settings.PAYMENT_ASYNC_VERIFICATION = True
+    payload = {"trackId": "missing", "success": "1"}
+
+    response = api_client.get(
+        reverse("api-v1:payment:verify"),
+        payload,
+        HTTP_X_ZIBAL_SIGNATURE=_signature_for(payload),
+    )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_payment_status_reports_pending_verification(api_client):
+    order = OrderFactory()
+    order.payment_track_id = "track-status"
+    order.save(update_fields=["payment_track_id"])
+    PaymentTransaction.objects.create(
+        order=order,
+        track_id=order.payment_track_id,
+        event_type=PaymentTransaction.EventType.CALLBACK,
+        status=PaymentTransaction.Status.RECEIVED,
+    )
+    api_client.force_authenticate(user=order.user)
+
+    response = api_client.get(
+        reverse("api-v1:payment:status", args=[order.payment_track_id])
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["data"]["payment_status"] == "pending"
+    assert response.data["data"]["verification_pending"] is True
+
+
+def test_payment_status_hides_other_users_orders(api_client):
+    order = OrderFactory()
+    order.payment_track_id = "track-private"
+    order.save(update_fields=["payment_track_id"])
+    api_client.force_authenticate(user=UserFactory())
+
+    response = api_client.get(
+        reverse("api-v1:payment:status", args=[order.payment_track_id])
+    )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
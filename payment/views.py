@@ -62,6 +62,9 @@ from .gateways import ZibalGatewayError
         tags=["Payments"],
         responses={
             200: OpenApiResponse(description="Payment verified successfully."),
+            202: OpenApiResponse(
+                description="Callback accepted; verification runs in the background."
+            ),
             400: OpenApiResponse(
                 description="Invalid callback request or verification failed."
             ),
@@ -153,6 +156,20 @@ class PaymentVerifyAPIView(APIView):
             )
 
         try:
+            if settings.PAYMENT_ASYNC_VERIFICATION:
+                services.enqueue_verification(
+                    track_id,
+                    signature=signature,
+                    ip_address=client_ip,
+                    raw_payload=raw_payload,
+                )
+                # The result page polls PaymentStatusAPIView until the worker
+                # has verified the payment.
+                return ApiResponse.success(
+                    data={"track_id": track_id, "verification_pending": True},
+                    message="Payment received. Verification is in progress.",
+                    status_code=status.HTTP_202_ACCEPTED,
+                )
             message = services.verify_payment(
                 track_id,
                 signature=signature,
@@ -183,3 +200,26 @@ class PaymentVerifyAPIView(APIView):
             return ApiResponse.error(
                 message=str(e), status_code=status.HTTP_400_BAD_REQUEST
             )
+
+
+@extend_schema_view(
+    get=extend_schema(
+        operation_id="payment_status",
+        description="Returns the payment status of the current user's order with the given trackId. Polled by the result page while the callback is verified in the background.",
+        tags=["Payments"],
+        responses={
+            200: OpenApiResponse(description="Payment status of the order."),
+            404: OpenApiResponse(description="Order not found for the given trackId."),
+        },
+    )
+)
+class PaymentStatusAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, track_id, *args, **kwargs):
+        payment_status = services.get_payment_status(track_id, request.user)
+        if payment_status is None:
+            return ApiResponse.error(
+                message="Order not found.", status_code=status.HTTP_404_NOT_FOUND
+            )
+        return ApiResponse.success(data=payment_status)
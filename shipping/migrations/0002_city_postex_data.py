@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shipping", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="city",
+            name="postex_data",
+            field=models.JSONField(default=dict),
+        ),
+    ]
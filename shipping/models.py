@@ -1 +1,23 @@
-# Create your models here.
+from django.db import models
+
+
+class City(models.Model):
+    """
+    A Postex destination city, mirrored locally by
+    ``shipping.tasks.refresh_postex_cities`` so the city list is served
+    without calling Postex.
+    """
+
+    code = models.IntegerField(unique=True)
+    name = models.CharField(max_length=100)
+    province = models.CharField(max_length=100, blank=True)
+    # The city as Postex returned it, so the city list keeps Postex's format.
+    postex_data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name_plural = "cities"
+
+    def __str__(self):
+        return self.name
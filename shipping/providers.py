@@ -3,6 +3,8 @@ from abc import ABC, abstractmethod
 from django.conf import settings
 import logging
 
+from common.utils.http import get_client
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,7 +35,8 @@ class PostexShippingProvider(ShippingProvider):
         self.api_key = getattr(settings, "POSTEX_API_KEY", None)
         if not self.api_key:
             raise ValueError("POSTEX_API_KEY is not configured in settings.")
-        self.api_url = "https://api.postex.ir"
+        self.api_url = settings.POSTEX_API_URL
+        self.session = get_client("postex")
 
     def _get_headers(self):
         return {
@@ -118,7 +121,7 @@ class PostexShippingProvider(ShippingProvider):
         )
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 url, json=data, headers=self._get_headers(), timeout=15
             )
             return self._handle_response(response, context)
@@ -132,31 +135,53 @@ class PostexShippingProvider(ShippingProvider):
         logger.info(f"Getting Postex shipment tracking for parcel_no {parcel_no}")
 
         try:
-            response = requests.get(url, headers=self._get_headers(), timeout=10)
+            response = self.session.get(url, headers=self._get_headers(), timeout=10)
             return self._handle_response(response, context)
         except requests.exceptions.RequestException as e:
             logger.error(f"{context}: {e}")
             raise ShippingProviderError(f"{context}: {e}")
 
+    def get_parcel_properties(self, order):
+        """
+        Returns the weight, declared value and bounding dimensions a quote
+        for ``order`` is based on.
+        """
+        items = list(order.items.all())
+        return {
+            "total_weight": int(
+                sum(item.variant.product.weight * item.quantity for item in items)
+            ),
+            "total_value": int(order.total_payable),
+            "length": int(max(item.variant.product.length for item in items)),
+            "width": int(max(item.variant.product.width for item in items)),
+            "height": int(max(item.variant.product.height for item in items)),
+        }
+
     def get_shipping_quote(self, order):
-        total_weight = int(
-            sum(
-                item.variant.product.weight * item.quantity
-                for item in order.items.all()
-            )
+        return self.get_quote(
+            order.address.city_code,
+            context=f"order {order.order_id}",
+            **self.get_parcel_properties(order),
         )
-        max_length = max(item.variant.product.length for item in order.items.all())
-        max_width = max(item.variant.product.width for item in order.items.all())
-        max_height = max(item.variant.product.height for item in order.items.all())
 
+    def get_quote(
+        self,
+        to_city_code,
+        total_weight,
+        total_value,
+        length,
+        width,
+        height,
+        context="parcel",
+    ):
         parcels = [
             {
-                "to_city_code": order.address.city_code,
+                "to_city_code": to_city_code,
                 "total_weight": total_weight,
-                "total_value": int(order.total_payable),
-                "length": int(max_length),
-                "width": int(max_width),
-                "height": int(max_height),
+                "total_value": total_value,
+                "length": length,
+                "width": width,
+                "height": height,
             }
         ]
         data = {
@@ -166,13 +191,11 @@ class PostexShippingProvider(ShippingProvider):
         }
 
         url = f"{self.api_url}/api/v1/shipping/quotes"
-        context = f"Error getting Postex shipping quote for order {order.order_id}"
-        logger.info(
-            f"Getting Postex shipping quote for order {order.order_id} with data: {data}"
-        )
+        logger.info(f"Getting Postex shipping quote for {context} with data: {data}")
+        context = f"Error getting Postex shipping quote for {context}"
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 url, json=data, headers=self._get_headers(), timeout=10
             )
             return self._handle_response(response, context)
@@ -186,7 +209,7 @@ class PostexShippingProvider(ShippingProvider):
         logger.info(f"Canceling Postex shipment for parcel_no {parcel_no}")
 
         try:
-            response = requests.delete(url, headers=self._get_headers(), timeout=10)
+            response = self.session.delete(url, headers=self._get_headers(), timeout=10)
             return self._handle_response(response, context)
         except requests.exceptions.RequestException as e:
             logger.error(f"{context}: {e}")
@@ -198,7 +221,7 @@ class PostexShippingProvider(ShippingProvider):
         logger.info("Getting Postex city list")
 
         try:
-            response = requests.get(url, headers=self._get_headers(), timeout=10)
+            response = self.session.get(url, headers=self._get_headers(), timeout=10)
             return self._handle_response(response, context)
         except requests.exceptions.RequestException as e:
             logger.error(f"{context}: {e}")
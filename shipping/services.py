@@ -0,0 +1,140 @@
+"""
+Local copies of Postex data, so checkout does not wait on Postex.
+
+* The city list is mirrored into the ``City`` table by the
+  ``refresh_postex_cities`` task, and served from it, through the cache,
+  with an ETag.
+* Shipping quotes are cached per (origin, destination, weight, dimensions,
+  declared value) bucket for ``SHIPPING_QUOTE_CACHE_TIMEOUT`` seconds. Quotes
+  are requested for the upper bound of each bucket, so every order falling
+  into a bucket gets the same, never understated, price.
+"""
+
+import hashlib
+import json
+import logging
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import City
+from .providers import PostexShippingProvider
+
+logger = logging.getLogger(__name__)
+
+CITY_LIST_CACHE_KEY = "shipping:cities"
+QUOTE_CACHE_KEY = "shipping:quote:{}:{}:{}:{}x{}x{}:{}"
+
+
+def _parse_cities(response):
+    items = response.get("data", []) if isinstance(response, dict) else response
+    cities = {}
+    for item in items or []:
+        code = item.get("code", item.get("city_code"))
+        name = item.get("name", item.get("city_name"))
+        if code is None or not name:
+            continue
+        province = item.get("province_name") or item.get("province") or ""
+        cities[int(code)] = City(
+            code=int(code), name=name, province=province, postex_data=item
+        )
+    return list(cities.values())
+
+
+def _etag(response):
+    digest = hashlib.md5(
+        json.dumps(response, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def _store_cities(response):
+    cities = _parse_cities(response)
+    if not cities:
+        # Never wipe the table because of an empty or unexpected response.
+        logger.warning("Postex returned no cities; keeping the local city table.")
+        return 0
+    with transaction.atomic():
+        City.objects.bulk_create(
+            cities,
+            update_conflicts=True,
+            unique_fields=["code"],
+            update_fields=["name", "province", "postex_data", "updated_at"],
+        )
+        City.objects.exclude(code__in=[city.code for city in cities]).delete()
+    cache.delete(CITY_LIST_CACHE_KEY)
+    return len(cities)
+
+
+def refresh_cities():
+    """
+    Replaces the local city table with Postex's current list. Returns the
+    number of cities stored.
+    """
+    return _store_cities(PostexShippingProvider().get_cities())
+
+
+def get_city_list():
+    """
+    Returns the city list, in Postex's format, and its ETag. It is built
+    from the city table and cached until the table is refreshed. Postex is
+    only called while the table is still empty, and a response without
+    cities is returned but not cached.
+    """
+    cached = cache.get(CITY_LIST_CACHE_KEY)
+    if cached is not None:
+        return cached
+
+    if not City.objects.exists():
+        response = PostexShippingProvider().get_cities()
+        if not _store_cities(response):
+            return response, _etag(response)
+    cities = {"data": list(City.objects.values_list("postex_data", flat=True))}
+    cached = (cities, _etag(cities))
+    cache.set(CITY_LIST_CACHE_KEY, cached, None)
+    return cached
+
+
+def _round_up(value, step):
+    return max(int(math.ceil(value / step)) * step, step)
+
+
+def get_shipping_quotes(order):
+    """
+    Returns the Postex quotes for shipping ``order``, from the quote cache
+    when an order of the same bucket was quoted recently.
+    """
+    provider = PostexShippingProvider()
+    parcel = provider.get_parcel_properties(order)
+    dimension_step = settings.SHIPPING_QUOTE_DIMENSION_STEP
+    bucket = {
+        "total_weight": _round_up(
+            parcel["total_weight"], settings.SHIPPING_QUOTE_WEIGHT_STEP
+        ),
+        "total_value": _round_up(
+            parcel["total_value"], settings.SHIPPING_QUOTE_VALUE_STEP
+        ),
+        "length": _round_up(parcel["length"], dimension_step),
+        "width": _round_up(parcel["width"], dimension_step),
+        "height": _round_up(parcel["height"], dimension_step),
+    }
+    key = QUOTE_CACHE_KEY.format(
+        settings.POSTEX_FROM_CITY_CODE,
+        order.address.city_code,
+        bucket["total_weight"],
+        bucket["length"],
+        bucket["width"],
+        bucket["height"],
+        bucket["total_value"],
+    )
+    quotes = cache.get(key)
+    if quotes is None:
+        response = provider.get_quote(
+            order.address.city_code, context=f"order {order.order_id}", **bucket
+        )
+        quotes = response.get("data", {}).get("quotes", [])
+        if quotes:
+            cache.set(key, quotes, settings.SHIPPING_QUOTE_CACHE_TIMEOUT)
+    return quotes
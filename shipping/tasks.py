@@ -1,5 +1,6 @@
 from celery import shared_task
 from .providers import PostexShippingProvider, ShippingProviderError
+from .services import refresh_cities
 from orders.models import Order
 import logging
 
@@ -63,3 +64,16 @@ def create_postex_shipment_task(order_id):
         )
         # Depending on the policy, you might want to retry this too.
         # For now, we let it fail.
+
+
+@shared_task(
+    autoretry_for=(ShippingProviderError,),
+    retry_kwargs={"max_retries": 3, "countdown": 300},
+)
+def refresh_postex_cities():
+    """
+    Mirrors Postex's city list into the local ``City`` table.
+    """
+    count = refresh_cities()
+    logger.info(f"Refreshed {count} Postex cities.")
+    return count
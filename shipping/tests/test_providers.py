@@ -162,7 +162,7 @@ def test_postex_requires_api_key(settings):
 def test_create_shipment_success(monkeypatch, postex_provider, order):
     response = make_response(json_data={"status": "ok", "parcel": "P123"})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     result = postex_provider.create_shipment(order)
 
@@ -210,7 +210,7 @@ def test_create_shipment_success(monkeypatch, postex_provider, order):
 
 def test_create_shipment_timeout(monkeypatch, postex_provider, order):
     spy = RequestsSpy(exc=requests.exceptions.Timeout("timeout"))
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.create_shipment(order)
@@ -224,7 +224,7 @@ def test_create_shipment_timeout(monkeypatch, postex_provider, order):
 def test_create_shipment_http_error(monkeypatch, postex_provider, order):
     response = make_response(status_code=500, json_data={"error": "fail"})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.create_shipment(order)
@@ -238,7 +238,7 @@ def test_create_shipment_http_error(monkeypatch, postex_provider, order):
 def test_create_shipment_malformed_json(monkeypatch, postex_provider, order):
     response = make_response(status_code=200, raw_content=b"not-json")
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.create_shipment(order)
@@ -252,7 +252,7 @@ def test_create_shipment_malformed_json(monkeypatch, postex_provider, order):
 def test_get_shipment_tracking_success(monkeypatch, postex_provider):
     response = make_response(json_data={"events": ["delivered"]})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     result = postex_provider.get_shipment_tracking("P123")
 
@@ -267,7 +267,7 @@ def test_get_shipment_tracking_success(monkeypatch, postex_provider):
 
 def test_get_shipment_tracking_timeout(monkeypatch, postex_provider):
     spy = RequestsSpy(exc=requests.exceptions.ConnectionError("network"))
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_shipment_tracking("P123")
@@ -281,7 +281,7 @@ def test_get_shipment_tracking_timeout(monkeypatch, postex_provider):
 def test_get_shipment_tracking_http_error(monkeypatch, postex_provider):
     response = make_response(status_code=404, json_data={"error": "missing"})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_shipment_tracking("P123")
@@ -295,7 +295,7 @@ def test_get_shipment_tracking_http_error(monkeypatch, postex_provider):
 def test_get_shipment_tracking_malformed_json(monkeypatch, postex_provider):
     response = make_response(status_code=200, raw_content=b"not-json")
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_shipment_tracking("P123")
@@ -309,7 +309,7 @@ def test_get_shipment_tracking_malformed_json(monkeypatch, postex_provider):
 def test_get_shipping_quote_success(monkeypatch, postex_provider, order):
     response = make_response(json_data={"quotes": [{"price": 2500}]})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     result = postex_provider.get_shipping_quote(order)
 
@@ -339,7 +339,7 @@ def test_get_shipping_quote_success(monkeypatch, postex_provider, order):
 
 def test_get_shipping_quote_timeout(monkeypatch, postex_provider, order):
     spy = RequestsSpy(exc=requests.exceptions.Timeout("timeout"))
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_shipping_quote(order)
@@ -353,7 +353,7 @@ def test_get_shipping_quote_timeout(monkeypatch, postex_provider, order):
 def test_get_shipping_quote_http_error(monkeypatch, postex_provider, order):
     response = make_response(status_code=500, json_data={"error": "bad"})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_shipping_quote(order)
@@ -367,7 +367,7 @@ def test_get_shipping_quote_http_error(monkeypatch, postex_provider, order):
 def test_get_shipping_quote_malformed_json(monkeypatch, postex_provider, order):
     response = make_response(status_code=200, raw_content=b"not-json")
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "post", spy.post)
+    monkeypatch.setattr(postex_provider.session, "post", spy.post)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_shipping_quote(order)
@@ -381,7 +381,7 @@ def test_get_shipping_quote_malformed_json(monkeypatch, postex_provider, order):
 def test_cancel_shipment_success(monkeypatch, postex_provider):
     response = make_response(json_data={"status": "canceled"})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "delete", spy.delete)
+    monkeypatch.setattr(postex_provider.session, "delete", spy.delete)
 
     result = postex_provider.cancel_shipment("P123")
 
@@ -396,7 +396,7 @@ def test_cancel_shipment_success(monkeypatch, postex_provider):
 
 def test_cancel_shipment_timeout(monkeypatch, postex_provider):
     spy = RequestsSpy(exc=requests.exceptions.Timeout("timeout"))
-    monkeypatch.setattr(requests, "delete", spy.delete)
+    monkeypatch.setattr(postex_provider.session, "delete", spy.delete)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.cancel_shipment("P123")
@@ -410,7 +410,7 @@ def test_cancel_shipment_timeout(monkeypatch, postex_provider):
 def test_cancel_shipment_http_error(monkeypatch, postex_provider):
     response = make_response(status_code=400, json_data={"error": "cannot"})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "delete", spy.delete)
+    monkeypatch.setattr(postex_provider.session, "delete", spy.delete)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.cancel_shipment("P123")
@@ -424,7 +424,7 @@ def test_cancel_shipment_http_error(monkeypatch, postex_provider):
 def test_cancel_shipment_malformed_json(monkeypatch, postex_provider):
     response = make_response(status_code=200, raw_content=b"not-json")
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "delete", spy.delete)
+    monkeypatch.setattr(postex_provider.session, "delete", spy.delete)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.cancel_shipment("P123")
@@ -438,7 +438,7 @@ def test_cancel_shipment_malformed_json(monkeypatch, postex_provider):
 def test_get_cities_success(monkeypatch, postex_provider):
     response = make_response(json_data={"cities": ["Tehran"]})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     result = postex_provider.get_cities()
 
@@ -453,7 +453,7 @@ def test_get_cities_success(monkeypatch, postex_provider):
 
 def test_get_cities_timeout(monkeypatch, postex_provider):
     spy = RequestsSpy(exc=requests.exceptions.Timeout("timeout"))
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_cities()
@@ -467,7 +467,7 @@ def test_get_cities_timeout(monkeypatch, postex_provider):
 def test_get_cities_http_error(monkeypatch, postex_provider):
     response = make_response(status_code=500, json_data={"error": "nope"})
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_cities()
@@ -481,7 +481,7 @@ def test_get_cities_http_error(monkeypatch, postex_provider):
 def test_get_cities_malformed_json(monkeypatch, postex_provider):
     response = make_response(status_code=200, raw_content=b"not-json")
     spy = RequestsSpy(response=response)
-    monkeypatch.setattr(requests, "get", spy.get)
+    monkeypatch.setattr(postex_provider.session, "get", spy.get)
 
     with pytest.raises(ShippingProviderError) as excinfo:
         postex_provider.get_cities()
@@ -0,0 +1,133 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from orders.tests.factories import OrderFactory, OrderItemFactory
+from shipping import services
+from shipping.models import City
+from shipping.providers import PostexShippingProvider
+from shop.tests.factories import ProductVariantFactory
+
+
+@pytest.fixture(autouse=True)
+def postex_settings(settings):
+    settings.POSTEX_API_KEY = "test-key"
+    settings.POSTEX_FROM_CITY_CODE = 1
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def _order(weight, length=20, total_payable=Decimal("150000"), city_code=5):
+    order = OrderFactory()
+    order.address.city_code = city_code
+    order.address.save(update_fields=["city_code"])
+    variant = ProductVariantFactory()
+    product = variant.product
+    product.weight = weight
+    product.length = length
+    product.width = 10
+    product.height = 5
+    product.save()
+    OrderItemFactory(order=order, variant=variant, quantity=1)
+    order.total_payable = total_payable
+    return order
+
+
+POSTEX_CITIES = {
+    "data": [
+        {"code": 2, "name": "Tehran", "province_name": "Tehran"},
+        {"code": 3, "name": "Isfahan", "province_name": "Isfahan"},
+    ]
+}
+
+
+def test_refresh_cities_replaces_city_table():
+    City.objects.create(code=99, name="Gone")
+
+    with patch.object(PostexShippingProvider, "get_cities", return_value=POSTEX_CITIES):
+        assert services.refresh_cities() == 2
+
+    assert list(City.objects.values_list("code", "name", "province")) == [
+        (3, "Isfahan", "Isfahan"),
+        (2, "Tehran", "Tehran"),
+    ]
+
+
+def test_refresh_cities_keeps_table_on_empty_response():
+    City.objects.create(code=2, name="Tehran")
+
+    with patch.object(PostexShippingProvider, "get_cities", return_value={}):
+        assert services.refresh_cities() == 0
+
+    assert City.objects.count() == 1
+
+
+def test_city_list_is_served_from_the_table_with_etag():
+    with patch.object(PostexShippingProvider, "get_cities", return_value=POSTEX_CITIES):
+        services.refresh_cities()
+    client = APIClient()
+    url = reverse("api-v1:shipping:city-list")
+
+    with patch.object(PostexShippingProvider, "get_cities") as get_cities:
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        # Clients keep getting the cities in Postex's format.
+        assert response.data["data"] == {
+            "data": sorted(POSTEX_CITIES["data"], key=lambda city: city["name"])
+        }
+
+        not_modified = client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    get_cities.assert_not_called()
+
+
+def test_city_list_fills_empty_table_from_postex():
+    with patch.object(
+        PostexShippingProvider, "get_cities", side_effect=[{}, POSTEX_CITIES]
+    ) as get_cities:
+        # A list without cities is not cached.
+        assert services.get_city_list()[0] == {}
+        cities, _etag = services.get_city_list()
+        assert services.get_city_list()[0] == cities
+
+    assert len(cities["data"]) == 2
+    assert City.objects.count() == 2
+    assert get_cities.call_count == 2
+
+
+def test_shipping_quotes_are_cached_per_bucket():
+    quote = {"data": {"quotes": [{"price": 35000}]}}
+
+    with patch.object(
+        PostexShippingProvider, "get_quote", return_value=quote
+    ) as get_quote:
+        assert services.get_shipping_quotes(_order(weight=1200)) == [{"price": 35000}]
+        # Same destination and buckets: no second call.
+        assert services.get_shipping_quotes(_order(weight=1400)) == [{"price": 35000}]
+        # Heavier parcel: new bucket.
+        services.get_shipping_quotes(_order(weight=1600))
+
+    assert get_quote.call_count == 2
+    first, second = get_quote.call_args_list
+    assert first.args == (5,)
+    assert first.kwargs["total_weight"] == 1500
+    assert first.kwargs["length"] == 20
+    assert first.kwargs["total_value"] == 1000000
+    assert second.kwargs["total_weight"] == 2000
+
+
+def test_empty_quotes_are_not_cached():
+    with patch.object(
+        PostexShippingProvider, "get_quote", return_value={"data": {"quotes": []}}
+    ) as get_quote:
+        assert services.get_shipping_quotes(_order(weight=100)) == []
+        assert services.get_shipping_quotes(_order(weight=100)) == []
+
+    assert get_quote.call_count == 2
@@ -1,8 +1,10 @@
 from rest_framework.views import APIView
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from orders.models import Order
-from .providers import PostexShippingProvider, ShippingProviderError
+from . import services
+from .providers import ShippingProviderError
 from ecommerce_api.core.api_standard_response import ApiResponse
 import logging
 
@@ -12,9 +14,16 @@ logger = logging.getLogger(__name__)
 class CityListAPIView(APIView):
     def get(self, request, *args, **kwargs):
         try:
-            provider = PostexShippingProvider()
-            response = provider.get_cities()
-            return ApiResponse.success(data=response, status_code=status.HTTP_200_OK)
+            # Served from the local city table, with an ETag so clients can
+            # revalidate their copy without downloading it again.
+            cities, etag = services.get_city_list()
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = ApiResponse.success(
+                    data=cities, status_code=status.HTTP_200_OK
+                )
+            response["ETag"] = etag
+            return response
         except ShippingProviderError as e:
             logger.error(f"Failed to get city list from Postex: {e}")
             return ApiResponse.error(
@@ -46,10 +55,7 @@ class CalculateShippingCostAPIView(APIView):
             )
 
         try:
-            provider = PostexShippingProvider()
-            response = provider.get_shipping_quote(order)
-
-            quotes = response.get("data", {}).get("quotes", [])
+            quotes = services.get_shipping_quotes(order)
             if not quotes:
                 return ApiResponse.error(
                     message="No shipping options available for the destination.",
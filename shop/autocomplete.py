@@ -0,0 +1,214 @@
+"""
+In-process autocomplete for the live search websocket.
+
+Every ASGI worker keeps a sorted array of product name keys in memory and
+answers suggestion queries with a binary search, without touching the
+database. Product signals append the names each change removes and adds to
+a change log in Redis, and bump a version counter in the same transaction.
+Workers check the counter at most every ``SEARCH_INDEX_CHECK_INTERVAL``
+seconds, with a native asyncio Redis client, and apply the changes they
+missed to their index. They only reload every name from the database when
+they fell further behind than the log reaches.
+"""
+
+import asyncio
+import json
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+
+import redis
+import redis.asyncio
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .models import Product
+
+if "test" in sys.argv or getattr(settings, "TESTING", False):
+    from fakeredis import FakeAsyncRedis, FakeRedis, FakeServer
+
+    _server = FakeServer()
+    r = FakeRedis(server=_server)
+    async_r = FakeAsyncRedis(server=_server)
+else:
+    r = redis.from_url(settings.REDIS_URL)
+    async_r = redis.asyncio.from_url(settings.REDIS_URL)
+
+SEARCH_INDEX_VERSION_KEY = "search_index:version"
+SEARCH_INDEX_CHANGES_KEY = "search_index:changes"
+# Number of changes kept in the log; a worker further behind reloads.
+SEARCH_INDEX_CHANGE_LOG_SIZE = 1000
+
+
+def normalize(text):
+    # Arabic and Persian keyboards produce different code points for the
+    # same letters; fold them so either spelling matches.
+    return " ".join(text.casefold().replace("ي", "ی").replace("ك", "ک").split())
+
+
+def _entries(name):
+    words = normalize(name).split(" ")
+    return {(" ".join(words[start:]), name) for start in range(len(words))}
+
+
+class PrefixIndex:
+    """
+    A sorted array of ``(key, name)`` pairs. Each name is indexed under its
+    full normalized form and under every suffix starting at a word boundary,
+    so "case" finds "Phone Case" as well as "Case Cover".
+    """
+
+    def __init__(self, names=()):
+        # Several products can share a name; it stays indexed until the last
+        # of them is removed.
+        self._counts = Counter(names)
+        entries = set()
+        for name in self._counts:
+            entries |= _entries(name)
+        self._entries = sorted(entries)
+        self._keys = [key for key, _name in self._entries]
+
+    def add(self, name):
+        self._counts[name] += 1
+        if self._counts[name] > 1:
+            return
+        for entry in _entries(name):
+            position = bisect_left(self._entries, entry)
+            self._entries.insert(position, entry)
+            self._keys.insert(position, entry[0])
+
+    def remove(self, name):
+        if not self._counts[name]:
+            return
+        self._counts[name] -= 1
+        if self._counts[name]:
+            return
+        del self._counts[name]
+        for entry in _entries(name):
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+                del self._keys[position]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, prefix, limit=5):
+        """
+        Returns up to ``limit`` distinct names with a key starting with
+        ``prefix``, in key order.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        position = bisect_left(self._keys, prefix)
+        while position < len(self._keys) and len(results) < limit:
+            key, name = self._entries[position]
+            if not key.startswith(prefix):
+                break
+            if name not in results:
+                results.append(name)
+            position += 1
+        return results
+
+
+def load_product_names():
+    return list(Product.objects.values_list("name", flat=True))
+
+
+def publish_name_changes(removed=(), added=()):
+    """
+    Appends a change to the product names to the log, once the current
+    transaction commits.
+    """
+    removed, added = list(removed), list(added)
+    if removed == added:
+        return
+    change = json.dumps({"removed": removed, "added": added})
+
+    def publish():
+        pipe = r.pipeline(transaction=True)
+        pipe.incr(SEARCH_INDEX_VERSION_KEY)
+        pipe.rpush(SEARCH_INDEX_CHANGES_KEY, change)
+        pipe.ltrim(SEARCH_INDEX_CHANGES_KEY, -SEARCH_INDEX_CHANGE_LOG_SIZE, -1)
+        pipe.execute()
+
+    transaction.on_commit(publish)
+
+
+async def get_index_version():
+    version = await async_r.get(SEARCH_INDEX_VERSION_KEY)
+    return int(version or 0)
+
+
+class ProductAutocomplete:
+    """
+    The per-worker product name index, kept up to date from the change log.
+    Concurrent sessions share one refresh.
+    """
+
+    def __init__(self):
+        self._index = PrefixIndex()
+        self._version = None
+        self._checked_at = None
+        self._lock = None
+
+    def _is_fresh(self):
+        interval = getattr(settings, "SEARCH_INDEX_CHECK_INTERVAL", 5)
+        return (
+            self._checked_at is not None
+            and time.monotonic() - self._checked_at < interval
+        )
+
+    async def _reload(self, version):
+        names = await database_sync_to_async(load_product_names)()
+        self._index = PrefixIndex(names)
+        self._version = version
+
+    async def _apply_changes(self):
+        """
+        Applies the logged changes since the loaded version. Returns False if
+        some of them are no longer in the log.
+        """
+        pipe = async_r.pipeline(transaction=True)
+        pipe.get(SEARCH_INDEX_VERSION_KEY)
+        pipe.lrange(SEARCH_INDEX_CHANGES_KEY, 0, -1)
+        version, changes = await pipe.execute()
+        version = int(version or 0)
+        missed = version - self._version
+        if missed < 0 or missed > len(changes):
+            # Redis was reset, or the log was trimmed past our version.
+            return False
+        for change in changes[len(changes) - missed :]:
+            change = json.loads(change)
+            for name in change["removed"]:
+                self._index.remove(name)
+            for name in change["added"]:
+                self._index.add(name)
+        self._version = version
+        return True
+
+    async def refresh(self, force=False):
+        if not force and self._is_fresh():
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not force and self._is_fresh():
+                return
+            version = await get_index_version()
+            if force or self._version is None:
+                await self._reload(version)
+            elif version != self._version and not await self._apply_changes():
+                await self._reload(await get_index_version())
+            self._checked_at = time.monotonic()
+
+    async def suggest(self, query, limit=5):
+        await self.refresh()
+        return self._index.search(query, limit)
+
+
+product_autocomplete = ProductAutocomplete()
@@ -1,5 +1,117 @@
 import hashlib
-from typing import Dict, Any
+import time
+from typing import Any, Dict, Iterable, List
+from urllib.parse import urljoin
+
+from django.core.cache import cache
+
+from common.utils.cache import register_cache_loader
+
+# Fresh/stale lifetimes of cached product responses. Between the two, a
+# cached response is still served while a single worker rebuilds it.
+PRODUCT_LIST_CACHE_TIMEOUT = 60 * 5
+PRODUCT_LIST_STALE_TIMEOUT = 60 * 15
+PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 60
+PRODUCT_DETAIL_STALE_TIMEOUT = 60 * 60 * 6
+
+# Generation counters for the product list cache. A list entry's key embeds
+# the generations it depends on, so bumping a counter orphans every entry
+# built from it (they simply expire) without scanning Redis for keys.
+PRODUCT_LIST_GENERATION_KEY = "product_list:gen"
+CATEGORY_GENERATION_KEY = "product_list:gen:category:{}"
+TAG_GENERATION_KEY = "product_list:gen:tag:{}"
+
+# Per-product generation, bumped when a change can alter what the product's
+# variants cost in a cart: a variant price change, a variant being added or
+# removed, or the product moving to another category or tag (which changes
+# the discounts it is eligible for). Stock-only saves leave it untouched.
+PRODUCT_GENERATION_KEY = "product:{}:gen"
+
+# Query parameters that restrict a listing to a single category or tag. A
+# listing scoped this way only depends on the generations of that scope, so
+# edits to products elsewhere in the catalog leave it untouched.
+CATEGORY_SCOPE_PARAM = "category__slug"
+TAG_SCOPE_PARAM = "tags__name"
+
+
+def _normalize_params(query_params) -> List[tuple]:
+    """
+    Returns the query parameters as a sorted list of (key, values) pairs.
+    Multi-valued parameters keep all of their values.
+    """
+    if hasattr(query_params, "lists"):
+        items = [(key, list(values)) for key, values in query_params.lists()]
+    else:
+        items = [
+            (key, value if isinstance(value, list) else [value])
+            for key, value in query_params.items()
+        ]
+
+    params = {key: sorted(str(v) for v in values) for key, values in items}
+    # The first page is addressable both with and without "?page=1".
+    if params.get("page") == ["1"]:
+        params.pop("page")
+    return sorted(params.items())
+
+
+def _initial_generation() -> int:
+    # Seed new counters from the clock so a counter that was evicted never
+    # restarts at a value that older (still cached) entries were built with.
+    return int(time.time() * 1000)
+
+
+def _scope_generation_keys(params: Dict[str, List[str]]) -> List[str]:
+    keys = [
+        CATEGORY_GENERATION_KEY.format(slug)
+        for slug in params.get(CATEGORY_SCOPE_PARAM, [])
+    ]
+    keys += [
+        TAG_GENERATION_KEY.format(name.lower())
+        for name in params.get(TAG_SCOPE_PARAM, [])
+    ]
+    return keys or [PRODUCT_LIST_GENERATION_KEY]
+
+
+def get_generations(keys: List[str]) -> List[int]:
+    """
+    Reads the given generation counters in a single round trip, seeding any
+    that do not exist yet.
+    """
+    values = cache.get_many(keys)
+    generations = []
+    for key in keys:
+        value = values.get(key)
+        if value is None:
+            value = _initial_generation()
+            if not cache.add(key, value, timeout=None):
+                value = cache.get(key, value)
+        generations.append(value)
+    return generations
+
+
+def bump_generations(keys: Iterable[str]) -> None:
+    """
+    Increments the given generation counters, invalidating every product list
+    entry that was built against them.
+    """
+    for key in set(keys):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The counter does not exist (or was evicted); seeding it with a
+            # fresh value has the same effect as an increment.
+            cache.set(key, _initial_generation(), timeout=None)
+
+
+def product_generation_keys(category_slugs=(), tag_names=()) -> List[str]:
+    """
+    Returns the generation keys covering every listing a product with the
+    given categories and tags can appear in.
+    """
+    keys = [PRODUCT_LIST_GENERATION_KEY]
+    keys += [CATEGORY_GENERATION_KEY.format(slug) for slug in category_slugs if slug]
+    keys += [TAG_GENERATION_KEY.format(name.lower()) for name in tag_names if name]
+    return keys
 
 
 def generate_product_list_cache_key(query_params: Dict[str, Any]) -> str:
@@ -7,34 +119,60 @@ def generate_product_list_cache_key(query_params: Dict[str, Any]) -> str:
     Generates a consistent cache key for the product list endpoint
     based on query parameters.
 
-    The parameters are sorted to ensure that the order does not affect
-    the final key. A hash is used to keep the key length manageable.
+    The parameters, including pagination, are sorted to ensure that the order
+    does not affect the final key. A hash is used to keep the key length
+    manageable. The key embeds the generation counters of the listing's scope,
+    so invalidation is a counter bump rather than a key scan.
     """
-    # Create a copy to avoid modifying the original query_params
-    params = query_params.copy()
-
-    # Remove pagination parameters as they are handled by the view's pagination logic
-    # and the entire response (for a given page) is cached.
-    params.pop("page", None)
-    params.pop("page_size", None)
+    sorted_params = _normalize_params(query_params)
 
-    if not params:
-        return "product_list:default"
+    generation_keys = _scope_generation_keys(dict(sorted_params))
+    generations = ".".join(str(g) for g in get_generations(generation_keys))
 
-    # Sort the query parameters by key to ensure consistency
-    sorted_params = sorted(params.items())
+    if not sorted_params:
+        return f"product_list:{generations}:default"
 
     # Create a consistent string representation
-    # Example: [['category', 'laptops'], ['ordering', '-price']] -> "category=laptops&ordering=-price"
+    # Example: [['category', ['laptops']], ['page', ['2']]] -> "category=laptops&page=2"
     param_string = "&".join(
-        [
-            f"{key}={','.join(sorted(value)) if isinstance(value, list) else value}"
-            for key, value in sorted_params
-        ]
+        [f"{key}={','.join(values)}" for key, values in sorted_params]
     )
 
     # Hash the string to create a unique and fixed-length key component
     # Using MD5 for speed as cryptographic security is not a concern here.
     hashed_params = hashlib.md5(param_string.encode("utf-8")).hexdigest()
 
-    return f"product_list:{hashed_params}"
+    return f"product_list:{generations}:{hashed_params}"
+
+
+def product_detail_cache_key(slug: str) -> str:
+    return f"product_detail_{slug}"
+
+
+class AbsoluteURIBuilder:
+    """
+    Stands in for the request when product data is serialized outside of
+    one (e.g. in a Celery worker), so image URLs are still absolute.
+    """
+
+    def __init__(self, base_uri: str):
+        self.base_uri = base_uri
+
+    def build_absolute_uri(self, location: str = "/") -> str:
+        return urljoin(self.base_uri, location)
+
+
+def render_product_detail(slug: str, request) -> Dict[str, Any]:
+    """
+    Serializes the detail representation of the product with the given slug.
+    """
+    from . import services
+    from .serializers import ProductDetailSerializer
+
+    product = services.get_product_detail(slug)
+    return ProductDetailSerializer(product, context={"request": request}).data
+
+
+@register_cache_loader("shop.product_detail")
+def refresh_product_detail(slug: str, base_uri: str) -> Dict[str, Any]:
+    return render_product_detail(slug, AbsoluteURIBuilder(base_uri))
@@ -1,21 +1,32 @@
 import json
+import sys
 import time
 
-from channels.db import database_sync_to_async
+import redis.asyncio
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.core.cache import cache
+from django.conf import settings
 
-from shop.models import Product
-from shop.utils import search_products
+from shop.autocomplete import product_autocomplete
+
+if "test" in sys.argv or getattr(settings, "TESTING", False):
+    from fakeredis import FakeAsyncRedis
+
+    r = FakeAsyncRedis()
+else:
+    r = redis.asyncio.from_url(settings.REDIS_URL)
+
+# Minimum time (in seconds) between two queries of the same connection.
+THROTTLE_COOLDOWN = 0.5
 
 
 class SearchConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for handling real-time product search queries.
+    Suggestions are answered from the worker's in-memory product name index.
     """
 
     def __init__(self, *args, **kwargs):
-        super().__init__(args, kwargs)
+        super().__init__(*args, **kwargs)
         self.throttle_id = None
 
     async def connect(self):
@@ -26,15 +37,6 @@ class SearchConsumer(AsyncWebsocketConsumer):
         self.throttle_id = self.channel_name
         await self.accept()
 
-    async def disconnect(self, close_code):
-        """
-        Handles the WebSocket disconnection event.
-        Removes any cached data related to the throttle ID.
-        """
-        cache.delete(f"search_suggestions_{self.throttle_id}")
-        cache.delete(f"last_query_{self.throttle_id}")
-        cache.delete(f"throttle_ws_{self.throttle_id}")
-
     async def receive(self, text_data=None, bytes_data=None):
         """
         Handles incoming WebSocket messages.
@@ -58,56 +60,25 @@ class SearchConsumer(AsyncWebsocketConsumer):
         # Send the search results back to the client.
         await self.send(text_data=json.dumps({"results": results}))
 
-    @database_sync_to_async
-    def get_search_suggestions(self, query):
+    async def get_search_suggestions(self, query):
         """
         Fetches search suggestions for the given query.
 
         :param query: The search term provided by the client.
         :return: A list of up to 5 product names matching the query.
         """
-        key = f"search_suggestions_{self.throttle_id}"
-        past_results = cache.get(key)
-
-        if past_results and query.startswith(
-            cache.get(f"last_query_{self.throttle_id}", "")
-        ):
-            # Filter cached results if the new query starts with the previous query
-            filtered_results = [
-                product
-                for product in past_results
-                if query.lower() in product[0].lower()
-            ]
-        else:
-            # Fetch results from the database and cache them
-            products = Product.objects.all()
-            filtered_products = search_products(products, query)[:20]
-            filtered_results = list(
-                filtered_products.values_list("name", "description")
-            )
-            cache.set(key, filtered_results, timeout=1)  # Cache results for 1 second
-            cache.set(
-                f"last_query_{self.throttle_id}", query, timeout=1
-            )  # Cache the last query
-
-        # Return only the titles, limited to 5 results
-        return [product[0] for product in filtered_results[:5]]
+        return await product_autocomplete.suggest(query, limit=5)
 
     async def is_throttled(self):
         """
         Checks if the client is making requests too frequently.
 
+        Each connection may take one slot per cooldown window; the slot is
+        claimed with an atomic ``SET NX`` on the native asyncio Redis client,
+        so no read-modify-write or thread-pool hop is needed.
+
         :return: True if the client is throttled, False otherwise.
         """
-        key = f"throttle_ws_{self.throttle_id}"
-        now = time.time()
-        cooldown = 0.5  # Minimum time (in seconds) between requests.
-
-        # Retrieve the timestamp of the last request from the cache.
-        last_request = cache.get(key)
-        if last_request and now - last_request < cooldown:
-            return True
-
-        # Update the cache with the current timestamp.
-        cache.set(key, now, timeout=5)
-        return False
+        window = int(time.time() / THROTTLE_COOLDOWN)
+        key = f"throttle_ws_{self.throttle_id}_{window}"
+        return not await r.set(key, 1, nx=True, ex=5)
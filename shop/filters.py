@@ -1,8 +1,9 @@
+from django.db.models import Exists, OuterRef
 from django_filters import FilterSet, RangeFilter, BooleanFilter
 from rest_framework.filters import BaseFilterBackend
 
-from .models import Product
-from .utils import search_products
+from .models import Product, ProductVariant
+from .search import search_products
 
 
 class ProductFilter(FilterSet):
@@ -26,23 +27,37 @@ class ProductFilter(FilterSet):
         }
 
     def filter_by_price_range(self, queryset, name, value):
-        if value:
-            return queryset.filter(
-                variants__price__gte=value.start, variants__price__lte=value.stop
-            ).distinct()
-        return queryset
+        """
+        Keeps products with a variant priced within the requested range (both
+        bounds included). The denormalized min/max price columns narrow the
+        candidates first, and an ``EXISTS`` on the variants keeps only the
+        products that really have such a variant, without a join.
+        """
+        if not value or (value.start is None and value.stop is None):
+            return queryset
+        variants = ProductVariant.objects.filter(product=OuterRef("pk"))
+        if value.start is not None:
+            queryset = queryset.filter(max_price__gte=value.start)
+            variants = variants.filter(price__gte=value.start)
+        if value.stop is not None:
+            queryset = queryset.filter(min_price__lte=value.stop)
+            variants = variants.filter(price__lte=value.stop)
+        return queryset.filter(Exists(variants))
 
     def filter_in_stock(self, queryset, name, value):
         if value:
-            return queryset.filter(variants__stock__gt=0).distinct()
+            return queryset.filter(is_in_stock=True)
         return queryset
 
 
 class ProductSearchFilterBackend(BaseFilterBackend):
     """
-    Custom filter to search products by name and description.
+    Custom filter to search products by name, description, tags and category,
+    ranked by relevance. With ``prefix=true`` the last word of the search is
+    matched as a prefix, for search-as-you-type.
     """
 
     def filter_queryset(self, request, queryset, view):
         search = request.query_params.get("search", None)
-        return search_products(queryset, search)
+        prefix = request.query_params.get("prefix") in ("1", "true", "True")
+        return search_products(queryset, search, prefix=prefix)
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from shop.recommender import Recommender
+
+PURCHASED_STATUSES = [
+    Order.Status.PAID,
+    Order.Status.PROCESSING,
+    Order.Status.SHIPPED,
+    Order.Status.DELIVERED,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the co-purchase recommendation graph from historical orders. "
+        "Orders that were already recorded are skipped, so it can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only include orders placed on or after this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of order items fetched from the database per chunk",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of orders sent to Redis per pipeline",
+        )
+
+    def handle(self, *args, **options):
+        items = OrderItem.objects.filter(order__status__in=PURCHASED_STATUSES)
+        if options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d")
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+            items = items.filter(order__order_date__gte=timezone.make_aware(since))
+
+        rows = (
+            items.order_by("order_id")
+            .values_list("order_id", "order__order_date", "variant__product_id")
+            .iterator(chunk_size=options["chunk_size"])
+        )
+
+        recommender = Recommender()
+        batch_size = options["batch_size"]
+        baskets = []
+        orders_count = recorded_count = 0
+        current_order, current_date, product_ids = None, None, []
+
+        for order_id, order_date, product_id in rows:
+            if order_id != current_order:
+                if product_ids:
+                    baskets.append((current_order, product_ids, current_date))
+                current_order, current_date, product_ids = order_id, order_date, []
+            product_ids.append(product_id)
+
+            if len(baskets) >= batch_size:
+                recorded_count += recommender.orders_bought(baskets)
+                orders_count += len(baskets)
+                baskets = []
+
+        if product_ids:
+            baskets.append((current_order, product_ids, current_date))
+        if baskets:
+            recorded_count += recommender.orders_bought(baskets)
+            orders_count += len(baskets)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recorded co-purchases for {recorded_count} orders "
+                f"({orders_count - recorded_count} already recorded)."
+            )
+        )
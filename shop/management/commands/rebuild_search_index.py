@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Product
+from shop.search import is_postgres, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Recompute the full-text search vectors of all products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of products updated per query",
+        )
+
+    def handle(self, *args, **options):
+        if not is_postgres():
+            self.stdout.write("Search vectors are only maintained on PostgreSQL.")
+            return
+
+        chunk_size = options["chunk_size"]
+        product_ids = Product.all_objects.order_by("pk").values_list("pk", flat=True)
+
+        updated = 0
+        chunk = []
+        for product_id in product_ids.iterator(chunk_size=chunk_size):
+            chunk.append(product_id)
+            if len(chunk) >= chunk_size:
+                updated += update_search_vectors(chunk)
+                chunk = []
+        if chunk:
+            updated += update_search_vectors(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt search vectors for {updated} products.")
+        )
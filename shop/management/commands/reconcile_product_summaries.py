@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized price and stock columns of products from their variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of products updated per query",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        product_ids = Product.all_objects.order_by("pk").values_list("pk", flat=True)
+
+        updated = 0
+        chunk = []
+        for product_id in product_ids.iterator(chunk_size=chunk_size):
+            chunk.append(product_id)
+            if len(chunk) >= chunk_size:
+                updated += Product.refresh_variant_summaries(chunk)
+                chunk = []
+        if chunk:
+            updated += Product.refresh_variant_summaries(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled variant summaries for {updated} products.")
+        )
@@ -0,0 +1,91 @@
+# Generated by Django 5.2 on 2026-10-17 07:19
+
+from django.db import migrations, models
+from django.db.models import Exists, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_variant_summaries(apps, schema_editor):
+    Product = apps.get_model("shop", "Product")
+    ProductVariant = apps.get_model("shop", "ProductVariant")
+    variants = ProductVariant.objects.filter(product=OuterRef("pk")).order_by()
+
+    def aggregate(function, field):
+        return Subquery(
+            variants.values("product")
+            .annotate(value=function(field))
+            .values("value")[:1]
+        )
+
+    Product.objects.update(
+        min_price=aggregate(Min, "price"),
+        max_price=aggregate(Max, "price"),
+        total_stock=Coalesce(aggregate(Sum, "stock"), 0),
+        is_in_stock=Exists(variants.filter(stock__gt=0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0002_auto_20240726_1000"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="is_in_stock",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                help_text="Whether at least one variant of the product is in stock.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="max_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                editable=False,
+                help_text="The highest price among the product's variants.",
+                max_digits=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="min_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                editable=False,
+                help_text="The lowest price among the product's variants.",
+                max_digits=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="total_stock",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="The combined stock of the product's variants.",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["min_price"], name="shop_produc_min_pri_6dee01_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_in_stock", "min_price"],
+                name="shop_produc_is_in_s_25d554_idx",
+            ),
+        ),
+        migrations.RunPython(populate_variant_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-17 07:24
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_INDEXES = {
+    "shop_product_search_vector_gin": "USING gin (search_vector)",
+    "shop_product_name_trgm": "USING gin (name gin_trgm_ops)",
+}
+
+POPULATE_SEARCH_VECTORS = """
+UPDATE shop_product AS p SET search_vector =
+    setweight(to_tsvector(%(config)s, coalesce(p.name, '')), 'A')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(t.name, ' ')
+        FROM shop_customtaggeditem ti
+        JOIN shop_customtag t ON t.id = ti.tag_id
+        JOIN django_content_type ct ON ct.id = ti.content_type_id
+        WHERE ti.object_id = p.product_id
+          AND ct.app_label = 'shop' AND ct.model = 'product'
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT c.name FROM shop_category c WHERE c.id = p.category_id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s, coalesce(p.description, '')), 'C')
+"""
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN indexes are PostgreSQL-only; other backends search with icontains.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, definition in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON shop_product {definition}"
+        )
+    schema_editor.execute(
+        POPULATE_SEARCH_VECTORS,
+        {"config": getattr(settings, "PRODUCT_SEARCH_CONFIG", "simple")},
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0003_product_variant_summary"),
+        ("contenttypes", "0002_remove_content_type_name"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
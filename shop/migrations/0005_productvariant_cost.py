@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 08:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0004_product_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productvariant",
+            name="cost",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                validators=[django.core.validators.MinValueValidator(0.0)],
+            ),
+        ),
+    ]
@@ -1,9 +1,11 @@
 import uuid
 
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.urls import reverse
+from django.utils.functional import cached_property
 from slugify import slugify
 from taggit.managers import TaggableManager
 
@@ -41,6 +43,11 @@ class Category(SluggedModel):
         ]
         ordering = ["name"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Read from __dict__ so a deferred slug is not loaded here.
+        self._original_slug = self.__dict__.get("slug")
+
     def save(self, *args, **kwargs):
         """
         Overrides the default save method to auto-generate the slug from the name.
@@ -80,6 +87,11 @@ class SoftDeleteManager(models.Manager):
         return super().get_queryset()
 
 
+class InStockManager(SoftDeleteManager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_in_stock=True)
+
+
 validate_image = FileValidator(
     max_size=2 * 1024 * 1024,  # 2MB
     content_types=("image/jpeg", "image/png", "image/webp"),
@@ -135,6 +147,9 @@ class Product(SluggedModel):
     all_objects = (
         models.Manager()
     )  # The manager for all objects, including deleted ones.
+    in_stock = (
+        InStockManager()
+    )  # Non-deleted products with at least one variant in stock.
     tags = TaggableManager(through=CustomTaggedItem, help_text="Tags for the product.")
     weight = models.DecimalField(
         max_digits=10,
@@ -181,6 +196,38 @@ class Product(SluggedModel):
     is_liquid = models.BooleanField(
         default=False, help_text="Does the product contain liquid?"
     )
+    # Summary of the product's variants, maintained by
+    # `refresh_variant_summaries` so listings can filter and sort on them
+    # without joining the variants table.
+    min_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="The lowest price among the product's variants.",
+    )
+    max_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="The highest price among the product's variants.",
+    )
+    total_stock = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="The combined stock of the product's variants.",
+    )
+    is_in_stock = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="Whether at least one variant of the product is in stock.",
+    )
+    # Weighted full-text vector of name, tags, category and description,
+    # maintained by `shop.search.update_search_vectors` (PostgreSQL only).
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Product"
@@ -189,9 +236,18 @@ class Product(SluggedModel):
             models.Index(fields=["slug"]),
             models.Index(fields=["name"]),
             models.Index(fields=["category"]),
+            models.Index(fields=["min_price"]),
+            models.Index(fields=["is_in_stock", "min_price"]),
         ]
         ordering = ["name"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._original_category_id = self.category_id
+        # Read from __dict__ so deferred fields are not loaded here.
+        self._original_name = self.__dict__.get("name")
+        self._original_deleted_at = self.__dict__.get("deleted_at")
+
     def save(self, *args, **kwargs):
         """
         Overrides the default save method to auto-generate a unique slug.
@@ -260,6 +316,42 @@ class Product(SluggedModel):
             self.reviews_count = 0
         self.save(update_fields=["rating", "reviews_count"])
 
+    @cached_property
+    def first_variant(self):
+        """
+        The variant that represents the product in compact listings, picked
+        once per instance from the (usually prefetched) variants.
+        """
+        return min(self.variants.all(), key=lambda variant: variant.pk, default=None)
+
+    @classmethod
+    def refresh_variant_summaries(cls, product_ids=None):
+        """
+        Recomputes the price and stock summary columns of the given products
+        (or of every product) from their variants, in a single UPDATE.
+        """
+        from django.db.models import Exists, Max, Min, OuterRef, Subquery, Sum
+        from django.db.models.functions import Coalesce
+
+        variants = ProductVariant.objects.filter(product=OuterRef("pk")).order_by()
+
+        def aggregate(function, field):
+            return Subquery(
+                variants.values("product")
+                .annotate(value=function(field))
+                .values("value")[:1]
+            )
+
+        products = cls.all_objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        return products.update(
+            min_price=aggregate(Min, "price"),
+            max_price=aggregate(Max, "price"),
+            total_stock=Coalesce(aggregate(Sum, "stock"), 0),
+            is_in_stock=Exists(variants.filter(stock__gt=0)),
+        )
+
     def __str__(self):
         return f"Product: {self.name} (ID: {self.product_id})"
 
@@ -357,6 +449,14 @@ class ProductVariant(models.Model):
     price = models.DecimalField(
         max_digits=10, decimal_places=2, validators=[MinValueValidator(0.0)]
     )
+    # Unit cost, used for the profit figures of the sales analytics.
+    cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0.0)],
+    )
     stock = models.IntegerField(validators=[MinValueValidator(0)])
     image = models.ImageField(
         null=True,
@@ -366,6 +466,11 @@ class ProductVariant(models.Model):
     )
     option_values = models.ManyToManyField(OptionValue, through="VariantOptionValue")
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Read from __dict__ so a deferred price is not loaded here.
+        self._original_price = self.__dict__.get("price")
+
     def __str__(self):
         return f"{self.product.name} - {self.sku}"
 
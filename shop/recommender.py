@@ -1,6 +1,11 @@
 import redis
 import sys
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
 from django.conf import settings
+from django.utils import timezone
+
 from .models import Product
 
 # connect to redis
@@ -11,60 +16,172 @@ if "test" in sys.argv or getattr(settings, "TESTING", False):
 else:
     r = redis.from_url(settings.REDIS_URL)
 
+# Ids of the orders whose baskets were added to the graph. Claiming an order
+# here first (SADD only succeeds once) keeps live recording, task retries and
+# repeated or overlapping backfills from counting the same basket twice.
+RECORDED_ORDERS_KEY = "recommender:recorded_orders"
+
 
 class Recommender:
+    """
+    Co-purchase recommendations backed by one Redis sorted set per product
+    (``product:{id}:purchased_with``) scoring the products bought with it.
+
+    Scores use forward time-decay: each purchase adds a weight that doubles
+    every ``RECOMMENDER_HALF_LIFE_DAYS`` after ``RECOMMENDER_DECAY_EPOCH``.
+    Relative to new purchases, older ones therefore lose half their influence
+    per half-life without ever rewriting the stored scores.
+    """
+
     def get_product_key(self, id):
         return f"product:{id}:purchased_with"
 
-    def products_bought(self, products):
-        product_ids = [p.product_id for p in products]
+    def get_weight(self, bought_at=None):
+        bought_at = bought_at or timezone.now()
+        epoch = datetime.fromisoformat(settings.RECOMMENDER_DECAY_EPOCH)
+        if timezone.is_naive(epoch):
+            epoch = timezone.make_aware(epoch, dt_timezone.utc)
+        age_days = (bought_at - epoch).total_seconds() / 86400
+        return 2 ** (age_days / settings.RECOMMENDER_HALF_LIFE_DAYS)
+
+    def _add_basket(self, pipe, product_ids, weight):
+        product_ids = list(dict.fromkeys(str(id) for id in product_ids))
+        if len(product_ids) < 2:
+            return
+        max_related = settings.RECOMMENDER_MAX_RELATED
         for product_id in product_ids:
+            key = self.get_product_key(product_id)
             for with_id in product_ids:
-                # get the other products bought with each product
+                # increment score for product purchased together
                 if product_id != with_id:
-                    # increment score for product purchased together
-                    r.zincrby(self.get_product_key(product_id), 1, with_id)
-
-    def suggest_products_for(self, products, max_results=6):
-        product_ids = [p.product_id for p in products]
-        if len(products) == 1:
-            # only 1 product
-            suggestions = r.zrange(
-                self.get_product_key(product_ids[0]), 0, -1, desc=True
-            )[:max_results]
-        else:
-            # generate a temporary key
-            flat_ids = "".join([str(id) for id in product_ids])
-            tmp_key = f"tmp_{flat_ids}"
-            # multiple products, combine scores of all products
-            # store the resulting sorted set in a temporary key
-            keys = [self.get_product_key(id) for id in product_ids]
-            r.zunionstore(tmp_key, keys)
-            # remove ids for the products the recommendation is for
-            r.zrem(tmp_key, *product_ids)
-            # get the product ids by their score, descendant sort
-            suggestions = r.zrange(tmp_key, 0, -1, desc=True)[:max_results]
-            # remove the temporary key
-            r.delete(tmp_key)
-
-        # redis returns bytes, so we decode them to utf-8 and cast to int
-        suggested_products_ids = [
+                    pipe.zincrby(key, weight, with_id)
+            # keep only the strongest relations so sets stay bounded
+            pipe.zremrangebyrank(key, 0, -(max_related + 1))
+
+    def products_bought(self, products, bought_at=None):
+        """
+        Records that the given products were bought together, in a single
+        Redis round trip.
+        """
+        self.product_ids_bought([p.product_id for p in products], bought_at)
+
+    def product_ids_bought(self, product_ids, bought_at=None):
+        pipe = r.pipeline(transaction=False)
+        self._add_basket(pipe, product_ids, self.get_weight(bought_at))
+        pipe.execute()
+
+    def bulk_products_bought(self, baskets):
+        """
+        Records many baskets, given as ``(product_ids, bought_at)`` pairs,
+        through one pipeline.
+        """
+        pipe = r.pipeline(transaction=False)
+        for product_ids, bought_at in baskets:
+            self._add_basket(pipe, product_ids, self.get_weight(bought_at))
+        pipe.execute()
+
+    def orders_bought(self, orders):
+        """
+        Records the baskets of many orders, given as
+        ``(order_id, product_ids, bought_at)`` triples, skipping orders that
+        were already recorded. Returns the number of orders recorded.
+        """
+        orders = list(orders)
+        pipe = r.pipeline(transaction=False)
+        for order_id, _product_ids, _bought_at in orders:
+            pipe.sadd(RECORDED_ORDERS_KEY, str(order_id))
+        claimed = pipe.execute() if orders else []
+
+        pipe = r.pipeline(transaction=False)
+        recorded = 0
+        for (_order_id, product_ids, bought_at), is_new in zip(orders, claimed):
+            if is_new:
+                self._add_basket(pipe, product_ids, self.get_weight(bought_at))
+                recorded += 1
+        if recorded:
+            pipe.execute()
+        return recorded
+
+    def suggest_product_ids_for_many(self, product_groups, max_results=6):
+        """
+        Returns the ids of the top ``max_results`` products bought together
+        with each group of base products (given as products or product ids),
+        in order of decreasing score.
+
+        All groups are resolved in a single MULTI/EXEC pipeline. A group with
+        several products is combined through a temporary key: ZUNIONSTORE,
+        ZREM of the base products and a bounded ZRANGE, queued back to back
+        so only the top ``max_results`` members ever leave Redis.
+        """
+        pipe = r.pipeline(transaction=True)
+        # position of each group's ZRANGE reply in the pipeline results
+        reply_indexes = []
+        queued = 0
+        for group in product_groups:
+            product_ids = list(
+                dict.fromkeys(str(getattr(p, "product_id", p)) for p in group)
+            )
+            if not product_ids:
+                reply_indexes.append(None)
+            elif len(product_ids) == 1:
+                # only 1 product
+                pipe.zrange(
+                    self.get_product_key(product_ids[0]), 0, max_results - 1, desc=True
+                )
+                reply_indexes.append(queued)
+                queued += 1
+            else:
+                # multiple products, combine scores of all products
+                # into a temporary key, without the products themselves
+                tmp_key = f"tmp_{uuid.uuid4().hex}"
+                pipe.zunionstore(
+                    tmp_key, [self.get_product_key(id) for id in product_ids]
+                )
+                pipe.zrem(tmp_key, *product_ids)
+                pipe.zrange(tmp_key, 0, max_results - 1, desc=True)
+                pipe.delete(tmp_key)
+                reply_indexes.append(queued + 2)
+                queued += 4
+
+        replies = pipe.execute() if queued else []
+        # redis returns bytes, so we decode them to utf-8
+        return [
             (
-                suggestion.decode("utf-8")
-                if isinstance(suggestion, bytes)
-                else str(suggestion)
+                [
+                    m.decode("utf-8") if isinstance(m, bytes) else str(m)
+                    for m in replies[index]
+                ]
+                if index is not None
+                else []
             )
-            for suggestion in suggestions
+            for index in reply_indexes
+        ]
+
+    def suggest_products_for_many(self, product_groups, max_results=6, queryset=None):
+        """
+        Batched version of ``suggest_products_for``: one Redis round trip and
+        one database query for all groups.
+        """
+        suggestions = self.suggest_product_ids_for_many(product_groups, max_results)
+        queryset = queryset if queryset is not None else Product.objects.all()
+        all_ids = {id for ids in suggestions for id in ids}
+        if not all_ids:
+            return [[] for _ in suggestions]
+        products_by_id = {
+            str(product.product_id): product
+            for product in queryset.filter(product_id__in=all_ids)
+        }
+        # keep the order of appearance, skipping products that are gone
+        return [
+            [products_by_id[id] for id in ids if id in products_by_id]
+            for ids in suggestions
         ]
 
-        # get suggested products and sort by order of appearance
-        suggested_products = list(
-            Product.objects.filter(product_id__in=suggested_products_ids)
-        )
-        suggested_products.sort(
-            key=lambda x: suggested_products_ids.index(str(x.product_id))
-        )
-        return suggested_products
+    def suggest_products_for(self, products, max_results=6, queryset=None):
+        products = list(products)
+        if not products:
+            return []
+        return self.suggest_products_for_many([products], max_results, queryset)[0]
 
     #
     # def suggest_for_user(self, user, max_results=100):
@@ -0,0 +1,126 @@
+"""
+Product search.
+
+On PostgreSQL every product keeps a weighted ``search_vector`` built from its
+name, tags, category and description, backed by a GIN index, and the name
+has a GIN trigram index for typo-tolerant matching. Both are created by
+``shop/migrations/0004_product_search``. Other databases (SQLite in tests and
+local development) fall back to plain ``icontains`` filtering.
+"""
+
+import re
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .custom_taggit import CustomTaggedItem
+from .models import Category, Product
+
+
+def is_postgres():
+    return connection.vendor == "postgresql"
+
+
+def _search_config():
+    return getattr(settings, "PRODUCT_SEARCH_CONFIG", "simple")
+
+
+def product_search_vector():
+    """
+    The expression ``Product.search_vector`` is computed from. Tags and
+    category are read through subqueries so it can be used in an UPDATE.
+    """
+    config = _search_config()
+    tag_names = Subquery(
+        CustomTaggedItem.objects.filter(
+            object_id=OuterRef("pk"),
+            content_type=ContentType.objects.get_for_model(Product),
+        )
+        .values("object_id")
+        .annotate(names=StringAgg("tag__name", " "))
+        .values("names")[:1]
+    )
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1]
+    )
+    return (
+        SearchVector("name", weight="A", config=config)
+        + SearchVector(tag_names, weight="B", config=config)
+        + SearchVector(category_name, weight="B", config=config)
+        + SearchVector("description", weight="C", config=config)
+    )
+
+
+def update_search_vectors(product_ids=None):
+    """
+    Recomputes the search vector of the given products (or of every product)
+    in a single UPDATE. Does nothing outside PostgreSQL.
+    """
+    if not is_postgres():
+        return 0
+    products = Product.all_objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return products.update(search_vector=product_search_vector())
+
+
+def _prefix_query(search_term):
+    # Every word must match, the last one as a prefix: "blue sh" -> "blue & sh:*"
+    words = re.findall(r"\w+", search_term)
+    if not words:
+        return None
+    return " & ".join(words[:-1] + [f"{words[-1]}:*"])
+
+
+def search_products(queryset, search_term, prefix=False):
+    """
+    Filters products matching ``search_term`` and orders them by relevance:
+    the full-text rank of the term against the search vector plus the
+    trigram similarity of the product name, so misspelled names still match.
+
+    With ``prefix``, the last word of the term is matched as a prefix of the
+    indexed words, for search-as-you-type, and results are ranked by the
+    full-text rank alone.
+    """
+    if not search_term:
+        return queryset
+
+    if not is_postgres():
+        if prefix:
+            return queryset.filter(name__istartswith=search_term).order_by("name")
+        return queryset.filter(
+            Q(name__icontains=search_term) | Q(description__icontains=search_term)
+        )
+
+    if prefix:
+        raw_query = _prefix_query(search_term)
+        if raw_query is None:
+            return queryset.none()
+        query = SearchQuery(raw_query, config=_search_config(), search_type="raw")
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "name")
+        )
+
+    query = SearchQuery(search_term, config=_search_config(), search_type="websearch")
+    return (
+        queryset.annotate(
+            rank=SearchRank(F("search_vector"), query),
+            similarity=TrigramSimilarity("name", search_term),
+        )
+        # Both conditions are served by GIN indexes: "@@" on the search
+        # vector and the trigram "%" operator on the name.
+        .filter(Q(search_vector=query) | Q(name__trigram_similar=search_term)).order_by(
+            (F("rank") + F("similarity")).desc(), "name"
+        )
+    )
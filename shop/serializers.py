@@ -1,4 +1,3 @@
-from django.core.cache import cache
 from django.db.models import Q
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
@@ -49,15 +48,15 @@ class ProductRecommendationSerializer(serializers.ModelSerializer):
     """
 
     variant_id = serializers.UUIDField(
-        source="variants.first.variant_id", read_only=True
+        source="first_variant.variant_id", read_only=True
     )
-    sku = serializers.CharField(source="variants.first.sku", read_only=True)
+    sku = serializers.CharField(source="first_variant.sku", read_only=True)
     price = serializers.DecimalField(
-        source="variants.first.price", max_digits=10, decimal_places=2, read_only=True
+        source="first_variant.price", max_digits=10, decimal_places=2, read_only=True
     )
-    stock = serializers.IntegerField(source="variants.first.stock", read_only=True)
+    stock = serializers.IntegerField(source="first_variant.stock", read_only=True)
     image = serializers.ImageField(
-        source="variants.first.image", use_url=True, read_only=True, allow_null=True
+        source="first_variant.image", use_url=True, read_only=True, allow_null=True
     )
     options = serializers.SerializerMethodField()
 
@@ -73,7 +72,7 @@ class ProductRecommendationSerializer(serializers.ModelSerializer):
         ]
 
     def get_options(self, obj):
-        first_variant = obj.variants.first()
+        first_variant = obj.first_variant
         if first_variant:
             return {
                 vov.option_value.option_type.name: vov.option_value.value
@@ -109,6 +108,16 @@ class CategorySlugOrPKField(serializers.SlugRelatedField):
         return super().to_internal_value(data)
 
 
+class TagListField(serializers.ListField):
+    """
+    Renders a product's tag names from its prefetched tags, as
+    ``tags.names()`` always hits the database.
+    """
+
+    def get_attribute(self, instance):
+        return [tag.name for tag in instance.tags.all()]
+
+
 class ProductSerializer(serializers.ModelSerializer):
     # Use SlugRelatedField for input to accept category slug and CategorySerializer for output
     category = CategorySlugOrPKField(
@@ -116,7 +125,7 @@ class ProductSerializer(serializers.ModelSerializer):
     )
     category_detail = CategorySerializer(source="category", read_only=True)
 
-    tags = serializers.ListField(
+    tags = TagListField(
         child=serializers.CharField(),
         source="tags.names",
         required=False,
@@ -136,47 +145,10 @@ class ProductSerializer(serializers.ModelSerializer):
     @extend_schema_field(serializers.DictField(child=serializers.FloatField()))
     def get_rating(self, obj):
         """
-        Calculate the average rating and count the number of users who rated the product.
-        Cache the result for 1 week. The cache is updated incrementally when a review is created or deleted.
-
-        Args:
-            obj: The product instance.
-
-        Returns:
-            dict: A dictionary containing the average rating and the count of reviews.
+        Returns the average rating and the number of reviews of the product,
+        read from the columns kept up to date by the review signals.
         """
-        cache_key = f"product_{obj.product_id}_rating"
-        cached_data = cache.get(cache_key)
-
-        if cached_data is None:
-            # Initialize cache if not present
-            reviews = obj.reviews.all()
-            if not reviews:
-                return {
-                    "average": 0.0,
-                    "count": 0,
-                }  # No reviews, return 0.0 rating and count 0
-            total_rating = sum(review.rating for review in reviews)
-            count = len(reviews)
-            average_rating = total_rating / count
-            cached_data = {
-                "average": average_rating,
-                "count": count,
-                "total_rating": total_rating,
-            }
-            cache.set(
-                cache_key, cached_data, 604800
-            )  # Cache for 1 week (604800 seconds)
-        else:
-            # Update cache incrementally
-            if cached_data["count"] > 0:
-                cached_data["average"] = (
-                    cached_data["total_rating"] / cached_data["count"]
-                )
-            else:
-                cached_data["average"] = 0.0
-
-        return {"average": cached_data["average"], "count": cached_data["count"]}
+        return {"average": float(obj.rating), "count": obj.reviews_count}
 
     def to_internal_value(self, data):
         if self.instance is None and "category" not in data:
@@ -236,8 +208,10 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class ProductListSerializer(serializers.ModelSerializer):
-    price = serializers.SerializerMethodField()
-    stock = serializers.SerializerMethodField()
+    price = serializers.DecimalField(
+        source="min_price", max_digits=10, decimal_places=2, read_only=True
+    )
+    stock = serializers.IntegerField(source="total_stock", read_only=True)
     variants = ProductVariantSerializer(many=True, read_only=True)
 
     class Meta:
@@ -251,18 +225,6 @@ class ProductListSerializer(serializers.ModelSerializer):
             "variants",
         ]
 
-    def get_price(self, obj):
-        first_variant = obj.variants.first()
-        if first_variant:
-            return first_variant.price
-        return None
-
-    def get_stock(self, obj):
-        first_variant = obj.variants.first()
-        if first_variant:
-            return first_variant.stock
-        return None
-
 
 class ReviewSerializer(serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source="user.username")
@@ -289,10 +251,9 @@ class ProductDetailSerializer(ProductSerializer):
         Fetch recommended products for the given product.
         """
         recommender = Recommender()
-        recommended_products = [
-            product.product_id
-            for product in recommender.suggest_products_for([obj], max_results=5)
-        ]
+        recommended_products = recommender.suggest_product_ids_for_many(
+            [[obj.product_id]], max_results=5
+        )[0]
         suggested_products = (
             Product.objects.filter(
                 Q(category=obj.category)
@@ -300,8 +261,7 @@ class ProductDetailSerializer(ProductSerializer):
                 | Q(product_id__in=recommended_products)
             )
             .exclude(product_id=obj.product_id)
-            .select_related("category")
-            .prefetch_related("tags")
+            .prefetch_related("variants__variant_options__option_value__option_type")
             .distinct()[:10]
         )
         return ProductRecommendationSerializer(
@@ -1,23 +1,74 @@
+from logging import getLogger
+
+from django.core.cache import cache
 from django.db import IntegrityError
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import PermissionDenied, ValidationError
 
+from common.utils.cache import acquire_lock, release_lock
 from orders.models import Order, OrderItem
 from .models import Product, Review, Category
+from .tasks import (
+    USER_RECOMMENDATIONS_KEY,
+    USER_RECOMMENDATIONS_QUEUED_TIMEOUT,
+    get_popular_product_ids,
+    update_user_recommendations,
+)
+
+logger = getLogger(__name__)
+
+
+VARIANT_OPTIONS_PREFETCH = "variants__variant_options__option_value__option_type"
 
 
 def get_product_detail(slug: str):
     """
-    Retrieves a product by its slug. Caching is handled at the view layer.
+    Retrieves a product by its slug, with everything the detail serializer
+    renders prefetched. Caching is handled at the view layer.
     """
-    product = get_object_or_404(Product, slug=slug)
+    queryset = Product.objects.select_related("category", "user").prefetch_related(
+        "tags",
+        VARIANT_OPTIONS_PREFETCH,
+        Prefetch("reviews", queryset=Review.objects.select_related("user")),
+    )
+    product = get_object_or_404(queryset, slug=slug)
     return product
 
 
 def get_user_products(user, username: str = None):
     if username:
-        return Product.objects.filter(user__username=username)
-    return Product.objects.filter(user=user)
+        products = Product.objects.filter(user__username=username)
+    else:
+        products = Product.objects.filter(user=user)
+    return products.select_related("category").prefetch_related(
+        "tags", VARIANT_OPTIONS_PREFETCH
+    )
+
+
+def get_recommended_products(user, queryset=None):
+    """
+    Returns the products of the user's precomputed recommendation feed, in
+    feed order. Users without a feed get the popular products while theirs
+    is built in the background; only the first miss queues the build.
+    """
+    key = USER_RECOMMENDATIONS_KEY.format(user.id)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        if acquire_lock(key, USER_RECOMMENDATIONS_QUEUED_TIMEOUT):
+            try:
+                update_user_recommendations.delay(user.id)
+            except Exception as e:
+                release_lock(key)
+                logger.warning("Could not schedule feed for user id %s: %s", user.id, e)
+        product_ids = get_popular_product_ids()
+
+    queryset = queryset if queryset is not None else Product.objects.all()
+    products_by_id = {
+        str(product.product_id): product
+        for product in queryset.filter(product_id__in=product_ids)
+    }
+    return [products_by_id[id] for id in product_ids if id in products_by_id]
 
 
 def get_reviews_for_product(product_slug: str):
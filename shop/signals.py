@@ -1,17 +1,53 @@
 from django.core.cache import cache
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
 
-from .models import Category, Product, Review
+from .autocomplete import publish_name_changes
+from .caching import (
+    PRODUCT_GENERATION_KEY,
+    bump_generations,
+    product_detail_cache_key,
+    product_generation_keys,
+)
+from .custom_taggit import CustomTag
+from .models import Category, Product, ProductVariant, Review
+from .search import update_search_vectors
 
 
 @receiver([post_save, post_delete], sender=Category)
 def invalidate_category_cache(sender, instance, **kwargs):
     """
-    Invalidate the category list cache when a category is saved or deleted.
+    Invalidate the category list cache when a category is saved or deleted,
+    along with the product listings scoped to it.
     """
     # This key is simple and doesn't need a pattern.
     cache.delete("category_list")
+    # A renamed category is re-slugged: listings cached under its previous
+    # slug are invalidated as well.
+    slugs = {instance.slug, instance._original_slug} - {None}
+    bump_generations(product_generation_keys(category_slugs=slugs))
+    instance._original_slug = instance.slug
+
+
+@receiver(post_save, sender=Category)
+def update_search_vectors_on_category_save(sender, instance, **kwargs):
+    """
+    The category name is part of its products' search vectors.
+    """
+    update_search_vectors(instance.products.values("pk"))
+
+
+@receiver(post_save, sender=Product)
+def update_search_vector_on_product_save(
+    sender, instance, update_fields=None, **kwargs
+):
+    """
+    Refresh the product's search vector unless the save only touched fields
+    that are not indexed (e.g. soft deletion or rating updates).
+    """
+    if update_fields and not {"name", "description", "category"} & set(update_fields):
+        return
+    update_search_vectors([instance.pk])
 
 
 @receiver([post_save, post_delete], sender=Product)
@@ -20,35 +56,116 @@ def invalidate_product_cache(sender, instance, **kwargs):
     Invalidate product-related caches when a product is saved or deleted.
 
     - Deletes the specific cache for the product's detail view.
-    - Deletes all versions of the product list cache using a pattern.
-      This is crucial to ensure that any filtered or sorted list view
-      is also invalidated.
+    - Bumps the product list generations of every listing the product can
+      appear in: the unscoped listings, its category (and its previous one if
+      it was moved) and its tags. Listings scoped to other categories or tags
+      keep their cached pages.
     """
     # Invalidate the detail view cache for this specific product
-    cache.delete(f"product_detail_{instance.slug}")
+    cache.delete(product_detail_cache_key(instance.slug))
+
+    category_ids = {instance.category_id, instance._original_category_id}
+    category_slugs = Category.objects.filter(
+        pk__in=[pk for pk in category_ids if pk]
+    ).values_list("slug", flat=True)
+    bump_generations(
+        product_generation_keys(
+            category_slugs=category_slugs, tag_names=instance.tags.names()
+        )
+    )
+    if instance.category_id != instance._original_category_id:
+        # The category decides which discounts the product's variants get.
+        bump_generations([PRODUCT_GENERATION_KEY.format(instance.pk)])
+    instance._original_category_id = instance.category_id
 
-    # Invalidate all product list caches (covers all query param variations)
-    # The key pattern is defined in caching.py as "product_list:*"
-    delete_pattern = getattr(cache, "delete_pattern", None)
-    if callable(delete_pattern):
-        delete_pattern("product_list:*")
+
+@receiver(post_save, sender=Product)
+def update_search_index_on_product_save(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """
+    Tell the live search workers which name a product creation, rename,
+    soft deletion or restore removed from and added to their index.
+    """
+    if update_fields and not {"name", "deleted_at"} & set(update_fields):
         return
+    removed, added = [], []
+    if (
+        not created
+        and instance._original_name is not None
+        and instance._original_deleted_at is None
+    ):
+        removed.append(instance._original_name)
+    if instance.deleted_at is None:
+        added.append(instance.name)
+    publish_name_changes(removed, added)
+    instance._original_name = instance.name
+    instance._original_deleted_at = instance.deleted_at
+
+
+@receiver(post_delete, sender=Product)
+def update_search_index_on_product_delete(sender, instance, **kwargs):
+    if instance._original_name is not None and instance._original_deleted_at is None:
+        publish_name_changes(removed=[instance._original_name])
 
-    iter_keys = getattr(cache, "iter_keys", None)
-    if callable(iter_keys):
-        keys = list(iter_keys("product_list:*"))
-        if keys:
-            cache.delete_many(keys)
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_product_cache_on_tags_change(sender, instance, action, pk_set, **kwargs):
+    """
+    Invalidate the listings of the tags added to or removed from a product.
+    """
+    if action == "pre_clear":
+        tag_names = instance.tags.names()
+    elif action in ("post_add", "post_remove") and pk_set:
+        tag_names = CustomTag.objects.filter(pk__in=pk_set).values_list(
+            "name", flat=True
+        )
+    else:
         return
 
-    keys = getattr(cache, "keys", None)
-    if callable(keys):
-        pattern_keys = keys("product_list:*")
-        if pattern_keys:
-            cache.delete_many(pattern_keys)
+    cache.delete(product_detail_cache_key(instance.slug))
+    bump_generations(
+        product_generation_keys(tag_names=tag_names)
+        + [PRODUCT_GENERATION_KEY.format(instance.pk)]
+    )
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def update_search_vector_on_tags_change(sender, instance, action, **kwargs):
+    """
+    Tag names are part of the product's search vector.
+    """
+    if action in ("post_add", "post_remove", "post_clear"):
+        update_search_vectors([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ProductVariant)
+def invalidate_product_cache_on_variant_change(sender, instance, **kwargs):
+    """
+    Price and stock are rendered in listings and detail pages, so a variant
+    change refreshes its product's summary columns and invalidates its
+    product's caches as well.
+    """
+    Product.refresh_variant_summaries([instance.product_id])
+    try:
+        product = instance.product
+    except Product.DoesNotExist:
+        # The product is being deleted along with its variants.
         return
+    invalidate_product_cache(Product, product)
+
 
-    cache.clear()
+@receiver([post_save, post_delete], sender=ProductVariant)
+def invalidate_cart_summaries_on_variant_change(sender, instance, **kwargs):
+    """
+    Cart summaries depend on the prices of the variants in the cart, so a
+    variant being created, deleted or repriced bumps its product's
+    generation. Stock-only saves keep the summaries cached.
+    """
+    if kwargs.get("created") is False and instance.price == instance._original_price:
+        return
+    bump_generations([PRODUCT_GENERATION_KEY.format(instance.product_id)])
+    instance._original_price = instance.price
 
 
 @receiver(post_save, sender=Review)
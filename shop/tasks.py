@@ -1,10 +1,127 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
 from celery import shared_task
 from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
 from .recommender import Recommender
 from .models import Product
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+USER_RECOMMENDATIONS_KEY = "user_recommendations:{}"
+USER_RECOMMENDATIONS_TIMEOUT = 60 * 60 * 24
+USER_RECOMMENDATIONS_LAST_RUN_KEY = "user_recommendations:last_run"
+# How long a queued feed build keeps further cache misses of the same user
+# from queueing another one.
+USER_RECOMMENDATIONS_QUEUED_TIMEOUT = 60 * 5
+POPULAR_PRODUCTS_KEY = "popular_products"
+POPULAR_PRODUCTS_TIMEOUT = 60 * 60 * 24 * 2
+
+# Number of product ids kept in a user's feed, and how many recently
+# purchased products are used as the base of their recommendations.
+FEED_SIZE = 60
+FEED_HISTORY_SIZE = 20
+
+
+@shared_task
+def record_order_purchases(order_id):
+    """
+    Feeds the products of a paid order into the co-purchase graph used by
+    the Recommender.
+    """
+    from orders.models import Order
+
+    try:
+        order = Order.objects.get(order_id=order_id)
+        product_ids = order.items.values_list("variant__product_id", flat=True)
+        Recommender().orders_bought([(order.order_id, product_ids, order.order_date)])
+    except Order.DoesNotExist:
+        logger.warning(f"Order {order_id} not found for co-purchase recording.")
+    except Exception as e:
+        logger.error(f"Error recording co-purchases for order {order_id}: {e}")
+
+
+@shared_task
+def update_popular_products(days=30, limit=100):
+    """
+    Caches the best selling products of the last ``days`` days, topped up with
+    the newest products. Used as the fallback for users without a feed.
+    """
+    from orders.models import OrderItem
+
+    since = timezone.now() - timedelta(days=days)
+    product_ids = list(
+        OrderItem.objects.filter(order__order_date__gte=since)
+        .values("variant__product_id")
+        .annotate(units=Sum("quantity"))
+        .order_by("-units")
+        .values_list("variant__product_id", flat=True)[:limit]
+    )
+    if len(product_ids) < limit:
+        product_ids += Product.objects.exclude(product_id__in=product_ids).values_list(
+            "product_id", flat=True
+        )[: limit - len(product_ids)]
+
+    product_ids = [str(product_id) for product_id in product_ids]
+    cache.set(POPULAR_PRODUCTS_KEY, product_ids, timeout=POPULAR_PRODUCTS_TIMEOUT)
+    return product_ids
+
+
+def get_popular_product_ids():
+    product_ids = cache.get(POPULAR_PRODUCTS_KEY)
+    if product_ids is None:
+        product_ids = update_popular_products()
+    return product_ids
+
+
+def build_user_recommendations(user_ids):
+    """
+    Computes and caches the recommendation feeds of several users at once:
+    one query for their purchase histories, one Redis pipeline for the
+    suggestions and a single cache write for all feeds.
+    """
+    from orders.models import OrderItem
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+
+    history = defaultdict(list)
+    rows = (
+        OrderItem.objects.filter(order__user_id__in=user_ids)
+        .order_by("-order__order_date")
+        .values_list("order__user_id", "variant__product_id")
+    )
+    for user_id, product_id in rows:
+        products = history[user_id]
+        if len(products) < FEED_HISTORY_SIZE and product_id not in products:
+            products.append(product_id)
+
+    users_with_history = [user_id for user_id in user_ids if history[user_id]]
+    suggestions = Recommender().suggest_product_ids_for_many(
+        [history[user_id] for user_id in users_with_history], max_results=FEED_SIZE
+    )
+    suggestions = dict(zip(users_with_history, suggestions))
+    popular = get_popular_product_ids()
+
+    feeds = {}
+    for user_id in user_ids:
+        feed = list(suggestions.get(user_id, []))
+        if len(feed) < FEED_SIZE:
+            seen = set(feed)
+            feed += [pid for pid in popular if pid not in seen][: FEED_SIZE - len(feed)]
+        feeds[user_id] = feed
+
+    cache.set_many(
+        {USER_RECOMMENDATIONS_KEY.format(uid): feed for uid, feed in feeds.items()},
+        timeout=USER_RECOMMENDATIONS_TIMEOUT,
+    )
+    return feeds
 
 
 @shared_task
@@ -13,34 +130,47 @@ def update_user_recommendations(user_id):
     Calculates and caches personalized recommendations for a given user.
     """
     try:
-        user = User.objects.get(id=user_id)
-        recommender = Recommender()
-
-        # Get recommendation base from cart and order history
-        recommendation_base = []
-
-        # NOTE: We can't access the request/session in a Celery task,
-        # so we can't get cart items. We'll rely on order history for now.
-
-        recent_order_products = Product.objects.filter(
-            variants__order_items__order__user=user
-        ).distinct()[:20]
-        recommendation_base.extend(recent_order_products)
-
-        recommended_products = []
-        if recommendation_base:
-            recommended_products = recommender.suggest_products_for(
-                recommendation_base, max_results=60
-            )
-
-        if len(recommended_products) < 20:
-            fallback_random_products = list(Product.objects.all().order_by("?")[:40])
-            recommended_products.extend(fallback_random_products)
-
-        recommended_ids = [product.product_id for product in recommended_products]
-        cache.set(
-            f"user_recommendations:{user_id}", recommended_ids, timeout=3600 * 24
-        )  # Cache for 24 hours
-    except User.DoesNotExist:
-        # Handle case where user is not found
-        pass
+        build_user_recommendations([user_id])
+    except Exception as e:
+        logger.error(f"Error updating recommendations for user {user_id}: {e}")
+
+
+@shared_task
+def refresh_user_recommendations(batch_size=500):
+    """
+    Rebuilds the feeds of every user who logged in or placed an order since
+    the previous run, ``batch_size`` users at a time.
+    """
+    from orders.models import Order
+
+    started_at = timezone.now()
+    since = cache.get(USER_RECOMMENDATIONS_LAST_RUN_KEY) or started_at - timedelta(
+        seconds=USER_RECOMMENDATIONS_TIMEOUT
+    )
+
+    active_users = (
+        User.objects.filter(last_login__gte=since)
+        .order_by()
+        .values_list("id", flat=True)
+        .union(
+            Order.objects.filter(order_date__gte=since, user__isnull=False)
+            .order_by()
+            .values_list("user_id", flat=True)
+        )
+    )
+
+    refreshed = 0
+    batch = []
+    for user_id in active_users.iterator():
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            build_user_recommendations(batch)
+            refreshed += len(batch)
+            batch = []
+    if batch:
+        build_user_recommendations(batch)
+        refreshed += len(batch)
+
+    cache.set(USER_RECOMMENDATIONS_LAST_RUN_KEY, started_at, timeout=None)
+    logger.info(f"Refreshed recommendation feeds for {refreshed} users.")
+    return refreshed
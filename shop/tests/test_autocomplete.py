@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from shop import autocomplete
+from shop.autocomplete import PrefixIndex, ProductAutocomplete, get_index_version
+from shop.consumers import SearchConsumer
+from shop.tests.factories import ProductFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_search_index():
+    autocomplete.r.flushdb()
+    yield
+    autocomplete.r.flushdb()
+
+
+def test_prefix_index_matches_word_starts():
+    index = PrefixIndex(["Phone Case", "Smart Phone", "Headphones", "Case Cover"])
+
+    assert index.search("pho") == ["Smart Phone", "Phone Case"]
+    assert index.search("CASE") == ["Phone Case", "Case Cover"]
+    assert index.search("case", limit=1) == ["Phone Case"]
+    assert index.search("xyz") == []
+    assert index.search("  ") == []
+
+
+def test_prefix_index_folds_arabic_letters():
+    index = PrefixIndex(["كيف چرمی"])
+
+    assert index.search("کیف") == ["كيف چرمی"]
+
+
+def test_prefix_index_keeps_names_shared_by_several_products():
+    index = PrefixIndex(["Phone", "Phone"])
+    index.add("Smart Phone")
+    index.remove("Phone")
+
+    assert index.search("pho") == ["Phone", "Smart Phone"]
+
+    index.remove("Phone")
+    index.remove("Phone")  # already gone
+
+    assert index.search("pho") == ["Smart Phone"]
+    assert len(index) == 2
+
+
+def test_suggestions_apply_product_changes_without_reloading(
+    monkeypatch, settings, django_capture_on_commit_callbacks
+):
+    settings.SEARCH_INDEX_CHECK_INTERVAL = 0
+    loads = []
+
+    def load_product_names():
+        loads.append(1)
+        return ["Phone"]
+
+    monkeypatch.setattr(autocomplete, "load_product_names", load_product_names)
+    engine = ProductAutocomplete()
+    assert asyncio.run(engine.suggest("ph")) == ["Phone"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product = ProductFactory(name="Photo Frame")
+    assert asyncio.run(engine.suggest("pho")) == ["Phone", "Photo Frame"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.name = "Picture Frame"
+        product.save()
+    assert asyncio.run(engine.suggest("p")) == ["Phone", "Picture Frame"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.delete()
+    assert asyncio.run(engine.suggest("p")) == ["Phone"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.restore()
+    assert asyncio.run(engine.suggest("p")) == ["Phone", "Picture Frame"]
+
+    assert len(loads) == 1
+
+
+def test_suggestions_reload_when_changes_left_the_log(
+    monkeypatch, settings, django_capture_on_commit_callbacks
+):
+    settings.SEARCH_INDEX_CHECK_INTERVAL = 0
+    monkeypatch.setattr(autocomplete, "SEARCH_INDEX_CHANGE_LOG_SIZE", 1)
+    names = []
+    monkeypatch.setattr(autocomplete, "load_product_names", lambda: list(names))
+    engine = ProductAutocomplete()
+    asyncio.run(engine.suggest("ph"))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ProductFactory(name="Phone")
+        ProductFactory(name="Photo Frame")
+    names += ["Phone", "Photo Frame"]
+
+    assert asyncio.run(engine.suggest("pho")) == ["Phone", "Photo Frame"]
+
+
+def test_only_name_changes_bump_version(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        product = ProductFactory()
+    version = asyncio.run(get_index_version())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.save(update_fields=["description"])
+    assert asyncio.run(get_index_version()) == version
+
+    with django_capture_on_commit_callbacks(execute=True):
+        product.name = "Renamed"
+        product.save()
+    assert asyncio.run(get_index_version()) == version + 1
+
+
+def test_search_consumer_throttles_each_connection():
+    consumer = SearchConsumer()
+    consumer.throttle_id = "connection-1"
+
+    assert asyncio.run(consumer.is_throttled()) is False
+    assert asyncio.run(consumer.is_throttled()) is True
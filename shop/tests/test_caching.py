@@ -0,0 +1,107 @@
+import pytest
+from django.core.cache import cache
+
+from shop.caching import generate_product_list_cache_key, refresh_product_detail
+from shop.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductVariantFactory,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestProductListCacheKey:
+    def test_key_covers_pagination(self):
+        first = generate_product_list_cache_key({"page": "1"})
+        second = generate_product_list_cache_key({"page": "2"})
+        resized = generate_product_list_cache_key({"page": "2", "page_size": "50"})
+        assert first == generate_product_list_cache_key({})
+        assert len({first, second, resized}) == 3
+
+    def test_key_is_independent_of_parameter_order(self):
+        assert generate_product_list_cache_key(
+            {"ordering": "-price", "search": "phone"}
+        ) == generate_product_list_cache_key({"search": "phone", "ordering": "-price"})
+
+    def test_product_save_invalidates_only_its_scopes(self):
+        laptops = CategoryFactory(name="Laptops")
+        phones = CategoryFactory(name="Phones")
+        product = ProductFactory(category=laptops)
+
+        laptops_key = generate_product_list_cache_key({"category__slug": laptops.slug})
+        phones_key = generate_product_list_cache_key({"category__slug": phones.slug})
+        unscoped_key = generate_product_list_cache_key({"page": "3"})
+
+        product.name = "Renamed"
+        product.save()
+
+        assert (
+            generate_product_list_cache_key({"category__slug": laptops.slug})
+            != laptops_key
+        )
+        assert generate_product_list_cache_key({"page": "3"}) != unscoped_key
+        assert (
+            generate_product_list_cache_key({"category__slug": phones.slug})
+            == phones_key
+        )
+
+    def test_moving_product_invalidates_previous_category(self):
+        laptops = CategoryFactory(name="Laptops")
+        phones = CategoryFactory(name="Phones")
+        product = ProductFactory(category=laptops)
+        laptops_key = generate_product_list_cache_key({"category__slug": laptops.slug})
+
+        product.category = phones
+        product.save()
+
+        assert (
+            generate_product_list_cache_key({"category__slug": laptops.slug})
+            != laptops_key
+        )
+
+    def test_renaming_category_invalidates_its_previous_slug(self):
+        category = CategoryFactory(name="Laptops")
+        old_key = generate_product_list_cache_key({"category__slug": "laptops"})
+
+        category.name = "Notebooks"
+        category.save()
+
+        assert category.slug == "notebooks"
+        assert generate_product_list_cache_key({"category__slug": "laptops"}) != old_key
+
+    def test_tag_changes_invalidate_tag_scope(self):
+        product = ProductFactory()
+        sale_key = generate_product_list_cache_key({"tags__name": "Sale"})
+        new_key = generate_product_list_cache_key({"tags__name": "new"})
+
+        product.tags.add("sale")
+
+        assert generate_product_list_cache_key({"tags__name": "Sale"}) != sale_key
+        assert generate_product_list_cache_key({"tags__name": "new"}) == new_key
+
+    def test_variant_change_invalidates_product_listings(self):
+        category = CategoryFactory()
+        product = ProductFactory(category=category)
+        key = generate_product_list_cache_key({"category__slug": category.slug})
+
+        ProductVariantFactory(product=product, stock=3)
+
+        assert generate_product_list_cache_key({"category__slug": category.slug}) != key
+
+
+class TestProductDetailRefresh:
+    def test_refresh_product_detail_renders_without_request(self):
+        product = ProductFactory()
+
+        data = refresh_product_detail(product.slug, "http://testserver/")
+
+        assert data["slug"] == product.slug
+        assert data["detail_url"] == product.get_absolute_url()
@@ -0,0 +1,27 @@
+import pytest
+
+from shop.filters import ProductFilter
+from shop.models import Product
+from shop.tests.factories import ProductFactory, ProductVariantFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def _filter(**params):
+    return set(ProductFilter(params, queryset=Product.objects.all()).qs)
+
+
+def test_price_filter_matches_a_variant_within_the_range():
+    product = ProductFactory()
+    product.variants.all().delete()
+    ProductVariantFactory(product=product, price=10)
+    ProductVariantFactory(product=product, price=30)
+
+    # The product's price range overlaps 15-25, but no variant is in it.
+    assert _filter(price_min=15, price_max=25) == set()
+    # Both bounds are inclusive.
+    assert _filter(price_min=30, price_max=40) == {product}
+    assert _filter(price_min=5, price_max=10) == {product}
+    assert _filter(price_min=31) == set()
+    assert _filter(price_max=9) == set()
+    assert _filter(price_min=30) == {product}
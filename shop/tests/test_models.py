@@ -4,12 +4,19 @@ from decimal import Decimal
 import pytest
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.urls import reverse
 from PIL import Image
 
 from account.tests.factories import UserFactory
-from shop.tests.factories import CategoryFactory, ProductFactory, ReviewFactory
+from shop.models import Product, ProductVariant
+from shop.tests.factories import (
+    CategoryFactory,
+    ProductFactory,
+    ProductVariantFactory,
+    ReviewFactory,
+)
 
 pytestmark = pytest.mark.django_db
 
@@ -53,6 +60,44 @@ class TestProductModel:
         assert product.reviews_count == 2
 
 
+class TestVariantSummary:
+    def test_summary_follows_variant_writes(self):
+        product = ProductFactory()
+        product.variants.all().delete()
+        cheap = ProductVariantFactory(product=product, price=10, stock=0)
+        ProductVariantFactory(product=product, price=30, stock=4)
+
+        product.refresh_from_db()
+        assert product.min_price == Decimal("10.00")
+        assert product.max_price == Decimal("30.00")
+        assert product.total_stock == 4
+        assert product.is_in_stock
+
+        cheap.delete()
+        ProductVariant.objects.filter(product=product).update(stock=0)
+        Product.refresh_variant_summaries([product.pk])
+
+        product.refresh_from_db()
+        assert product.min_price == Decimal("30.00")
+        assert product.total_stock == 0
+        assert not product.is_in_stock
+        assert not Product.in_stock.filter(pk=product.pk).exists()
+
+    def test_reconcile_command_repairs_drifted_columns(self):
+        product = ProductFactory()
+        Product.objects.filter(pk=product.pk).update(
+            min_price=None, total_stock=999, is_in_stock=False
+        )
+        variant = product.variants.get()
+
+        call_command("reconcile_product_summaries", stdout=io.StringIO())
+
+        product.refresh_from_db()
+        assert product.min_price == variant.price
+        assert product.total_stock == variant.stock
+        assert product.is_in_stock == (variant.stock > 0)
+
+
 class TestReviewModel:
     def test_unique_review_constraint(self):
         user = UserFactory()
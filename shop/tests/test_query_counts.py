@@ -0,0 +1,179 @@
+"""
+Query-count regression tests for the product endpoints.
+
+Each endpoint is exercised with 10, 100 and 1000 rows and must issue the
+same number of queries, so serializers cannot fall back to per-product
+lookups without these tests noticing.
+"""
+
+import uuid
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from account.models import UserAccount
+from account.tests.factories import UserFactory
+from shop.models import (
+    OptionType,
+    OptionValue,
+    Product,
+    ProductVariant,
+    Review,
+    VariantOptionValue,
+)
+from shop.recommender import Recommender, r
+from shop.tests.factories import CategoryFactory, ProductFactory
+
+pytestmark = pytest.mark.django_db
+
+ROWS = [10, 100, 1000]
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    r.flushdb()
+    # Tag lookups resolve the product content type through a process-wide
+    # cache; warm it so counts do not depend on test order.
+    ContentType.objects.get_for_model(Product)
+    yield
+    cache.clear()
+    r.flushdb()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def option_value():
+    size = OptionType.objects.create(name="Size")
+    return OptionValue.objects.create(option_type=size, value="M")
+
+
+def _create_variants(products, option_value, per_product=1):
+    variants = ProductVariant.objects.bulk_create(
+        [
+            ProductVariant(product=product, price=10 + i, stock=i, sku=uuid.uuid4().hex)
+            for product in products
+            for i in range(per_product)
+        ]
+    )
+    VariantOptionValue.objects.bulk_create(
+        [
+            VariantOptionValue(variant=variant, option_value=option_value)
+            for variant in variants
+        ]
+    )
+    Product.refresh_variant_summaries([product.pk for product in products])
+    return variants
+
+
+def _create_products(rows, option_value, user=None, category=None):
+    user = user or UserFactory()
+    category = category or CategoryFactory()
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                name=f"Product {i}",
+                slug=f"product-{uuid.uuid4().hex}",
+                description="A product.",
+                category=category,
+                user=user,
+            )
+            for i in range(rows)
+        ]
+    )
+    _create_variants(products, option_value)
+    return products
+
+
+def _create_reviews(product, rows):
+    users = UserAccount.objects.bulk_create(
+        [
+            UserAccount(username=f"reviewer{i}", phone_number=f"+98911{i:07d}")
+            for i in range(rows)
+        ]
+    )
+    Review.objects.bulk_create(
+        [Review(product=product, user=user, rating=4) for user in users]
+    )
+
+
+@pytest.mark.parametrize("rows", ROWS)
+def test_product_list_query_count(
+    rows, api_client, option_value, django_assert_num_queries
+):
+    _create_products(rows, option_value)
+
+    # count, page, tags, variants, variant options, option values, option types
+    with django_assert_num_queries(7):
+        response = api_client.get(reverse("api-v1:product-list"), {"page_size": 100})
+
+    assert response.status_code == 200
+    assert len(response.data["data"]) == min(rows, 100)
+
+
+@pytest.mark.parametrize("rows", ROWS)
+def test_product_detail_query_count(
+    rows, api_client, option_value, django_assert_num_queries
+):
+    product = ProductFactory()
+    _create_variants([product], option_value, per_product=rows)
+    _create_reviews(product, rows)
+    _create_products(rows, option_value, category=product.category)
+
+    # product, tags, variants (+3 for their options), reviews with authors,
+    # then up to 10 recommended products with their variants and options
+    with django_assert_num_queries(12):
+        response = api_client.get(
+            reverse("api-v1:product-detail", kwargs={"slug": product.slug})
+        )
+
+    assert response.status_code == 200
+    assert len(response.data["reviews"]) == rows
+    assert len(response.data["recommended_products"]) == 10
+
+
+@pytest.mark.parametrize("rows", ROWS)
+def test_product_recommendations_query_count(
+    rows, api_client, option_value, django_assert_num_queries
+):
+    product = ProductFactory()
+    related = _create_products(rows, option_value)
+    Recommender().bulk_products_bought(
+        [([product.product_id, other.product_id], None) for other in related]
+    )
+
+    # product with its tags, variants and options; then the suggested
+    # products with their variants, options, option values and types
+    with django_assert_num_queries(9):
+        response = api_client.get(
+            reverse("api-v1:product-recommendations", kwargs={"slug": product.slug})
+        )
+
+    assert response.status_code == 200
+    assert len(response.data) == 6
+    assert all(item["variant_id"] for item in response.data)
+
+
+@pytest.mark.parametrize("rows", ROWS)
+def test_user_products_query_count(
+    rows, api_client, option_value, django_assert_num_queries
+):
+    user = UserFactory()
+    _create_products(rows, option_value, user=user)
+    api_client.force_authenticate(user=user)
+
+    # count, page, tags, variants, variant options, option values, option types
+    with django_assert_num_queries(7):
+        response = api_client.get(
+            reverse("api-v1:product-user-products"), {"page_size": 100}
+        )
+
+    assert response.status_code == 200
+    assert len(response.data["data"]) == min(rows, 100)
@@ -0,0 +1,191 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+
+from orders.models import Order
+from orders.tests.factories import OrderFactory, OrderItemFactory
+from shop.recommender import Recommender, r
+from account.tests.factories import UserFactory
+from shop.tasks import (
+    USER_RECOMMENDATIONS_KEY,
+    build_user_recommendations,
+    record_order_purchases,
+    refresh_user_recommendations,
+    update_popular_products,
+)
+from shop.tests.factories import ProductFactory, ProductVariantFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def flush_redis():
+    r.flushdb()
+    yield
+    r.flushdb()
+
+
+def _paid_order(*products, status=Order.Status.PAID):
+    order = OrderFactory()
+    for product in products:
+        OrderItemFactory(order=order, variant=ProductVariantFactory(product=product))
+    Order.objects.filter(pk=order.pk).update(status=status)
+    return order
+
+
+class TestRecommender:
+    def test_products_bought_links_every_pair(self):
+        a, b, c = ProductFactory.create_batch(3)
+        recommender = Recommender()
+
+        recommender.products_bought([a, b, c])
+
+        assert r.zscore(recommender.get_product_key(a.product_id), b.product_id)
+        assert r.zscore(recommender.get_product_key(c.product_id), a.product_id)
+        assert r.zscore(recommender.get_product_key(a.product_id), a.product_id) is None
+
+    def test_recent_purchases_outweigh_old_ones(self):
+        a, old, recent = ProductFactory.create_batch(3)
+        recommender = Recommender()
+        now = timezone.now()
+
+        recommender.products_bought([a, old], bought_at=now - timedelta(days=120))
+        recommender.products_bought([a, old], bought_at=now - timedelta(days=90))
+        recommender.products_bought([a, recent], bought_at=now)
+
+        assert recommender.suggest_products_for([a]) == [recent, old]
+
+    def test_related_products_are_capped(self, settings):
+        settings.RECOMMENDER_MAX_RELATED = 2
+        products = ProductFactory.create_batch(4)
+        recommender = Recommender()
+
+        recommender.products_bought(products)
+
+        assert r.zcard(recommender.get_product_key(products[0].product_id)) == 2
+
+    def test_record_order_purchases_task(self):
+        a, b = ProductFactory.create_batch(2)
+        order = _paid_order(a, b)
+
+        record_order_purchases(str(order.order_id))
+
+        assert Recommender().suggest_products_for([a]) == [b]
+
+
+class TestBackfillRecommendationsCommand:
+    def test_backfill_streams_paid_orders(self):
+        a, b, c = ProductFactory.create_batch(3)
+        _paid_order(a, b)
+        _paid_order(a, c, status=Order.Status.DELIVERED)
+        _paid_order(b, c, status=Order.Status.PENDING)
+
+        call_command("backfill_recommendations", chunk_size=1, batch_size=1)
+
+        recommender = Recommender()
+        assert set(recommender.suggest_products_for([a])) == {b, c}
+        assert recommender.suggest_products_for([b]) == [a]
+
+    def test_backfill_skips_recorded_orders(self):
+        a, b = ProductFactory.create_batch(2)
+        order = _paid_order(a, b)
+        record_order_purchases(str(order.order_id))
+        key = Recommender().get_product_key(a.product_id)
+        score = r.zscore(key, b.product_id)
+
+        call_command("backfill_recommendations")
+        call_command("backfill_recommendations", since="2000-01-01")
+
+        assert r.zscore(key, b.product_id) == score
+
+
+class TestBatchedSuggestions:
+    def test_suggestions_for_many_groups(self):
+        a, b, c, d = ProductFactory.create_batch(4)
+        recommender = Recommender()
+        recommender.products_bought([a, b, c])
+        recommender.products_bought([a, b])
+        recommender.products_bought([c, d])
+
+        single, combined, empty = recommender.suggest_products_for_many(
+            [[a], [a, c], []]
+        )
+
+        assert single == [b, c]
+        assert combined[0] == b
+        assert set(combined) == {b, d}
+        assert empty == []
+
+    def test_suggestions_are_bounded_and_skip_missing_products(self):
+        a, b, c = ProductFactory.create_batch(3)
+        recommender = Recommender()
+        recommender.products_bought([a, b, c])
+        recommender.products_bought([a, b])
+        c.hard_delete()
+
+        assert recommender.suggest_product_ids_for_many([[a]], max_results=1) == [
+            [str(b.product_id)]
+        ]
+        assert recommender.suggest_products_for([a]) == [b]
+
+    def test_no_query_without_suggestions(self, django_assert_num_queries):
+        product = ProductFactory()
+
+        with django_assert_num_queries(0):
+            assert Recommender().suggest_products_for([product]) == []
+
+
+class TestUserRecommendations:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+        yield
+        cache.clear()
+
+    def _order_for(self, user, *products):
+        order = OrderFactory(user=user)
+        for product in products:
+            OrderItemFactory(order=order, variant=product.variants.first())
+        return order
+
+    def test_popular_products_rank_best_sellers_first(self):
+        slow, fast = ProductFactory.create_batch(2)
+        user = UserFactory()
+        order = OrderFactory(user=user)
+        OrderItemFactory(order=order, variant=slow.variants.first(), quantity=1)
+        OrderItemFactory(order=order, variant=fast.variants.first(), quantity=5)
+        newest = ProductFactory()
+
+        popular = update_popular_products()
+
+        assert popular[:2] == [str(fast.product_id), str(slow.product_id)]
+        assert str(newest.product_id) in popular
+
+    def test_feeds_are_built_for_several_users_at_once(self, django_assert_num_queries):
+        a, b, c = ProductFactory.create_batch(3)
+        Recommender().products_bought([a, b])
+        buyer, newcomer = UserFactory(), UserFactory()
+        self._order_for(buyer, a)
+        update_popular_products()
+
+        with django_assert_num_queries(1):
+            feeds = build_user_recommendations([buyer.id, newcomer.id])
+
+        assert feeds[buyer.id][0] == str(b.product_id)
+        assert len(set(feeds[buyer.id])) == len(feeds[buyer.id])
+        assert set(feeds[newcomer.id]) == {str(p.product_id) for p in (a, b, c)}
+        assert cache.get(USER_RECOMMENDATIONS_KEY.format(buyer.id)) == feeds[buyer.id]
+
+    def test_refresh_only_rebuilds_active_users(self):
+        product = ProductFactory()
+        buyer = UserFactory()
+        self._order_for(buyer, product)
+        refresh_user_recommendations()
+        assert cache.get(USER_RECOMMENDATIONS_KEY.format(buyer.id)) is not None
+
+        cache.delete(USER_RECOMMENDATIONS_KEY.format(buyer.id))
+        assert refresh_user_recommendations() == 0
+        assert cache.get(USER_RECOMMENDATIONS_KEY.format(buyer.id)) is None
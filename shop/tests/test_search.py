@@ -0,0 +1,33 @@
+import pytest
+
+from shop.models import Product
+from shop.search import _prefix_query, search_products
+from shop.tests.factories import ProductFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_prefix_query_matches_last_word_as_prefix():
+    assert _prefix_query("blue sh") == "blue & sh:*"
+    assert _prefix_query("  ") is None
+
+
+def test_search_matches_name_and_description():
+    by_name = ProductFactory(name="Wireless Mouse", description="Ergonomic")
+    by_description = ProductFactory(name="Keyboard", description="A wireless one")
+    ProductFactory(name="Monitor", description="Large screen")
+
+    results = search_products(Product.objects.all(), "wireless")
+
+    assert set(results) == {by_name, by_description}
+
+
+def test_prefix_search_matches_name_prefix():
+    ProductFactory(name="Phone Case")
+    phone = ProductFactory(name="Phone")
+    ProductFactory(name="Headphones")
+
+    results = list(search_products(Product.objects.all(), "pho", prefix=True))
+
+    assert results[0] == phone
+    assert len(results) == 2
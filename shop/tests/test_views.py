@@ -3,6 +3,8 @@ from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APIClient
 
+from shop.caching import generate_product_list_cache_key, product_detail_cache_key
+
 from account.tests.factories import UserFactory
 from orders.models import Order
 from orders.tests.factories import OrderFactory, OrderItemFactory
@@ -122,7 +124,7 @@ class TestProductViewSet:
         url = reverse("api-v1:product-list")
         response = api_client.get(url)
         assert response.status_code == 200
-        cache_key = "product_list_"
+        cache_key = generate_product_list_cache_key({})
         cached_data = cache.get(cache_key)
         assert cached_data == response.data
         response_cached = api_client.get(url)
@@ -135,13 +137,59 @@ class TestProductViewSet:
         url = reverse("api-v1:product-detail", kwargs={"slug": product.slug})
         response = api_client.get(url)
         assert response.status_code == 200
-        cache_key = f"product_{product.slug}"
+        cache_key = product_detail_cache_key(product.slug)
         cached_data = cache.get(cache_key)
         assert cached_data == response.data
         response_cached = api_client.get(url)
         assert response_cached.status_code == 200
         assert response_cached.data == cached_data
 
+    def test_for_you_requires_authentication(self, api_client):
+        response = api_client.get(reverse("api-v1:product-for-you"))
+        assert response.status_code == 401
+
+    def test_for_you_serves_cached_feed_in_order(self, api_client):
+        cache.clear()
+        first, second, _ = ProductFactory.create_batch(3)
+        user = UserFactory()
+        cache.set(
+            f"user_recommendations:{user.id}",
+            [str(second.product_id), str(first.product_id)],
+        )
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get(reverse("api-v1:product-for-you"))
+
+        assert response.status_code == 200
+        assert [p["slug"] for p in response.data["data"]] == [
+            second.slug,
+            first.slug,
+        ]
+
+    def test_for_you_falls_back_to_popular_products(self, api_client):
+        cache.clear()
+        products = ProductFactory.create_batch(2)
+        user = UserFactory()
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get(reverse("api-v1:product-for-you"))
+
+        assert response.status_code == 200
+        assert {p["slug"] for p in response.data["data"]} == {p.slug for p in products}
+        assert cache.get(f"user_recommendations:{user.id}") is not None
+
+    def test_for_you_queues_one_feed_build_per_user(self, api_client, mocker):
+        cache.clear()
+        ProductFactory()
+        user = UserFactory()
+        api_client.force_authenticate(user=user)
+        delay = mocker.patch("shop.services.update_user_recommendations.delay")
+
+        for _ in range(3):
+            assert api_client.get(reverse("api-v1:product-for-you")).status_code == 200
+
+        delay.assert_called_once_with(user.id)
+
 
 class TestCategoryViewSet:
     def test_list_categories(self, api_client):
@@ -1,6 +1,3 @@
-from django.conf import settings
-from django.db.models import Q
-
 from ecommerce_api.utils.file_handling import upload_to_unique
 
 
@@ -12,34 +9,3 @@ def product_upload_to_unique(instance, filename):
     :return:
     """
     return upload_to_unique(instance, filename, directory="products/")
-
-
-def search_products(queryset, search_term):
-    """
-    Centralized search function to filter products by name and description similarity.
-    """
-    if search_term:
-        # Check the database engine at runtime
-        is_postgres = (
-            settings.DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql"
-        )
-
-        if is_postgres:
-            from django.contrib.postgres.search import TrigramSimilarity
-
-            return (
-                queryset.annotate(
-                    name_similarity=TrigramSimilarity("name", search_term),
-                    description_similarity=TrigramSimilarity(
-                        "description", search_term
-                    ),
-                )
-                .filter(name_similarity__gt=0.1)
-                .order_by("-name_similarity")
-            )
-        else:
-            # Fallback for other databases like SQLite
-            return queryset.filter(
-                Q(name__icontains=search_term) | Q(description__icontains=search_term)
-            )
-    return queryset
@@ -1,6 +1,6 @@
 from logging import getLogger
 
-from django.db.models import Min
+from django.db.models import F
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import (
     extend_schema_view,
@@ -22,7 +22,16 @@ from rest_framework.response import Response
 from ecommerce_api.core.mixins import PaginationMixin
 from ecommerce_api.core.permissions import IsOwnerOrStaff
 from shop.filters import ProductFilter, ProductSearchFilterBackend
-from .caching import generate_product_list_cache_key
+from common.utils.cache import get_or_compute
+from .caching import (
+    PRODUCT_DETAIL_CACHE_TIMEOUT,
+    PRODUCT_DETAIL_STALE_TIMEOUT,
+    PRODUCT_LIST_CACHE_TIMEOUT,
+    PRODUCT_LIST_STALE_TIMEOUT,
+    generate_product_list_cache_key,
+    product_detail_cache_key,
+    render_product_detail,
+)
 from .models import Product, Category
 from .recommender import Recommender
 from .serializers import (
@@ -34,7 +43,6 @@ from .serializers import (
 )
 from .serializers import ReviewSerializer
 from . import services
-from django.core.cache import cache
 
 logger = getLogger(__name__)
 
@@ -200,6 +208,12 @@ class ReviewViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=str,
             ),
+            OpenApiParameter(
+                name=r"prefix",
+                description=r"Match the last word of `search` as a prefix, for search-as-you-type",
+                required=False,
+                type=bool,
+            ),
         ],
         examples=[
             OpenApiExample(
@@ -303,6 +317,17 @@ class ReviewViewSet(viewsets.ModelViewSet):
             401: OpenApiResponse(description=r"Authentication required."),
         },
     ),
+    for_you=extend_schema(
+        operation_id=r"product\_for\_you",
+        description=r"List the personalized product feed of the authenticated user. Refreshed periodically in the background.",
+        tags=[r"Products"],
+        responses={
+            200: OpenApiResponse(
+                description=r"Recommended products retrieved successfully."
+            ),
+            401: OpenApiResponse(description=r"Authentication required."),
+        },
+    ),
 )
 class ProductViewSet(PaginationMixin, viewsets.ModelViewSet):
     """
@@ -318,13 +343,8 @@ class ProductViewSet(PaginationMixin, viewsets.ModelViewSet):
 
     queryset = (
         Product.objects.select_related("user", "category")
-        .prefetch_related(
-            "tags",
-            "reviews",
-            "variants",
-            "variants__variant_options__option_value__option_type",
-        )
-        .annotate(price=Min("variants__price"))
+        .prefetch_related("tags", services.VARIANT_OPTIONS_PREFETCH)
+        .annotate(price=F("min_price"))
     )
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrStaff]
     serializer_class = ProductSerializer
@@ -351,11 +371,11 @@ class ProductViewSet(PaginationMixin, viewsets.ModelViewSet):
         """
         Returns the serializer class to be used for the current action.
         - For the 'retrieve' action, it uses the `ProductDetailSerializer` to include more details.
-        - For the 'list' action, it uses the `ProductListSerializer` for a lightweight representation.
+        - For the 'list' and 'for_you' actions, it uses the `ProductListSerializer` for a lightweight representation.
         """
         if self.action == "retrieve":
             return ProductDetailSerializer
-        if self.action == "list":
+        if self.action in ["list", "for_you"]:
             return ProductListSerializer
         return super().get_serializer_class()
 
@@ -395,7 +415,12 @@ class ProductViewSet(PaginationMixin, viewsets.ModelViewSet):
             product = self.get_object()
             recommender = Recommender()
             # It expects a list of products, even if it's just one
-            recommended_products = recommender.suggest_products_for([product])
+            recommended_products = recommender.suggest_products_for(
+                [product],
+                queryset=Product.objects.prefetch_related(
+                    services.VARIANT_OPTIONS_PREFETCH
+                ),
+            )
             serializer = ProductRecommendationSerializer(
                 recommended_products, many=True, context={"request": request}
             )
@@ -417,6 +442,29 @@ class ProductViewSet(PaginationMixin, viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="for-you",
+        url_name="for-you",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def for_you(self, request):
+        """
+        Lists the authenticated user's recommendation feed.
+        - The feed is precomputed by `shop.tasks.refresh_user_recommendations`, so the
+          request only reads a cached list of ids and loads those products.
+        """
+        products = services.get_recommended_products(
+            request.user, queryset=self.get_queryset()
+        )
+        page = self.paginate_queryset(products)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(products, many=True)
+        return Response(serializer.data)
+
     def perform_update(self, serializer):
         """
         Handles the update of a product.
@@ -435,38 +483,37 @@ class ProductViewSet(PaginationMixin, viewsets.ModelViewSet):
         """
         Lists all products with a robust caching strategy.
         - The cache key is generated based on a sorted and hashed representation of query parameters
-          to ensure consistency.
-        - Cache invalidation is handled by signals on Product model changes.
+          (including pagination) to ensure consistency.
+        - The key embeds the generation counters of the listing's category/tag scope, which
+          signals bump on Product changes instead of deleting keys.
+        - Concurrent misses are collapsed into a single rebuild, and a stale page is served
+          while it is being rebuilt.
         """
         cache_key = generate_product_list_cache_key(request.query_params)
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            return Response(cached_data)
-
-        response = super().list(request, *args, **kwargs)
-        # Cache the serialized data for 5 minutes
-        cache.set(cache_key, response.data, 60 * 5)
-        return response
+        data = get_or_compute(
+            cache_key,
+            lambda: super(ProductViewSet, self).list(request, *args, **kwargs).data,
+            soft_timeout=PRODUCT_LIST_CACHE_TIMEOUT,
+            hard_timeout=PRODUCT_LIST_STALE_TIMEOUT,
+        )
+        return Response(data)
 
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieves a single product by its slug, with caching.
-        - Caches the serialized product detail data for 1 hour.
+        - Caches the serialized product detail data for 1 hour, and keeps serving it
+          for up to 6 hours while a single worker (or a Celery task) refreshes it.
         - Cache invalidation is handled by signals.
         """
         slug = kwargs.get("slug")
-        cache_key = f"product_detail_{slug}"
-        cached_data = cache.get(cache_key)
-
-        if cached_data:
-            return Response(cached_data)
-
-        product = services.get_product_detail(slug)
-        serializer = self.get_serializer(product)
-        # Cache the serialized data
-        cache.set(cache_key, serializer.data, 60 * 60)  # 1 hour
-        return Response(serializer.data)
+        data = get_or_compute(
+            product_detail_cache_key(slug),
+            lambda: render_product_detail(slug, request),
+            soft_timeout=PRODUCT_DETAIL_CACHE_TIMEOUT,
+            hard_timeout=PRODUCT_DETAIL_STALE_TIMEOUT,
+            refresh=("shop.product_detail", (slug, request.build_absolute_uri("/"))),
+        )
+        return Response(data)
 
     @action(
         detail=False,
@@ -52,7 +52,7 @@ def test_send_otp_success():
     response.raise_for_status = Mock()
     response.json.return_value = {"status": 1, "data": {"message_id": "abc"}}
 
-    with patch("sms.providers.requests.post", return_value=response) as mock_post:
+    with patch("common.utils.http.HttpClient.post", return_value=response) as mock_post:
         assert provider.send_otp("09123456789", "123456", 111) == {"message_id": "abc"}
         mock_post.assert_called_once()
 
@@ -64,7 +64,7 @@ def test_send_otp_status_not_success():
     response.raise_for_status = Mock()
     response.json.return_value = {"status": 0, "message": "bad request"}
 
-    with patch("sms.providers.requests.post", return_value=response):
+    with patch("common.utils.http.HttpClient.post", return_value=response):
         with pytest.raises(SmsProviderError) as exc_info:
             provider.send_otp("09123456789", "123456", 111)
 
@@ -79,7 +79,7 @@ def test_send_otp_incomplete_response():
     response.raise_for_status = Mock()
     response.json.return_value = {}
 
-    with patch("sms.providers.requests.post", return_value=response):
+    with patch("common.utils.http.HttpClient.post", return_value=response):
         with pytest.raises(SmsProviderError) as exc_info:
             provider.send_otp("09123456789", "123456", 111)
 
@@ -91,7 +91,7 @@ def test_send_otp_network_error():
     provider = SmsIrProvider()
 
     with patch(
-        "sms.providers.requests.post",
+        "common.utils.http.HttpClient.post",
         side_effect=requests.exceptions.Timeout("timeout"),
     ):
         with pytest.raises(SmsProviderError) as exc_info:
@@ -107,7 +107,7 @@ def test_send_text_success():
     response.raise_for_status = Mock()
     response.json.return_value = {"status": 1, "data": {"message_id": "xyz"}}
 
-    with patch("sms.providers.requests.post", return_value=response) as mock_post:
+    with patch("common.utils.http.HttpClient.post", return_value=response) as mock_post:
         assert provider.send_text("09123456789", "Hello") == {"message_id": "xyz"}
         mock_post.assert_called_once()
 
@@ -119,7 +119,7 @@ def test_send_text_status_not_success():
     response.raise_for_status = Mock()
     response.json.return_value = {"status": 0, "message": "invalid"}
 
-    with patch("sms.providers.requests.post", return_value=response):
+    with patch("common.utils.http.HttpClient.post", return_value=response):
         with pytest.raises(SmsProviderError) as exc_info:
             provider.send_text("09123456789", "Hello")
 
@@ -134,7 +134,7 @@ def test_send_text_incomplete_response():
     response.raise_for_status = Mock()
     response.json.return_value = {}
 
-    with patch("sms.providers.requests.post", return_value=response):
+    with patch("common.utils.http.HttpClient.post", return_value=response):
         with pytest.raises(SmsProviderError) as exc_info:
             provider.send_text("09123456789", "Hello")
 
@@ -146,7 +146,7 @@ def test_send_text_network_error():
     provider = SmsIrProvider()
 
     with patch(
-        "sms.providers.requests.post",
+        "common.utils.http.HttpClient.post",
         side_effect=requests.exceptions.ConnectionError("network down"),
     ):
         with pytest.raises(SmsProviderError) as exc_info:
@@ -6,6 +6,7 @@ import random
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
 from rest_framework_simplejwt.tokens import RefreshToken
 from ecommerce_api.core.api_standard_response import ApiResponse
 
@@ -77,6 +78,7 @@ class VerifyOTP(APIView):
             user.save()
 
         refresh = RefreshToken.for_user(user)
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
         data = {
             "refresh": str(refresh),
             "access": str(refresh.access_token),